@@ -1,7 +1,31 @@
-from .dss_reader import get_all_data_from_dsm2_dss, make_regex_from_parts
+from .dss_reader import (
+    get_all_data_from_dsm2_dss,
+    find_scenario_files,
+    iter_scenario_dir,
+    make_regex_from_parts,
+)
 from .h5_reader import get_output_channel_names
 from .echo import read_echo_file
 from .db import insert_dsm2_data
+from .post_process import gate_model_data, parse_dss_filename, post_process_full_data
+from .post_process.data_config import gatef
+from .post_process.kernels import KERNELS, run_kernel
+from .post_process.sketches import DEFAULT_BIN_WIDTH, sketch_dss_files
+from .scenario import run_scenario, ScenarioPipelineError
+from .db.stores import open_store
+from .validation import ValidationError, validate_long
+from .server import serve as serve_queries
+from .writers.dss import write_post_processed_dss
+from .jobs import JobQueue, enqueue_scenario_dir, run_worker
+from .readers.catalog import DEFAULT_INDEX, PathCatalog
+from .readers.dss import make_dss_regex_from_parts
+from .writers.csv import (
+    COMPRESSIONS,
+    compressed_path,
+    open_csv,
+    read_csv_chunks,
+    write_csv,
+)
 import pandas as pd
 import rich_click as click
 import sqlite3
@@ -9,6 +33,7 @@ import h5py
 import os
 import pathlib
 from contextlib import contextmanager
+
 # from hecdss import HecDss
 
 click.rich_click.USE_MARKDOWN = True
@@ -28,6 +53,14 @@ def insert_into_database(data, db):
     db_conn.close()
 
 
+compress_option = click.option(
+    "--compress",
+    type=click.Choice(list(COMPRESSIONS)),
+    default=None,
+    help="compress the csv output in chunks on a thread pool, .gz or .zst is added to the file name",
+)
+
+
 @click.group(
     help="""
         SDG Data Processing Tools
@@ -39,27 +72,269 @@ def insert_into_database(data, db):
 def cli(): ...
 
 
-@cli.command()
+# named so it does not shadow the sdgtools.scenario module
+@cli.command("scenario")
 @click.argument("sdg")
 @click.argument("hydro")
 @click.argument("echo")
-def scenario(sdg, hydro, echo):
+@click.argument("connection_string")
+@click.option(
+    "-n",
+    "--name",
+    help="scenario name, defaults to the model name in the SDG filename",
+    default=None,
+)
+@click.option(
+    "--quarantine",
+    help="load the valid rows and write rows failing validation to this csv instead of failing",
+    default=None,
+)
+@click.option(
+    "--chunk-years",
+    type=int,
+    help="years of a series read and loaded at a time, by default whole series",
+    default=None,
+)
+def scenario_cmd(sdg, hydro, echo, connection_string, name, quarantine, chunk_years):
     """
     Perform Scneario level process.
+
+    Reads the SDG, hydro and echo files of a scenario, calculates gate velocity and
+    velocity streaks and loads everything into the database. Reading and loading run
+    as a pipeline, each series (or --chunk-years of it) is loaded while the next is
+    read.
+
+    Each frame is validated before it is loaded (missing datetimes, unknown units,
+    duplicates, stage at or below the gate bottom), bad data fails the load unless
+    --quarantine is given.
+    """
+    for file in [sdg, hydro, echo]:
+        if not os.path.exists(file):
+            click.secho(f"Error: File not found {file}", err=True, fg="red", nl=True)
+            return
+
+    scenario_name = name if name is not None else parse_dss_filename(sdg)
+
+    def report(frame_name, rows):
+        click.secho(f"loaded {rows} rows of {frame_name}", fg="green")
+
+    def report_validation(frame_name, validation):
+        if len(validation.issues):
+            click.secho(validation.summary(frame_name), fg="yellow")
+
+    try:
+        run_scenario(
+            scenario_name,
+            sdg,
+            hydro,
+            echo,
+            connection_string,
+            on_load=report,
+            quarantine_path=quarantine,
+            on_validate=report_validation,
+            chunk_years=chunk_years,
+        )
+    except ScenarioPipelineError as e:
+        click.secho(str(e), err=True, fg="red")
+        raise click.exceptions.Exit(1)
+
+    click.secho("finished loading scenario: ", fg="green", nl=False)
+    click.secho(f"{scenario_name}", fg="yellow", nl=True)
+
+
+@cli.command("scenario-dir")
+@click.argument("directory", type=str)
+@click.argument("output_dir", type=str)
+@click.option(
+    "--v7-filter",
+    help="only read dss files whose name contains this string, e.g. V7",
+    default=None,
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    help="number of reader processes, defaults to the number of CPUs",
+    default=None,
+)
+@click.option(
+    "--catalog",
+    "catalog_index",
+    help="pathname index built with `sdgtools catalog build`, indexed files are not cataloged again",
+    default=None,
+)
+@compress_option
+def scenario_dir(directory, output_dir, v7_filter, workers, catalog_index, compress):
+    """
+    Process every scenario in a model output directory.
+
+    Scenarios are matched by filename (<scenario>_SDG.dss, <scenario>_hydro.dss and
+    hydro_echo_<scenario>.inp) and read in parallel. For each scenario the sdg, hydro and
+    echo data are written to <scenario>_sdg.csv, <scenario>_hydro.csv and <scenario>_echo.csv
+    in OUTPUT_DIR (.csv.gz or .csv.zst with --compress) as soon as it is read. Scenarios
+    that fail to read or write are reported and do not stop the others.
+    """
+    if not os.path.isdir(directory):
+        click.secho(f"Error: Directory not found {directory}", err=True, fg="red")
+        return
+
+    catalog = None
+    if catalog_index is not None:
+        if not os.path.exists(catalog_index):
+            click.secho(f"Error: Catalog not found {catalog_index}", err=True, fg="red")
+            raise click.exceptions.Exit(1)
+        catalog = PathCatalog(catalog_index)
+
+    os.makedirs(output_dir, exist_ok=True)
+    errors = {}
+    scenarios = iter_scenario_dir(
+        directory,
+        v7_filter=v7_filter,
+        max_workers=workers,
+        catalog=catalog,
+        errors=errors,
+    )
+    for scenario, data in scenarios:
+        try:
+            for kind, df in data.items():
+                output = os.path.join(output_dir, f"{scenario}_{kind}.csv")
+                write_csv(df, output, compress)
+        except Exception as e:
+            errors[scenario] = f"writing {output}: {e}"
+            continue
+        click.secho("finished scenario: ", fg="green", nl=False)
+        click.secho(f"{scenario}", fg="yellow", nl=True)
+
+    for scenario, error in errors.items():
+        click.secho(f"failed scenario {scenario}: {error}", err=True, fg="red")
+
+    if errors:
+        raise click.exceptions.Exit(1)
+
+
+# named so it does not shadow the sdgtools.readers.catalog module
+@cli.group(
+    "catalog",
+    help="""
+    Pathname catalog of DSS output trees.
+
+    Index the pathnames of every DSS file under a directory in a SQLite file once,
+    and look series up across files without opening them.
+    """,
+)
+def catalog_group(): ...
+
+
+@catalog_group.command("build")
+@click.argument("root", type=str)
+@click.option(
+    "--index",
+    help=f"SQLite index to create or refresh, defaults to ROOT/{DEFAULT_INDEX}",
+    default=None,
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    help="number of scanning processes, defaults to the number of CPUs",
+    default=None,
+)
+def catalog_build(root, index, workers):
+    """
+    Index the pathnames of every DSS file under ROOT.
+
+    Running it again only scans files that were added or changed since the last build
+    and drops files that were removed.
+    """
+    if not os.path.isdir(root):
+        click.secho(f"Error: Directory not found {root}", err=True, fg="red")
+        raise click.exceptions.Exit(1)
+    index = index or os.path.join(root, DEFAULT_INDEX)
+    colors = {"added": "green", "updated": "yellow", "failed": "red"}
+
+    def report(path, status):
+        click.secho(f"{status} {path}", fg=colors[status])
+
+    result = PathCatalog(index).build(root, max_workers=workers, on_file=report)
+    for path in result.removed:
+        click.secho(f"removed {path}", fg="yellow")
+    click.secho(
+        f"{len(result.added)} added, {len(result.updated)} updated, "
+        f"{len(result.removed)} removed, {result.unchanged} unchanged: ",
+        fg="green",
+        nl=False,
+    )
+    click.secho(f"{index}", fg="yellow", nl=True)
+
+    for path, error in result.errors.items():
+        click.secho(f"failed {path}: {error}", err=True, fg="red")
+    if result.errors:
+        raise click.exceptions.Exit(1)
+
+
+@catalog_group.command("find")
+@click.argument("index", type=str)
+@click.option("-a", "a_part", help="A part regex, or a comma separated list")
+@click.option("-b", "b_part", help="B part regex, or a comma separated list")
+@click.option("-c", "c_part", help="C part regex, or a comma separated list")
+@click.option("-e", "e_part", help="E part regex, or a comma separated list")
+@click.option("-f", "f_part", help="F part regex, or a comma separated list")
+@click.option("--start", help="only series with data on or after this date")
+@click.option("--end", help="only series with data on or before this date")
+@click.option("-o", "--output", help="write the matches to this csv file")
+def catalog_find(index, a_part, b_part, c_part, e_part, f_part, start, end, output):
+    """
+    List the series in INDEX matching the given parts and dates.
     """
+    if not os.path.exists(index):
+        click.secho(f"Error: Catalog not found {index}", err=True, fg="red")
+        raise click.exceptions.Exit(1)
+
+    def part(value):
+        return None if value is None else value.split(",")
+
+    parts_regex = make_dss_regex_from_parts(
+        A=part(a_part), B=part(b_part), C=part(c_part), E=part(e_part), F=part(f_part)
+    )
+    matches = PathCatalog(index).find(parts_regex, start=start, end=end)
+    if output is not None:
+        matches.to_csv(output, index=False)
+        click.secho(f"{len(matches)} series written to: ", fg="green", nl=False)
+        click.secho(f"{output}", fg="yellow", nl=True)
+        return
+    if len(matches):
+        click.echo(matches[["file", "pathname", "start", "end"]].to_string(index=False))
+    click.secho(
+        f"{len(matches)} series in {matches['file'].nunique()} files", fg="green"
+    )
 
 
 # DSS processing
 @cli.command()
 @click.argument("file", type=str)
-@click.argument("output", type=str)
+@click.argument("output", type=str, required=False)
 @click.option(
     "-f",
     "--regex-filter",
     help="regex filter used to subset the dss by parts. You can create a regex filter from parts using the utility function `make_regex_from_parts`",
     default=make_regex_from_parts(),
 )
-def dss(file, output, regex_filter):
+@click.option(
+    "--wide",
+    is_flag=True,
+    help="write one column per pathname with a shared datetime column instead of long format",
+)
+@click.option(
+    "--to-store",
+    help="append the data to a store (DuckDB/SQLite file, duckdb:///DIR for Parquet files, or a postgres connection string)",
+)
+@click.option(
+    "--scenario",
+    "-s",
+    help="scenario name used with --to-store, defaults to the model name in the file name",
+)
+@compress_option
+def dss(file, output, regex_filter, wide, to_store, scenario, compress):
     """
     Process DSM2 DSS Output.
 
@@ -67,22 +342,46 @@ def dss(file, output, regex_filter):
     Processing DSS Output uses functions from pyhecdss and allows for extracting all or a subset of data
     from a dss file. You can optionally pass in a regex filter which will be applied to subset the dss by
     parts.
+
+    With --wide the csv has a datetime column and one column per pathname, the header
+    rows hold the pathname, node, param and unit of each column.
+
+    With --to-store the data is appended to a store instead of (or as well as) being
+    written to OUTPUT.
     """
+    if output is None and to_store is None:
+        click.secho(
+            "Error: give an OUTPUT file, --to-store or both", err=True, fg="red"
+        )
+        raise click.exceptions.Exit(1)
+    if wide and to_store is not None:
+        click.secho("Error: --wide can not be used with --to-store", err=True, fg="red")
+        raise click.exceptions.Exit(1)
+
     try:
         if not os.path.exists(file):
             click.secho(f"Error: File not found {file}", err=True, fg="red", nl=True)
             return
 
-        data: pd.DataFrame = get_all_data_from_dsm2_dss(file, regex_filter)
+        data: pd.DataFrame = get_all_data_from_dsm2_dss(file, regex_filter, wide=wide)
 
         if len(data) == 0:
             click.secho("no data returned", fg="green")
             return
 
-        click.echo(click.style("\nStarting csv write...", fg="green"))
-        data.to_csv(output, index=False)
-        click.secho("finished writing to file: ", fg="green", nl=False)
-        click.secho(f"{output}", fg="yellow", nl=True)
+        if to_store is not None:
+            scenario = scenario or parse_dss_filename(file)
+            rows = open_store(to_store).append(data, scenario)
+            click.secho(
+                f"appended {rows} rows for '{scenario}' to: ", fg="green", nl=False
+            )
+            click.secho(f"{to_store}", fg="yellow", nl=True)
+
+        if output is not None:
+            click.echo(click.style("\nStarting csv write...", fg="green"))
+            output = write_csv(data, output, compress, index=wide)
+            click.secho("finished writing to file: ", fg="green", nl=False)
+            click.secho(f"{output}", fg="yellow", nl=True)
 
     except Exception as e:
         click.echo(click.style(f"processing the file: {file}", fg="red"))
@@ -96,6 +395,58 @@ def dss(file, output, regex_filter):
         return
 
 
+@cli.command("dss-export")
+@click.argument("output")
+@click.argument("input_files", nargs=-1, required=True)
+@click.option(
+    "--gate",
+    "-g",
+    type=click.Choice(gatef["ID"]),
+    multiple=True,
+    help="gate(s) to write, defaults to all gates",
+)
+@click.option("--a-part", help="A part of the written pathnames", default="SDG")
+def dss_export(output, input_files, gate, a_part):
+    """
+    Write post-processed results to DSS.
+
+    Each INPUT_FILE is a long format export (CSV or Parquet) of a scenario's SDG
+    data, e.g. from `sdgtools dss`. Velocity, velocity streak, gate status and gate
+    streak are calculated for every gate and written to the OUTPUT dss file as regular
+    series /A/GATE/VELOCITY//15MIN/SCENARIO/. A `scenario` column in an input file
+    names the scenarios, otherwise the model name in the file name is used.
+    """
+    results = []
+    for input_file in input_files:
+        if os.path.splitext(input_file)[1].lower() in (".parquet", ".pq"):
+            data = pd.read_parquet(input_file)
+        else:
+            data = pd.read_csv(input_file, parse_dates=["datetime"])
+        if "scenario" in data.columns:
+            scenarios = data.groupby("scenario", sort=False, observed=True)
+        else:
+            scenarios = [(parse_dss_filename(input_file), data)]
+
+        for scenario, df in scenarios:
+            for gate_id in gate or gatef["ID"]:
+                model_data = gate_model_data(df, df, df, gate_id, scenario)
+                if (
+                    len(model_data[gate_id]["vel"]) == 0
+                    or len(model_data[gate_id]["gate_operation_data"]) == 0
+                ):
+                    click.secho(f"no data for {gate_id} in {scenario}", fg="yellow")
+                    continue
+                results.append(post_process_full_data(model_data, gate_id))
+
+    try:
+        n = write_post_processed_dss(output, results, a_part)
+    except ValueError as e:
+        click.secho(f"can not write {output}: {e}", fg="red")
+        raise click.exceptions.Exit(1)
+    click.secho(f"wrote {n} series to: ", fg="green", nl=False)
+    click.secho(output, fg="yellow")
+
+
 @cli.command()
 @click.argument("file")
 def h5(file):
@@ -122,36 +473,478 @@ def h5(file):
 @cli.command()
 @click.argument("input_file")
 @click.argument("output_file")
-@click.option("--kind", "-k", help="perform this post process routine")
-def process(input_file, output_file, kind):
+@click.option(
+    "--kind",
+    "-k",
+    help="perform this post process routine",
+    type=click.Choice(list(KERNELS)),
+    required=True,
+)
+@click.option(
+    "-t",
+    "--threshold",
+    type=float,
+    help="threshold used by the streak, consecutive and exceedance routines",
+    default=None,
+)
+@click.option(
+    "--chunksize",
+    type=int,
+    help="number of rows read from the input at a time",
+    default=1_000_000,
+)
+@compress_option
+def process(input_file, output_file, kind, threshold, chunksize, compress):
     """
     Perform post process on existing CSV file.
 
+    The input is a long format CSV or Parquet file as written by `sdgtools dss`, it is
+    streamed through the post process routine in chunks so large files are processed
+    in bounded memory.
+
+    - **velocity**: fish passage velocity for each gate
+    - **gate-streaks**: consecutive runs of gate open/closed status
+    - **consecutive-stats**: count, mean and max length of runs above/below the threshold
+    - **daily-average**: daily mean of every node
+    - **exceedance**: count and hours at or above the threshold for every node
+    """
+    if not os.path.exists(input_file):
+        click.secho(f"Error: File not found {input_file}", err=True, fg="red", nl=True)
+        return
+
+    data = run_kernel(kind, input_file, chunksize=chunksize, threshold=threshold)
+    output_file = write_csv(data, output_file, compress)
+    click.secho("finished writing to file: ", fg="green", nl=False)
+    click.secho(f"{output_file}", fg="yellow", nl=True)
+
+
+@cli.command("stage-stats")
+@click.argument("directory", type=str)
+@click.argument("output", type=str)
+@click.option(
+    "--v7-filter",
+    help="only read dss files whose name contains this string, e.g. V7",
+    default=None,
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    help="number of reader processes, defaults to the number of CPUs",
+    default=None,
+)
+@click.option(
+    "--bin-width",
+    type=float,
+    help="histogram bin width in feet, percentiles are exact to within one bin",
+    default=DEFAULT_BIN_WIDTH,
+)
+@click.option(
+    "--chunk-years",
+    type=int,
+    help="years of a series read at a time",
+    default=10,
+)
+@click.option(
+    "--levels",
+    help="comma separated stages, also write the fraction of time at or above each to <OUTPUT>_exceedance.csv",
+    default=None,
+)
+@compress_option
+def stage_stats(
+    directory, output, v7_filter, workers, bin_width, chunk_years, levels, compress
+):
+    """
+    Stage percentiles at the water level compliance stations.
+
+    The hydro file of every scenario in DIRECTORY is read in chunks and the stage at
+    MHO, DGL and OLD is counted into histograms, so all scenarios are done in one pass
+    without loading the records. OUTPUT gets percentiles 0 to 100 for every scenario
+    and station, i.e. the exceedance curve.
     """
-    ...
+    if not os.path.isdir(directory):
+        click.secho(f"Error: Directory not found {directory}", err=True, fg="red")
+        raise click.exceptions.Exit(1)
+
+    files = {}
+    for scenario, found in find_scenario_files(directory, v7_filter).items():
+        if len(found.get("hydro", [])) == 1:
+            files[scenario] = found["hydro"][0]
+        else:
+            click.secho(
+                f"skipping {scenario}: expected one hydro file, found "
+                f"{len(found.get('hydro', []))}",
+                err=True,
+                fg="yellow",
+            )
 
+    sketches, errors = sketch_dss_files(
+        files, bin_width=bin_width, chunk_years=chunk_years, max_workers=workers
+    )
+    base = output.removesuffix(COMPRESSIONS.get(compress, ""))
+    exceedance_file = f"{os.path.splitext(base)[0]}_exceedance.csv"
+    output = write_csv(sketches.quantiles(), output, compress)
+    click.secho("finished writing to file: ", fg="green", nl=False)
+    click.secho(f"{output}", fg="yellow", nl=True)
+    if levels:
+        exceedance_file = write_csv(
+            sketches.exceedance([float(x) for x in levels.split(",")]),
+            exceedance_file,
+            compress,
+        )
+        click.secho("finished writing to file: ", fg="green", nl=False)
+        click.secho(f"{exceedance_file}", fg="yellow", nl=True)
+
+    for scenario, error in errors.items():
+        click.secho(f"failed scenario {scenario}: {error}", err=True, fg="red")
+    if errors:
+        raise click.exceptions.Exit(1)
 
+
+# named so it does not shadow the sdgtools.jobs module
 @cli.group(
+    "jobs",
     help="""
+    Scenario job queue.
+
+    Queue scenario loads in a SQLite file on shared storage and run them with any
+    number of `sdgtools worker` processes on one or more machines.
+    """,
+)
+def jobs_group(): ...
+
+
+@jobs_group.command("enqueue")
+@click.argument("queue_file")
+@click.argument("directory")
+@click.argument("target")
+@click.option(
+    "--v7-filter",
+    help="only use dss files whose name contains this string, e.g. V7",
+    default=None,
+)
+@click.option(
+    "--quarantine-dir",
+    help="write rows failing validation to <dir>/<scenario>_quarantine.csv and load the rest",
+    default=None,
+)
+@click.option("--max-attempts", type=int, default=3, help="tries per job")
+@click.option(
+    "--requeue", is_flag=True, help="run scenarios again that are done or failed"
+)
+def jobs_enqueue(
+    queue_file, directory, target, v7_filter, quarantine_dir, max_attempts, requeue
+):
+    """
+    Queue a job for every scenario in DIRECTORY.
+
+    TARGET is a postgres connection string, or a directory where each scenario is
+    written as Parquet (readable with `duckdb:///TARGET`). Loading a scenario again
+    replaces its data.
+    """
+    outcome = enqueue_scenario_dir(
+        JobQueue(queue_file),
+        directory,
+        target,
+        v7_filter,
+        quarantine_dir,
+        max_attempts,
+        requeue,
+    )
+    for scenario, status in outcome.items():
+        click.secho(
+            f"{scenario}: {status}", fg="green" if status == "queued" else "yellow"
+        )
+
+
+@jobs_group.command("status")
+@click.argument("queue_file")
+def jobs_status(queue_file):
+    """
+    Show the jobs in a queue.
+    """
+    queue = JobQueue(queue_file)
+    jobs = queue.jobs()
+    if len(jobs):
+        click.echo(jobs.drop(columns=["target", "result"]).to_string(index=False))
+    click.secho(
+        ", ".join(f"{n} {status}" for status, n in queue.counts().items()), fg="green"
+    )
+
+
+@jobs_group.command("retry")
+@click.argument("queue_file")
+def jobs_retry(queue_file):
+    """
+    Queue the failed jobs again.
+    """
+    n = JobQueue(queue_file).retry_failed()
+    click.secho(f"queued {n} failed jobs again", fg="green")
+
+
+@cli.command()
+@click.argument("queue_file")
+@click.option("--id", "worker_id", help="worker name, defaults to host:pid")
+@click.option(
+    "--lease",
+    type=float,
+    default=900,
+    help="seconds before a job of an unresponsive worker is handed out again",
+)
+@click.option(
+    "--poll", type=float, default=5, help="seconds to wait when the queue is empty"
+)
+@click.option(
+    "--exit-when-empty",
+    is_flag=True,
+    help="stop once no jobs are queued or running",
+)
+@click.option("--max-jobs", type=int, default=None, help="stop after this many jobs")
+def worker(queue_file, worker_id, lease, poll, exit_when_empty, max_jobs):
+    """
+    Run scenario jobs from a queue.
+
+    Start one worker per machine (or several on one machine), each claims a job,
+    runs it and acknowledges it. Failed jobs are retried with backoff.
+    """
+    colors = {"start": "white", "done": "green", "failed": "red"}
+
+    def report(event, job, detail):
+        click.secho(
+            f"{event} {job.scenario} (attempt {job.attempts}/{job.max_attempts}) {detail}",
+            fg=colors[event],
+        )
+
+    n = run_worker(
+        JobQueue(queue_file),
+        worker_id,
+        lease=lease,
+        poll=poll,
+        exit_when_empty=exit_when_empty,
+        max_jobs=max_jobs,
+        on_event=report,
+    )
+    click.secho(f"worker ran {n} jobs", fg="green")
+
+
+@cli.group(help="""
     Database interactions.
 
     This command allows you to interfact with the datasbase. You can upload and query the system
     to export data.
-    """
-)
+    """)
 def db(): ...
 
 
+def _validated_chunks(chunks, file: str, quarantine: str | None):
+    """
+    Validate each chunk before it is loaded. Without `quarantine` a chunk with bad
+    rows raises ValidationError, otherwise its bad rows are appended to `quarantine`
+    and the rest is loaded.
+    """
+    n_bad = 0
+    for i, chunk in enumerate(chunks):
+        report = validate_long(chunk)
+        if len(report.issues):
+            click.secho(
+                report.summary(f"{file} chunk {i + 1}"),
+                fg="yellow" if report.ok else "red",
+            )
+        if not report.ok:
+            if quarantine is None:
+                raise ValidationError(f"{file} chunk {i + 1} has bad rows", report)
+            chunk, bad = report.split(chunk)
+            bad.to_csv(
+                quarantine, index=False, mode="a" if n_bad else "w", header=n_bad == 0
+            )
+            n_bad += len(bad)
+        yield chunk
+    if n_bad:
+        click.secho(f"wrote {n_bad} bad rows to: ", fg="yellow", nl=False)
+        click.secho(quarantine, fg="yellow")
+
+
 @db.command()
 @click.argument("file")
 @click.argument("scenario_name")
 @click.argument("connection_string")
-def insert(file: str, scenario_name: str, connection_string: str):
+@click.option(
+    "--quarantine",
+    help="load the valid rows and write rows failing validation to this csv instead of failing",
+    default=None,
+)
+@click.option(
+    "--validate/--no-validate",
+    default=True,
+    help="check the data before loading it",
+)
+@click.option(
+    "--chunksize",
+    type=int,
+    help="rows read, validated and copied at a time when loading into postgres",
+    default=1_000_000,
+)
+def insert(
+    file: str,
+    scenario_name: str,
+    connection_string: str,
+    quarantine: str | None,
+    validate: bool,
+    chunksize: int,
+):
     """
     Database: Insert Scenario Data
+
+    CONNECTION_STRING is a postgres connection string or a local store: a DuckDB file
+    (.duckdb), duckdb:///<dir> for a directory of Parquet files, or a SQLite file.
+
+    The data is validated first (missing datetimes, unknown units, duplicates, stage
+    at or below the gate bottom), bad data is not loaded unless --quarantine is given.
+
+    FILE may be gzip or zstd compressed (e.g. written with --compress), it is
+    decompressed as it is read. Into postgres the file is streamed into COPY
+    --chunksize rows at a time in one transaction, each chunk is validated before it
+    is copied, so duplicates and gaps are only found within a chunk. Local stores read
+    and validate the whole file.
     """
-    data = pd.read_csv(file, dtype={"scenario_id": int, "value": float})
-    insert_dsm2_data(data, scenario_name, connection_string)
+    postgres = connection_string.startswith(("postgresql://", "postgres://"))
+    dtype = {"scenario_id": int, "value": float}
+    if postgres:
+        chunks = read_csv_chunks(file, chunksize, dtype=dtype)
+        if validate:
+            chunks = _validated_chunks(chunks, file, quarantine)
+        try:
+            rows = insert_dsm2_data(chunks, scenario_name, connection_string)
+        except ValidationError:
+            click.secho(
+                "nothing loaded, fix the data or use --quarantine", err=True, fg="red"
+            )
+            raise click.exceptions.Exit(1)
+        except Exception as e:
+            click.secho(f"nothing loaded: {e}", err=True, fg="red")
+            raise click.exceptions.Exit(1)
+        click.secho(f"copied {rows} rows for '{scenario_name}'", fg="green")
+        return
+
+    with open_csv(file) as f:
+        data = pd.read_csv(f, dtype=dtype)
+
+    if validate:
+        report = validate_long(data)
+        if len(report.issues):
+            click.secho(report.summary(file), fg="yellow" if report.ok else "red")
+        if not report.ok:
+            if quarantine is None:
+                click.secho(
+                    "not loading, fix the data or use --quarantine", err=True, fg="red"
+                )
+                raise click.exceptions.Exit(1)
+            data, bad = report.split(data)
+            bad.to_csv(quarantine, index=False)
+            click.secho(f"wrote {len(bad)} bad rows to: ", fg="yellow", nl=False)
+            click.secho(quarantine, fg="yellow")
+
+    try:
+        rows = open_store(connection_string).append(data, scenario_name)
+    except (ValueError, NotImplementedError) as e:
+        click.secho(str(e), err=True, fg="red")
+        raise click.exceptions.Exit(1)
+    click.secho(
+        f"appended {rows} rows for '{scenario_name}' to: ", fg="green", nl=False
+    )
+    click.secho(connection_string, fg="yellow")
+
+
+@db.command()
+@click.argument("store")
+@click.argument("output")
+@click.option(
+    "--scenario", "-s", multiple=True, help="scenario(s) to export, default all"
+)
+@click.option("--node", help="only export this node")
+@click.option("--param", help="only export this param")
+@click.option("--start", help="start datetime, e.g. 2016-01-01")
+@click.option("--end", help="end datetime, e.g. 2016-12-31")
+@click.option(
+    "--freq",
+    type=click.Choice(["day", "week", "month"]),
+    help="aggregate to daily, weekly or monthly values",
+)
+@click.option(
+    "--how",
+    type=click.Choice(["mean", "sum", "count", "min", "max"]),
+    default="mean",
+    help="aggregation used with --freq",
+)
+@compress_option
+def export(store, output, scenario, node, param, start, end, freq, how, compress):
+    """
+    Database: Export Scenario Data
+
+    Write the rows of STORE matching the filters to OUTPUT (.csv or .parquet),
+    optionally aggregated with --freq. On DuckDB stores the query and aggregation run
+    in DuckDB and are streamed to OUTPUT.
+    """
+    if compress is not None:
+        if os.path.splitext(output)[1].lower() in (".parquet", ".pq"):
+            click.secho("Error: --compress is for csv output", err=True, fg="red")
+            raise click.exceptions.Exit(1)
+        output = compressed_path(output, compress)
+    try:
+        rows = open_store(store).export(
+            output,
+            list(scenario) or None,
+            node,
+            param,
+            start,
+            end,
+            freq,
+            how,
+            compress,
+        )
+    except ValueError as e:
+        click.secho(str(e), err=True, fg="red")
+        raise click.exceptions.Exit(1)
+    click.secho(f"wrote {rows} rows to: ", fg="green", nl=False)
+    click.secho(output, fg="yellow")
+
+
+@cli.command("serve")
+@click.argument("store")
+@click.option("--host", default="127.0.0.1", help="address to listen on")
+@click.option("--port", type=int, default=8080, help="port to listen on")
+@click.option(
+    "--cache-mb",
+    type=int,
+    default=256,
+    help="memory for cached series and metrics, in MB",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="threads running store queries and post-processing",
+)
+def serve(store, host, port, cache_mb, workers):
+    """
+    Serve scenario queries over HTTP.
+
+    STORE is a postgres connection string or a local store: a DuckDB file (.duckdb),
+    duckdb:///<dir> for a directory of Parquet files, a SQLite file or a Parquet
+    file/directory. Endpoints: /scenarios, /series, /metrics, /metrics/<name> and
+    /cache.
+    """
+    try:
+        series_store = open_store(store)
+    except (ValueError, NotImplementedError) as e:
+        click.secho(str(e), err=True, fg="red")
+        raise click.exceptions.Exit(1)
+    click.secho(f"serving {store} on http://{host}:{port}", fg="green")
+    try:
+        serve_queries(series_store, host, port, cache_mb * 1024**2, workers)
+    except KeyboardInterrupt:
+        click.secho("stopped", fg="yellow")
 
 
 if __name__ == "__main__":
@@ -1,47 +1,113 @@
+import io
+from typing import Iterable
+
 import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import execute_values
 import pandas as pd
 
 from ..readers.scenario import ScenarioData
+from ..post_process import calc_scenario_velocity, calc_velocity_streaks
 
+DSM2_COLUMNS = ["datetime", "node", "param", "value", "unit"]
 
-def insert_scenario_data(data: ScenarioData, conn_creds: str): ...
 
+def make_conn_string(conn_creds: dict | str) -> str:
+    if isinstance(conn_creds, dict):
+        conn_creds = f"postgresql://{conn_creds['user']}:{conn_creds['password']}@{conn_creds['host']}:{conn_creds['port']}/{conn_creds['dbname']}"
+    return conn_creds
 
-import io
 
+def get_scenario_id(cur, scenario_name: str) -> int:
+    """
+    Look up the id of a scenario, creating the scenario if it does not exist yet.
+    """
+    cur.execute("SELECT id FROM scenarios WHERE name = %s", (scenario_name,))
+    scenario_id = cur.fetchone()
+    if not scenario_id:
+        cur.execute(
+            "INSERT INTO scenarios(name) VALUES(%s) RETURNING id", (scenario_name,)
+        )
+        scenario_id = cur.fetchone()
+    return scenario_id[0]
 
-def insert_dsm2_data(data: pd.DataFrame, scenario_name: str, conn_creds: dict | str):
-    if isinstance(conn_creds, dict):
-        conn_creds = f"postgresql://{conn_creds['user']}:{conn_creds['password']}@{conn_creds['host']}:{conn_creds['port']}/{conn_creds['dbname']}"
 
-    with psycopg2.connect(conn_creds) as conn:
+def delete_scenario_data(cur, scenario_id: int) -> int:
+    """
+    Delete all dsm2 rows of a scenario so it can be loaded again, the caller is
+    responsible for the commit. Returns the number of rows deleted.
+    """
+    cur.execute("DELETE FROM dsm2 WHERE scenario_id = %s", (scenario_id,))
+    return cur.rowcount
+
+
+def copy_dsm2_data(cur, data: pd.DataFrame, scenario_id: int) -> int:
+    """
+    COPY long format data into the dsm2 table, the caller is responsible for the commit.
+
+    Returns the number of rows copied.
+    """
+    buffer = io.StringIO()
+    data[DSM2_COLUMNS].assign(scenario_id=scenario_id).to_csv(
+        buffer, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S"
+    )
+    buffer.seek(0)
+
+    copy_sql = """
+        COPY dsm2(datetime, node, param, value, unit, scenario_id)
+        FROM STDIN WITH CSV
+    """
+    cur.copy_expert(copy_sql, buffer)
+    return len(data)
+
+
+def insert_scenario_data(data: ScenarioData, conn_creds: dict | str) -> int:
+    """
+    Insert all the series of a scenario along with its calculated velocity and velocity
+    streaks in a single transaction. Returns the number of rows inserted.
+    """
+    velocity = calc_scenario_velocity(data.sdg_flow, data.sdg_stage, data.echo_config)
+    frames = [
+        data.sdg_stage,
+        data.sdg_flow,
+        data.sdg_gate_ops,
+        data.wl_compliance,
+        velocity,
+        calc_velocity_streaks(velocity),
+    ]
+
+    with psycopg2.connect(make_conn_string(conn_creds)) as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT id FROM scenarios WHERE name = %s", (scenario_name,))
-            scenario_id = cur.fetchone()
-            if not scenario_id:
-                scenario_id = insert_scenario(scenario_name, conn_creds)
-            scenario_id = scenario_id[0]
-
-            data["scenario_id"] = scenario_id
-            # data["datetime"] = data["datetime"].dt.to_pydatetime()
-            data["datetime"] = data["datetime"].dt.strftime("%Y-%m-%d %H:%M:%S")
-
-            buffer = io.StringIO()
-            data.to_csv(buffer, index=False, header=False)
-            buffer.seek(0)
-
-            copy_sql = """
-                COPY dsm2(datetime, node, param, value, unit, scenario_id)
-                FROM STDIN WITH CSV
-            """
-            try:
-                cur.copy_expert(copy_sql, buffer)
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                print(f"Error during COPY: {e}")
+            scenario_id = get_scenario_id(cur, data.name)
+            rows = sum(copy_dsm2_data(cur, df, scenario_id) for df in frames)
+    return rows
+
+
+def insert_dsm2_data(
+    data: pd.DataFrame | Iterable[pd.DataFrame],
+    scenario_name: str,
+    conn_creds: dict | str,
+) -> int:
+    """
+    COPY long format data into the dsm2 table in one transaction. `data` is a frame or
+    an iterable of frames (e.g. `sdgtools.writers.csv.read_csv_chunks`), each frame is
+    copied as soon as it is read. An error while reading or copying rolls the whole
+    load back and is raised.
+
+    Returns the number of rows copied.
+    """
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+
+    conn = psycopg2.connect(make_conn_string(conn_creds))
+    try:
+        # commits on success, rolls back and raises on error
+        with conn:
+            with conn.cursor() as cur:
+                scenario_id = get_scenario_id(cur, scenario_name)
+                rows = sum(copy_dsm2_data(cur, df, scenario_id) for df in frames)
+    finally:
+        conn.close()
+    return rows
 
 
 def insert_scenario(scenario_name: str, conn_creds: str):
@@ -1,9 +1,9 @@
 import psycopg2
 import pandas as pd
 from sdgtools.readers.scenario import ScenarioData
+from sdgtools.db import insert_scenario_data
 
 
 # insert all the data
-def insert(scenario: ScenarioData):
-    scenario_name = ScenarioData.name
-    scenario_config = ScenarioData.echo_config
+def insert(scenario: ScenarioData, conn_creds: dict | str) -> int:
+    return insert_scenario_data(scenario, conn_creds)
@@ -0,0 +1,437 @@
+"""
+Read access to stored scenario data behind one small interface.
+
+Every store returns long format frames (datetime, node, param, value, unit) for a
+scenario, so the query service and analysis code do not care whether the data lives in
+Postgres, a local SQLite file or Parquet files.
+"""
+
+import glob
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import List, Optional
+
+import pandas as pd
+import psycopg2
+
+from . import DSM2_COLUMNS, copy_dsm2_data, get_scenario_id, make_conn_string
+from ..post_process.buckets import BUCKET_FREQS, aggregate
+from ..writers.csv import write_csv
+
+DUCKDB_EXTENSIONS = (".duckdb", ".ddb")
+
+SQL_AGGREGATES = {
+    "mean": "avg",
+    "sum": "sum",
+    "count": "count",
+    "min": "min",
+    "max": "max",
+}
+
+
+def _is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+class SeriesStore:
+    """
+    Base class of the stores.
+    """
+
+    def scenarios(self) -> List[str]:
+        raise NotImplementedError
+
+    def query(
+        self,
+        scenario: str,
+        node: Optional[str] = None,
+        param: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def append(self, data: pd.DataFrame, scenario: str) -> int:
+        raise NotImplementedError(f"{type(self).__name__} is read only")
+
+    def aggregate(
+        self,
+        freq: str = "day",
+        how: str = "mean",
+        scenarios: Optional[List[str]] = None,
+        node: Optional[str] = None,
+        param: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Daily, weekly or monthly values of every scenario/node/param.
+
+        Parameters:
+        - freq (str): Bucket size, one of day, week or month.
+        - how (str): One of sum, mean, count, min or max.
+        - scenarios (list or None): scenarios to include, defaults to all of them.
+        - node, param, start, end: filters as in `query`.
+
+        Returns:
+        - DataFrame: scenario, node, param, datetime (start of bucket) and value.
+        """
+        frames = []
+        for scenario in scenarios or self.scenarios():
+            df = self.query(scenario, node, param, start, end)
+            frames.append(
+                aggregate(df, freq, how, ["node", "param"]).assign(scenario=scenario)
+            )
+        out = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return out.reindex(columns=["scenario", "node", "param", "datetime", "value"])
+
+    def export(
+        self,
+        output: str,
+        scenarios: Optional[List[str]] = None,
+        node: Optional[str] = None,
+        param: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        freq: Optional[str] = None,
+        how: str = "mean",
+        compress: Optional[str] = None,
+    ) -> int:
+        """
+        Write the rows matching the filters, aggregated when `freq` is given, to a CSV or
+        Parquet (.parquet/.pq) file. CSV output is compressed with `compress` ("gzip" or
+        "zstd"). Returns the number of rows written.
+        """
+        if freq is not None:
+            df = self.aggregate(freq, how, scenarios, node, param, start, end)
+        else:
+            frames = [
+                self.query(s, node, param, start, end).assign(scenario=s)
+                for s in scenarios or self.scenarios()
+            ]
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if _is_parquet(output):
+            df.to_parquet(output, index=False)
+        else:
+            write_csv(df, output, compress)
+        return len(df)
+
+
+class SQLiteStore(SeriesStore):
+    """
+    Store in a SQLite file, uses the same `data` table as `insert_into_database`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self):
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS data (
+                    datetime TEXT, node TEXT, parameter TEXT, value REAL,
+                    unit TEXT, scenario TEXT)""")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS data_lookup ON data (scenario, node, parameter, datetime)"
+            )
+
+    def append(self, data: pd.DataFrame, scenario: str) -> int:
+        self.create()
+        rows = data[DSM2_COLUMNS].assign(scenario=scenario)
+        rows["datetime"] = pd.to_datetime(rows["datetime"]).dt.strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        rows = rows.astype({c: object for c in ["node", "param", "unit", "scenario"]})
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT INTO data (datetime, node, parameter, value, unit, scenario)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                rows.itertuples(index=False, name=None),
+            )
+        return len(rows)
+
+    def scenarios(self) -> List[str]:
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT scenario FROM data")]
+
+    def query(self, scenario, node=None, param=None, start=None, end=None):
+        names = {"scenario": "scenario", "node": "node", "param": "parameter"}
+        clauses, args = [], []
+        for key, value in [("scenario", scenario), ("node", node), ("param", param)]:
+            if value is not None:
+                clauses.append(f"{names[key]} = ?")
+                args.append(value)
+        if start is not None:
+            clauses.append("datetime >= ?")
+            args.append(str(pd.Timestamp(start)))
+        if end is not None:
+            clauses.append("datetime <= ?")
+            args.append(str(pd.Timestamp(end)))
+        q = f"""SELECT datetime, node, parameter AS param, value, unit FROM data
+                WHERE {' AND '.join(clauses)} ORDER BY node, parameter, datetime"""
+        with self._connect() as conn:
+            df = pd.read_sql_query(q, conn, params=args)
+        df["datetime"] = pd.to_datetime(df["datetime"])
+        return df
+
+
+class ParquetStore(SeriesStore):
+    """
+    Long format Parquet file or directory of files with a `scenario` column. Filters are
+    pushed down to the Parquet reader so only matching row groups are read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def scenarios(self) -> List[str]:
+        df = pd.read_parquet(self.path, columns=["scenario"])
+        return sorted(df["scenario"].astype(str).unique().tolist())
+
+    def query(self, scenario, node=None, param=None, start=None, end=None):
+        filters = [("scenario", "==", scenario)]
+        if node is not None:
+            filters.append(("node", "==", node))
+        if param is not None:
+            filters.append(("param", "==", param))
+        if start is not None:
+            filters.append(("datetime", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("datetime", "<=", pd.Timestamp(end)))
+        df = pd.read_parquet(self.path, columns=DSM2_COLUMNS, filters=filters)
+        return df.sort_values(["node", "param", "datetime"], ignore_index=True)
+
+
+class DuckDBStore(SeriesStore):
+    """
+    Embedded columnar store queried with DuckDB, either a DuckDB database file with a
+    dsm2 table or a directory of Parquet files partitioned by scenario
+    (`<dir>/scenario=<name>/*.parquet`). Aggregations and exports run as SQL inside
+    DuckDB and stream to disk, so they work on data larger than memory.
+
+    DuckDB is an optional dependency, install it with `pip install duckdb`.
+    """
+
+    COLUMNS = """datetime TIMESTAMP, node VARCHAR, param VARCHAR, value DOUBLE,
+                 unit VARCHAR, scenario VARCHAR"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = os.path.splitext(path)[1].lower() not in DUCKDB_EXTENSIONS
+
+    @contextmanager
+    def _connect(self):
+        import duckdb
+
+        if not self.parquet:
+            conn = duckdb.connect(self.path)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS dsm2 ({self.COLUMNS})")
+        else:
+            conn = duckdb.connect()
+            files = os.path.join(self.path, "**", "*.parquet")
+            if glob.glob(files, recursive=True):
+                files = files.replace("'", "''")
+                conn.execute(f"""CREATE VIEW dsm2 AS SELECT * FROM read_parquet(
+                        '{files}', hive_partitioning = true,
+                        hive_types = {{'scenario': VARCHAR}})""")
+            else:
+                conn.execute(f"CREATE TEMP TABLE dsm2 ({self.COLUMNS})")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def append(self, data: pd.DataFrame, scenario: str) -> int:
+        rows = data[DSM2_COLUMNS]
+        select = """SELECT CAST(datetime AS TIMESTAMP) AS datetime,
+                        CAST(node AS VARCHAR) AS node, CAST(param AS VARCHAR) AS param,
+                        CAST(value AS DOUBLE) AS value, CAST(unit AS VARCHAR) AS unit,
+                        $scenario AS scenario
+                    FROM rows"""
+        with self._connect() as conn:
+            conn.register("rows", rows)
+            if self.parquet:
+                os.makedirs(self.path, exist_ok=True)
+                conn.sql(select, params={"scenario": scenario}).to_table("incoming")
+                path = self.path.replace("'", "''")
+                conn.execute(f"""COPY incoming TO '{path}'
+                        (FORMAT parquet, PARTITION_BY (scenario), APPEND)""")
+            else:
+                conn.execute(f"INSERT INTO dsm2 {select}", {"scenario": scenario})
+        return len(rows)
+
+    def scenarios(self) -> List[str]:
+        with self._connect() as conn:
+            q = "SELECT DISTINCT scenario FROM dsm2 ORDER BY scenario"
+            return [r[0] for r in conn.execute(q).fetchall()]
+
+    def _where(self, scenarios, node, param, start, end):
+        clauses, args = [], []
+        if scenarios is not None:
+            clauses.append(f"scenario IN ({', '.join('?' * len(scenarios))})")
+            args.extend(scenarios)
+        for column, op, value in [
+            ("node", "=", node),
+            ("param", "=", param),
+            ("datetime", ">=", start),
+            ("datetime", "<=", end),
+        ]:
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                args.append(pd.Timestamp(value) if column == "datetime" else value)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), args
+
+    def query(self, scenario, node=None, param=None, start=None, end=None):
+        where, args = self._where([scenario], node, param, start, end)
+        q = f"""SELECT datetime, node, param, value, unit FROM dsm2 {where}
+                ORDER BY node, param, datetime"""
+        with self._connect() as conn:
+            df = conn.execute(q, args).df()
+        df["datetime"] = df["datetime"].astype("datetime64[ns]")
+        return df
+
+    def _aggregate_sql(self, freq, how, scenarios, node, param, start, end):
+        if freq not in BUCKET_FREQS:
+            raise ValueError(f"freq must be one of {', '.join(BUCKET_FREQS)}")
+        if how not in SQL_AGGREGATES:
+            raise ValueError(f"how must be one of {', '.join(SQL_AGGREGATES)}")
+        where, args = self._where(scenarios, node, param, start, end)
+        q = f"""SELECT scenario, node, param, date_trunc('{freq}', datetime) AS datetime,
+                       {SQL_AGGREGATES[how]}(value) AS value
+                FROM dsm2 {where}
+                GROUP BY ALL ORDER BY scenario, node, param, datetime"""
+        return q, args
+
+    def aggregate(
+        self,
+        freq="day",
+        how="mean",
+        scenarios=None,
+        node=None,
+        param=None,
+        start=None,
+        end=None,
+    ):
+        q, args = self._aggregate_sql(freq, how, scenarios, node, param, start, end)
+        with self._connect() as conn:
+            df = conn.execute(q, args).df()
+        df["datetime"] = df["datetime"].astype("datetime64[ns]")
+        return df
+
+    def sql(self, query: str, params: Optional[list] = None) -> pd.DataFrame:
+        """
+        Run any SQL against the store, the data is available as the dsm2 table with
+        columns datetime, node, param, value, unit and scenario.
+        """
+        with self._connect() as conn:
+            return conn.execute(query, params or []).df()
+
+    def export(
+        self,
+        output,
+        scenarios=None,
+        node=None,
+        param=None,
+        start=None,
+        end=None,
+        freq=None,
+        how="mean",
+        compress=None,
+    ):
+        if freq is not None:
+            q, args = self._aggregate_sql(freq, how, scenarios, node, param, start, end)
+        else:
+            where, args = self._where(scenarios, node, param, start, end)
+            q = f"""SELECT scenario, datetime, node, param, value, unit FROM dsm2 {where}
+                    ORDER BY scenario, node, param, datetime"""
+        with self._connect() as conn:
+            rel = conn.sql(q, params=args)
+            n = rel.count("*").fetchone()[0]
+            if _is_parquet(output):
+                rel.write_parquet(output)
+            else:
+                rel.write_csv(
+                    output,
+                    header=True,
+                    timestamp_format="%Y-%m-%d %H:%M:%S",
+                    compression=compress or "none",
+                )
+        return n
+
+
+class PostgresStore(SeriesStore):
+    """
+    The dsm2 and scenarios tables loaded by `sdgtools db insert` and `sdgtools scenario`.
+    """
+
+    def __init__(self, conn_creds: dict | str):
+        self.conn_creds = make_conn_string(conn_creds)
+
+    def append(self, data: pd.DataFrame, scenario: str) -> int:
+        with psycopg2.connect(self.conn_creds) as conn:
+            with conn.cursor() as cur:
+                return copy_dsm2_data(cur, data, get_scenario_id(cur, scenario))
+
+    def scenarios(self) -> List[str]:
+        with psycopg2.connect(self.conn_creds) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT name FROM scenarios ORDER BY name")
+                return [r[0] for r in cur.fetchall()]
+
+    def query(self, scenario, node=None, param=None, start=None, end=None):
+        clauses, args = ["s.name = %s"], [scenario]
+        for column, op, value in [
+            ("d.node", "=", node),
+            ("d.param", "=", param),
+            ("d.datetime", ">=", start),
+            ("d.datetime", "<=", end),
+        ]:
+            if value is not None:
+                clauses.append(f"{column} {op} %s")
+                args.append(value)
+        q = f"""SELECT d.datetime, d.node, d.param, d.value, d.unit
+                FROM dsm2 d JOIN scenarios s ON s.id = d.scenario_id
+                WHERE {' AND '.join(clauses)}
+                ORDER BY d.node, d.param, d.datetime"""
+        with psycopg2.connect(self.conn_creds) as conn:
+            with conn.cursor() as cur:
+                cur.execute(q, args)
+                rows = cur.fetchall()
+        df = pd.DataFrame(rows, columns=DSM2_COLUMNS)
+        df["datetime"] = pd.to_datetime(df["datetime"])
+        return df
+
+
+def open_store(uri: str) -> SeriesStore:
+    """
+    Open a store from a connection string or path.
+
+    - postgresql://... -> PostgresStore
+    - *.db, *.sqlite, *.sqlite3 or sqlite:///path -> SQLiteStore
+    - *.duckdb, *.ddb or duckdb:///path -> DuckDBStore, duckdb:///dir for a directory
+      of Parquet files queried through DuckDB
+    - *.parquet or a directory -> ParquetStore
+    """
+    if uri.startswith(("postgresql://", "postgres://")):
+        return PostgresStore(uri)
+    if uri.startswith("duckdb:///"):
+        return DuckDBStore(uri[len("duckdb:///") :])
+    if uri.startswith("sqlite:///"):
+        return SQLiteStore(uri[len("sqlite:///") :])
+    ext = os.path.splitext(uri)[1].lower()
+    if ext in (".db", ".sqlite", ".sqlite3"):
+        return SQLiteStore(uri)
+    if ext in DUCKDB_EXTENSIONS:
+        return DuckDBStore(uri)
+    if _is_parquet(uri) or os.path.isdir(uri):
+        return ParquetStore(uri)
+    raise ValueError(f"can not tell what kind of store '{uri}' is")
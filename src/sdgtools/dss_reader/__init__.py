@@ -1,18 +1,31 @@
 import pandas as pd
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import os
+import re
 import datetime
 import pyhecdss
-from pyhecdss.pyhecdss import DSSFile, get_matching_ts
-from sdgtools.utils import add_node_and_param_cols
+from pyhecdss import DSSFile, get_matching_ts
+from sdgtools.readers.catalog import PathCatalog
+from sdgtools.readers.catalog import get_matching_ts as catalog_matching_ts
+from sdgtools.utils import add_node_and_param_cols, compact_frame, make_wide_frame
 
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Tuple
 
 from pandas.core.series import validate_bool_kwarg
 
 param_to_unit = {"FLOW": "CFS", "STAGE": "FEET", "DEVICE-FLOW": "CFS"}
 
+# filename patterns for the files that make up a scenario, e.g. FPV1Ma_SDG.dss,
+# FPV1Ma_hydro_V7.dss and hydro_echo_FPV1Ma.inp all belong to scenario FPV1Ma
+SCENARIO_FILE_PATTERNS = {
+    "sdg": re.compile(r"^(?P<scenario>[^_]+)_sdg(_.*)?\.dss$", re.IGNORECASE),
+    "hydro": re.compile(r"^(?P<scenario>[^_]+)_hydro(_.*)?\.dss$", re.IGNORECASE),
+    "echo": re.compile(r"^hydro_echo_(?P<scenario>[^_]+)(_.*)?\.inp$", re.IGNORECASE),
+}
+REQUIRED_SCENARIO_FILES = ["sdg", "hydro"]
+
 
 def read_echo_file(filepath: str):
     with open(filepath, "r") as f:
@@ -60,79 +73,181 @@ def make_regex_from_parts(A=None, B=None, C=None, D=None, E=None, F=None):
 
 
 def get_all_data_from_dsm2_dss(
-    file: str, parts_regex: str | None = make_regex_from_parts()
+    file: str,
+    parts_regex: str | None = make_regex_from_parts(),
+    compact: bool = False,
+    wide: bool = False,
+    catalog: PathCatalog | None = None,
 ) -> pd.DataFrame:
-    all_paths = list(pyhecdss.get_matching_ts(file, parts_regex))
+    """
+    Read all time series matching `parts_regex` into a long format frame, or with `wide`
+    a frame with a shared DatetimeIndex and one column per pathname (see `make_wide_frame`).
+    With a `catalog` the pathnames are looked up in the index (see `sdgtools.readers.catalog`).
+    """
+    all_paths = list(catalog_matching_ts(file, parts_regex, catalog))
     if len(all_paths) == 0:
         return pd.DataFrame()
+    if wide:
+        return make_wide_frame(
+            [p.data for p in all_paths],
+            [
+                param_to_unit.get(p.data.columns[0].split("/")[3], p.units)
+                for p in all_paths
+            ],
+            lower=False,
+            float_dtype="float32" if compact else "float64",
+        )
     data = [add_node_and_param_cols(all_paths[i].data) for i in range(len(all_paths))]
     concat_data = pd.concat(data)
     concat_data["unit"] = concat_data["param"].map(param_to_unit)
+    if compact:
+        concat_data = compact_frame(concat_data)
     return concat_data
 
 
+@dataclass
+class ScenarioDirResult:
+    """
+    Output of `read_scenario_dir`. `data` holds every scenario that was read
+    successfully, `errors` the reason each failed scenario was left out.
+    """
+
+    data: Dict[str, Dict[str, pd.DataFrame]] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+def find_scenario_files(
+    dir: str, v7_filter: str | None = None
+) -> Dict[str, Dict[str, List[Path]]]:
+    """
+    Discover the sdg, hydro and echo files for every scenario in a directory.
+
+    Files are looked up in the 'output' subdirectory when there is one, otherwise in
+    `dir` itself. `v7_filter` only applies to the dss files. Returns a dict of
+    scenario name -> {"sdg": [paths], "hydro": [paths], "echo": [paths]}, a scenario
+    only has the keys for the files that were found.
+    """
+    scenario_path = Path(dir)
+    output_path = scenario_path / "output"
+    if not output_path.is_dir():
+        output_path = scenario_path
+
+    files: Dict[str, Dict[str, List[Path]]] = {}
+    for f in sorted(output_path.iterdir()):
+        if (
+            v7_filter is not None
+            and f.suffix.lower() == ".dss"
+            and v7_filter.lower() not in f.name.lower()
+        ):
+            continue
+        for kind, pattern in SCENARIO_FILE_PATTERNS.items():
+            m = pattern.match(f.name)
+            if m:
+                files.setdefault(m["scenario"], {}).setdefault(kind, []).append(f)
+                break
+
+    return files
+
+
+def _read_scenario_file(
+    kind: str, path: Path, catalog: PathCatalog | None = None
+) -> pd.DataFrame:
+    if kind == "echo":
+        df = read_echo_file(str(path))
+        if df is None:
+            raise ValueError("no GATE_WEIR_DEVICE table")
+        return df
+    return get_all_data_from_dsm2_dss(str(path), catalog=catalog)
+
+
+def iter_scenario_dir(
+    dir: str,
+    v7_filter: str | None = None,
+    max_workers: int | None = None,
+    catalog: PathCatalog | None = None,
+    errors: Dict[str, str] | None = None,
+) -> Iterator[Tuple[str, Dict[str, pd.DataFrame]]]:
+    """
+    Read the scenarios of a directory in a process pool and yield (scenario,
+    {kind: frame}) as soon as all files of a scenario are read. At most `max_workers`
+    scenarios are read at a time, so only those and the scenario being used are in
+    memory. Scenarios that can not be read are not yielded, the reason is added to
+    `errors` (scenario -> message). See `read_scenario_dir` for the parameters.
+    """
+    errors = {} if errors is None else errors
+    to_read = []
+    for scenario, files in find_scenario_files(dir, v7_filter).items():
+        missing = [k for k in REQUIRED_SCENARIO_FILES if k not in files]
+        duplicated = [k for k, paths in files.items() if len(paths) > 1]
+        if missing:
+            errors[scenario] = f"missing {', '.join(missing)} file"
+        elif duplicated:
+            errors[scenario] = (
+                f"more than one {', '.join(duplicated)} file, use v7_filter to pick one"
+            )
+        else:
+            to_read.append(
+                (scenario, {kind: paths[0] for kind, paths in files.items()})
+            )
+
+    max_scenarios = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        data: Dict[str, Dict[str, pd.DataFrame]] = {}
+        left: Dict[str, int] = {}
+        while to_read or pending:
+            while to_read and len(left) < max_scenarios:
+                scenario, files = to_read.pop(0)
+                data[scenario], left[scenario] = {}, len(files)
+                for kind, path in files.items():
+                    future = pool.submit(_read_scenario_file, kind, path, catalog)
+                    pending[future] = (scenario, kind, path)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                scenario, kind, path = pending.pop(future)
+                left[scenario] -= 1
+                try:
+                    data[scenario][kind] = future.result()
+                except Exception as e:
+                    errors.setdefault(scenario, f"reading {path.name}: {e}")
+                if left[scenario] == 0:
+                    del left[scenario]
+                    scenario_data = data.pop(scenario)
+                    if scenario not in errors:
+                        yield scenario, scenario_data
+
+
 def read_scenario_dir(
-    sdg_path: str,
-    hydro_path: str,
-    echo_path: str,
-) -> Dict[str, Dict[str, pd.DataFrame]]:
+    dir: str,
+    v7_filter: str | None = None,
+    max_workers: int | None = None,
+    catalog: PathCatalog | None = None,
+) -> ScenarioDirResult:
     """
     Reads and processes scenario data from a directory containing DSS files.
-    Matches corresponding hydro and SDG files based on naming patterns and returns their processed data.
 
-    The function expects a specific directory structure where DSS files are stored in an 'output'
-    subdirectory. It matches hydro and SDG files that share the same base name (e.g., 'scenario1_hydro.dss'
-    with 'scenario1_SDG.dss').
+    Scenarios are discovered by filename (see `SCENARIO_FILE_PATTERNS`), each scenario
+    needs an SDG and a hydro file and may have an echo file. The files of all scenarios
+    are read concurrently in a process pool. A scenario that fails to read is reported in
+    the `errors` of the result and does not affect the others. Use `iter_scenario_dir`
+    to handle each scenario as it is read instead of holding all of them.
 
     Parameters
     ----------
     dir : str
         Path to the main scenario directory. The function will look for files in a subdirectory
-        named 'output'.
+        named 'output' if there is one.
     v7_filter : str | None, optional
-        If provided, only processes files containing this string (case-insensitive).
+        If provided, only processes dss files containing this string (case-insensitive).
+    max_workers : int | None, optional
+        Number of reader processes, defaults to the number of CPUs.
+    catalog : PathCatalog | None, optional
+        Pathname index of the directory (see `sdgtools.readers.catalog`), indexed files
+        are read without cataloging them again.
     """
-    # first need to get a list of all scnarios in this folder
-    scenario_path = Path(dir)
-    output_path = scenario_path / "output"
-    output_path_files = (
-        list(output_path.iterdir())
-        if v7_filter is None
-        else [f for f in output_path.iterdir() if v7_filter.lower() in f.name.lower()]
-    )
-    hydro_files = [
-        f for f in output_path_files if "hydro" in f.name.lower() and f.suffix == ".dss"
-    ]
-
-    sdg_files = [
-        f for f in output_path_files if "sdg" in f.name.lower() and f.suffix == ".dss"
-    ]
-
-    echo_files_in_path = [
-        f for f in output_path_files if "echo" in f.name.lower() and f.suffix == ".inp"
-    ]
-
-    if len(hydro_files) != len(sdg_files):
-        raise ValueError(f"the number of hydro files and sdg must be equal")
-
-    matches = list()
-    for f in hydro_files:
-        for s in sdg_files:
-            f_split = f.stem.split("_")
-            s_split = s.stem.split("_")
-            if len(f_split) == len(s_split) and f_split[0] == s_split[0]:
-                print(f"mathing:\t\t{f} <----> {s}")
-                matches.append((f, s))
-
-    data = {}
-    try:
-        for match in matches:
-            data[str(match[0])] = {
-                "hydro": get_all_data_from_dsm2_dss(HecDss(str(match[0]))),
-                "sdg": get_all_data_from_dsm2_dss(HecDss(str(match[1]))),
-            }
-
-    except Exception as e:
-        print(e)
-
-    return data
+    result = ScenarioDirResult()
+    for scenario, data in iter_scenario_dir(
+        dir, v7_filter, max_workers, catalog, result.errors
+    ):
+        result.data[scenario] = data
+    return result
@@ -0,0 +1,436 @@
+"""
+Scenario job queue for spreading scenario loads over several machines.
+
+A coordinator enqueues one job per scenario into a SQLite file on shared storage and
+any number of `sdgtools worker` processes, on one or many machines, claim jobs, run
+read -> validate -> post-process -> load and acknowledge them.
+
+- Claiming is a single `BEGIN IMMEDIATE` transaction, so two workers never get the
+  same job.
+- A claimed job is leased to its worker. The worker extends the lease while it runs
+  and a job whose lease ran out (the worker died) is handed out again.
+- Failed jobs are retried with exponential backoff up to `max_attempts`, validation
+  errors and missing files fail straight away.
+- Outputs are idempotent: a Postgres load replaces the scenario's rows in the same
+  transaction, a Parquet output replaces the scenario's files, so running a job twice
+  gives the same result as running it once.
+
+SQLite locking needs a file system with working POSIX locks (local disk or NFSv4).
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from ..db import DSM2_COLUMNS
+from ..dss_reader import find_scenario_files
+from ..post_process import calc_scenario_velocity, calc_velocity_streaks
+from ..readers.scenario import read_echo_settings, read_hydro, read_sdg
+from ..scenario import run_scenario
+from ..validation import ValidationError, validate_frames
+
+JOB_STATUSES = ["queued", "running", "done", "failed"]
+
+# errors that will not go away by running the job again
+PERMANENT_ERRORS = (ValidationError, FileNotFoundError)
+
+
+def is_permanent(error: BaseException) -> bool:
+    """
+    True when `error`, or an error it was raised from (e.g. the ValidationError
+    inside a ScenarioPipelineError), is one of PERMANENT_ERRORS.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, PERMANENT_ERRORS):
+            return True
+        seen.add(id(error))
+        error = error.__cause__
+    return False
+
+
+@dataclass
+class Job:
+    id: int
+    scenario: str
+    target: str
+    payload: Dict
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    """
+    Scenario jobs in a SQLite file.
+    """
+
+    def __init__(self, path: str, timeout: float = 60):
+        self.path = path
+        self.timeout = timeout
+
+    @contextmanager
+    def _connect(self):
+        # autocommit mode, transactions are started explicitly where needed
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create(self):
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    scenario TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_until REAL,
+                    error TEXT,
+                    result TEXT,
+                    updated REAL,
+                    UNIQUE (scenario, target))""")
+
+    def enqueue(
+        self,
+        scenario: str,
+        target: str,
+        payload: Dict,
+        max_attempts: int = 3,
+        requeue: bool = False,
+    ) -> bool:
+        """
+        Add a job, a scenario already queued for the same target is not added twice.
+        With `requeue` a job that is done or failed is reset and run again.
+
+        Returns:
+        - bool: whether the job was added or reset.
+        """
+        self.create()
+        with self._connect() as conn:
+            cur = conn.execute(
+                """INSERT INTO jobs (scenario, target, payload, max_attempts, updated)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (scenario, target) DO UPDATE SET
+                       payload = excluded.payload, status = 'queued', attempts = 0,
+                       max_attempts = excluded.max_attempts, available_at = 0,
+                       worker = NULL, lease_until = NULL, error = NULL,
+                       updated = excluded.updated
+                   WHERE ? AND status IN ('done', 'failed')""",
+                (
+                    scenario,
+                    target,
+                    json.dumps(payload),
+                    max_attempts,
+                    time.time(),
+                    requeue,
+                ),
+            )
+            return cur.rowcount > 0
+
+    def claim(self, worker: str, lease: float) -> Optional[Job]:
+        """
+        Take the oldest job that is queued (and past its retry delay) or whose lease
+        ran out. A job whose lease ran out on its last attempt, e.g. because it killed
+        its worker, is marked failed instead.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    """UPDATE jobs SET status = 'failed', lease_until = NULL,
+                           error = 'lease ran out on the last attempt, the worker '
+                                   || coalesce(worker, '') || ' stopped responding',
+                           updated = ?
+                       WHERE status = 'running' AND lease_until < ?
+                         AND attempts >= max_attempts""",
+                    (now, now),
+                )
+                row = conn.execute(
+                    """SELECT id, scenario, target, payload, attempts, max_attempts
+                       FROM jobs
+                       WHERE (status = 'queued' AND available_at <= ?)
+                          OR (status = 'running' AND lease_until < ?
+                              AND attempts < max_attempts)
+                       ORDER BY id LIMIT 1""",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    """UPDATE jobs SET status = 'running', worker = ?,
+                           lease_until = ?, attempts = attempts + 1, updated = ?
+                       WHERE id = ?""",
+                    (worker, now + lease, now, row[0]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[4] + 1, row[5])
+
+    def heartbeat(self, job_id: int, worker: str, lease: float) -> bool:
+        """
+        Extend the lease of a running job, False when the job is no longer ours.
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                """UPDATE jobs SET lease_until = ?, updated = ?
+                   WHERE id = ? AND worker = ? AND status = 'running'""",
+                (time.time() + lease, time.time(), job_id, worker),
+            )
+            return cur.rowcount > 0
+
+    def complete(self, job_id: int, worker: str, result: Dict) -> bool:
+        with self._connect() as conn:
+            cur = conn.execute(
+                """UPDATE jobs SET status = 'done', result = ?, error = NULL,
+                       lease_until = NULL, updated = ?
+                   WHERE id = ? AND worker = ? AND status = 'running'""",
+                (json.dumps(result), time.time(), job_id, worker),
+            )
+            return cur.rowcount > 0
+
+    def fail(
+        self,
+        job_id: int,
+        worker: str,
+        error: str,
+        retry: bool = True,
+        backoff: float = 30,
+    ) -> bool:
+        """
+        Record a failed attempt. The job is queued again after `backoff` seconds,
+        doubled on every attempt, until it has used up its attempts.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                """UPDATE jobs SET
+                       status = CASE WHEN ? AND attempts < max_attempts
+                                     THEN 'queued' ELSE 'failed' END,
+                       available_at = ? * (1 << (attempts - 1)) + ?,
+                       error = ?, lease_until = NULL, updated = ?
+                   WHERE id = ? AND worker = ? AND status = 'running'""",
+                (retry, backoff, now, error, now, job_id, worker),
+            )
+            return cur.rowcount > 0
+
+    def retry_failed(self) -> int:
+        """
+        Queue every failed job again with a fresh set of attempts.
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                """UPDATE jobs SET status = 'queued', attempts = 0, available_at = 0,
+                       updated = ?
+                   WHERE status = 'failed'""",
+                (time.time(),),
+            )
+            return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        self.create()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, count(*) FROM jobs GROUP BY status")
+            counts = dict(rows.fetchall())
+        return {status: counts.get(status, 0) for status in JOB_STATUSES}
+
+    def jobs(self) -> pd.DataFrame:
+        self.create()
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                """SELECT id, scenario, target, status, attempts, max_attempts, worker,
+                          error, result FROM jobs ORDER BY id""",
+                conn,
+            )
+
+
+def enqueue_scenario_dir(
+    queue: JobQueue,
+    dir: str,
+    target: str,
+    v7_filter: Optional[str] = None,
+    quarantine_dir: Optional[str] = None,
+    max_attempts: int = 3,
+    requeue: bool = False,
+) -> Dict[str, str]:
+    """
+    Add a job for every scenario in a directory that has exactly one SDG, hydro and
+    echo file (see `find_scenario_files`).
+
+    Parameters:
+    - queue (JobQueue): the queue.
+    - dir (str): scenario directory, on storage all workers can read.
+    - target (str): postgres connection string or a directory for Parquet output.
+    - v7_filter (str or None): only use dss files whose name contains this string.
+    - quarantine_dir (str or None): write rows failing validation to
+      <quarantine_dir>/<scenario>_quarantine.csv and load the rest, instead of
+      failing the job.
+    - max_attempts (int): number of times a job is tried.
+    - requeue (bool): run scenarios again that are already done or failed.
+
+    Returns:
+    - dict: scenario -> "queued", "already in queue" or the reason it was skipped.
+    """
+    outcome = {}
+    for scenario, files in find_scenario_files(dir, v7_filter).items():
+        missing = [k for k in ["sdg", "hydro", "echo"] if k not in files]
+        duplicated = [k for k, paths in files.items() if len(paths) > 1]
+        if missing:
+            outcome[scenario] = f"skipped, missing {', '.join(missing)} file"
+            continue
+        if duplicated:
+            outcome[scenario] = f"skipped, more than one {', '.join(duplicated)} file"
+            continue
+        payload = {kind: str(paths[0].resolve()) for kind, paths in files.items()}
+        if quarantine_dir is not None:
+            payload["quarantine_path"] = str(
+                Path(quarantine_dir).resolve() / f"{scenario}_quarantine.csv"
+            )
+        added = queue.enqueue(scenario, target, payload, max_attempts, requeue)
+        outcome[scenario] = "queued" if added else "already in queue"
+    return outcome
+
+
+def _write_parquet_scenario(scenario: str, payload: Dict, target: str) -> Dict:
+    """
+    Read, validate and post-process a scenario and write it as
+    <target>/scenario=<name>/part-0.parquet, replacing what was there.
+    """
+    echo_config = read_echo_settings(payload["echo"])
+    frames = {"wl_compliance": read_hydro(payload["hydro"]), **read_sdg(payload["sdg"])}
+    quarantine_path = payload.get("quarantine_path")
+    frames, bad, _ = validate_frames(frames, echo_config, quarantine_path is not None)
+    if bad:
+        pd.concat(bad, ignore_index=True).to_csv(quarantine_path, index=False)
+
+    velocity = calc_scenario_velocity(
+        frames["sdg_flow"], frames["sdg_stage"], echo_config
+    )
+    frames["velocity"] = velocity
+    frames["velocity-streak"] = calc_velocity_streaks(velocity)
+    data = pd.concat([df[DSM2_COLUMNS] for df in frames.values()], ignore_index=True)
+
+    out_dir = Path(target) / f"scenario={scenario}"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # written next to the final file and renamed, readers never see a partial file
+    tmp = out_dir / f".part-0.{uuid.uuid4().hex}.tmp"
+    data.to_parquet(tmp, index=False)
+    for old in out_dir.glob("*.parquet"):
+        old.unlink()
+    os.replace(tmp, out_dir / "part-0.parquet")
+    return {name: len(df) for name, df in frames.items()}
+
+
+def run_job(job: Job) -> Dict:
+    """
+    Run a scenario job, loading into Postgres or writing Parquet depending on the
+    target. Returns the rows written per frame.
+    """
+    payload = job.payload
+    for kind in ["sdg", "hydro", "echo"]:
+        if not os.path.exists(payload[kind]):
+            raise FileNotFoundError(f"{kind} file not found: {payload[kind]}")
+
+    if job.target.startswith(("postgresql://", "postgres://")):
+        return run_scenario(
+            job.scenario,
+            payload["sdg"],
+            payload["hydro"],
+            payload["echo"],
+            job.target,
+            quarantine_path=payload.get("quarantine_path"),
+            replace=True,
+        )
+    return _write_parquet_scenario(job.scenario, payload, job.target)
+
+
+def run_worker(
+    queue: JobQueue,
+    worker_id: Optional[str] = None,
+    lease: float = 900,
+    poll: float = 5,
+    exit_when_empty: bool = False,
+    max_jobs: Optional[int] = None,
+    backoff: float = 30,
+    runner: Callable[[Job], Dict] = run_job,
+    on_event: Optional[Callable[[str, Job, str], None]] = None,
+) -> int:
+    """
+    Claim and run jobs until stopped.
+
+    Parameters:
+    - queue (JobQueue): the queue.
+    - worker_id (str or None): name of the worker, defaults to host:pid.
+    - lease (float): seconds a claimed job stays ours without a heartbeat, the lease is
+      extended every lease/3 seconds while the job runs.
+    - poll (float): seconds to wait when there is no job to claim.
+    - exit_when_empty (bool): return once no jobs are queued or running.
+    - max_jobs (int or None): return after running this many jobs.
+    - backoff (float): retry delay in seconds after the first failed attempt.
+    - runner (callable): runs a job and returns its result.
+    - on_event (callable or None): called with (event, job, detail) where event is
+      one of start, done or failed.
+
+    Returns:
+    - int: number of jobs run.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    queue.create()
+    n_run = 0
+
+    def emit(event: str, job: Job, detail: str = ""):
+        if on_event is not None:
+            on_event(event, job, detail)
+
+    while max_jobs is None or n_run < max_jobs:
+        job = queue.claim(worker_id, lease)
+        if job is None:
+            counts = queue.counts()
+            if exit_when_empty and counts["queued"] == 0 and counts["running"] == 0:
+                break
+            time.sleep(poll)
+            continue
+
+        stop = threading.Event()
+
+        def keep_lease(job_id=job.id):
+            while not stop.wait(lease / 3):
+                if not queue.heartbeat(job_id, worker_id, lease):
+                    break
+
+        heartbeat = threading.Thread(target=keep_lease, daemon=True)
+        heartbeat.start()
+        emit("start", job)
+        try:
+            result = runner(job)
+        except Exception as e:
+            retry = not is_permanent(e)
+            queue.fail(job.id, worker_id, f"{type(e).__name__}: {e}", retry, backoff)
+            emit("failed", job, str(e))
+        else:
+            queue.complete(job.id, worker_id, result)
+            emit("done", job, json.dumps(result))
+        finally:
+            stop.set()
+            heartbeat.join()
+        n_run += 1
+
+    return n_run
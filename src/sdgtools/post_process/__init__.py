@@ -1,7 +1,23 @@
 # from dss_reader import read_scenario_dir
 from pandas import DataFrame, Series
 import pandas as pd
-from .data_config import gatef, elev_list, flow_list, stn_name, stn_list
+from .data_config import (
+    GATE_CLOSED_VALUE,
+    VELOCITY_THRESHOLD,
+    gatef,
+    elev_list,
+    flow_list,
+    stn_name,
+    stn_list,
+)
+from .buckets import (
+    bucket_ids,
+    bucket_nunique,
+    bucket_start,
+    iso_week,
+    time_step_hours,
+)
+from ..utils import compact_frame
 import numpy as np
 from typing import Optional, List, Dict
 import os
@@ -65,8 +81,7 @@ def rename_gates(data: DataFrame, column: str, rename_map: Dict) -> DataFrame:
     Returns:
     - DataFrame: Data with renamed column values.
     """
-    data[column] = data[column].replace(rename_map)
-    return data
+    return data.assign(**{column: data[column].replace(rename_map)})
 
 
 def set_datetime_index(data: DataFrame) -> Series:
@@ -79,9 +94,7 @@ def set_datetime_index(data: DataFrame) -> Series:
     Returns:
     - Series: 'value' column with datetime index.
     """
-    data.set_index("datetime", inplace=True)
-    data = data["value"]
-    return data
+    return data.set_index("datetime")["value"]
 
 
 def parse_dss_filename(file_path: str) -> str:
@@ -237,7 +250,7 @@ def post_process_gateop(model_data: Dict, gate: str) -> DataFrame:
     - DataFrame: Processed gate operation data.
     """
     gate_up_df = model_data[gate]["gate_operation_data"][["datetime", "value"]]
-    gate_up_df["gate_status"] = gate_up_df["value"] >= 10
+    gate_up_df["gate_status"] = gate_up_df["value"] >= GATE_CLOSED_VALUE
     gate_up_df["consecutive_groups"] = (
         gate_up_df["value"] != gate_up_df["value"].shift()
     ).cumsum()
@@ -254,7 +267,9 @@ def post_process_gateop(model_data: Dict, gate: str) -> DataFrame:
         .size()
         .reset_index(name="count")
     )
-    consecutive_streaks["streak_duration"] = consecutive_streaks["count"] * 15 / 60
+    consecutive_streaks["streak_duration"] = consecutive_streaks[
+        "count"
+    ] * time_step_hours(gate_up_df["datetime"])
     consecutive_streaks_clean = consecutive_streaks.drop(
         ["value", "consecutive_groups", "max_datetime"], axis=1
     )
@@ -287,9 +302,11 @@ def post_process_velocity(model_data: Dict, gate: str) -> DataFrame:
     Returns:
     - DataFrame: Processed velocity data.
     """
-    vel_zoom_df = model_data[gate]["vel"]
+    vel_zoom_df = model_data[gate]["vel"][["datetime", "value"]]
     vel_zoom_df["Velocity_Category"] = np.where(
-        vel_zoom_df["value"] >= 8, "Over 8ft/s", "Under 8ft/s"
+        vel_zoom_df["value"] >= VELOCITY_THRESHOLD,
+        f"Over {VELOCITY_THRESHOLD}ft/s",
+        f"Under {VELOCITY_THRESHOLD}ft/s",
     )
     # .shift shift value down and compare each value with the previous row; increase value when rows are different
     vel_zoom_df["consecutive_groups"] = (
@@ -301,7 +318,7 @@ def post_process_velocity(model_data: Dict, gate: str) -> DataFrame:
     vel_zoom_df["max_datetime"] = vel_zoom_df.groupby("consecutive_groups")[
         "datetime"
     ].transform("max")
-    vel_zoom_df["date"] = vel_zoom_df["datetime"].dt.date.astype(str)
+    vel_zoom_df["date"] = bucket_start(bucket_ids(vel_zoom_df["datetime"], "day"))
     consecutive_streaks_vel = (
         vel_zoom_df.groupby(
             ["consecutive_groups", "Velocity_Category", "min_datetime", "max_datetime"]
@@ -309,9 +326,9 @@ def post_process_velocity(model_data: Dict, gate: str) -> DataFrame:
         .size()
         .reset_index(name="count")
     )
-    consecutive_streaks_vel["streak_duration"] = (
-        consecutive_streaks_vel["count"] * 15 / 60
-    )
+    consecutive_streaks_vel["streak_duration"] = consecutive_streaks_vel[
+        "count"
+    ] * time_step_hours(vel_zoom_df["datetime"])
     consecutive_streaks_vel_clean = consecutive_streaks_vel.drop(
         ["consecutive_groups", "Velocity_Category", "max_datetime"], axis=1
     )
@@ -325,33 +342,88 @@ def post_process_velocity(model_data: Dict, gate: str) -> DataFrame:
     return merged_vel_df
 
 
-def post_process_full_data(model_data: Dict, gate: str) -> DataFrame:
+def post_process_full_data(
+    model_data: Dict, gate: str, compact: bool = False, backend: str = "pandas"
+) -> DataFrame:
     """
     Combine processed gate operation and velocity data into a single DataFrame.
 
     Parameters:
     - model_data (dict): Model data dictionary.
     - gate (str): Gate identifier.
+    - compact (bool): Return categorical gate_status/Velocity_Category and float32 values.
+    - backend (str): "pandas" or "polars", see `post_process.lazy`.
 
     Returns:
     - DataFrame: Combined processed data.
     """
+    if backend == "polars":
+        from .lazy import post_process_full_data_lazy
+
+        return post_process_full_data_lazy(model_data, gate, compact)
+    if backend != "pandas":
+        raise ValueError("backend must be one of pandas or polars")
+
     merged_gate_df = post_process_gateop(model_data, gate)
     merged_vel_df = post_process_velocity(model_data, gate)
     full_merged_df = pd.merge(
         merged_vel_df, merged_gate_df, left_on="datetime", right_on="datetime"
     )
-    full_merged_df["time_unit"] = 0.25
+    full_merged_df["time_unit"] = time_step_hours(full_merged_df["datetime"])
     full_merged_df["gate_status"] = np.where(
         full_merged_df["gate_status"], "Closed", "Open"
     )
-    full_merged_df["week"] = full_merged_df["datetime"].dt.isocalendar().week
+    full_merged_df["week"] = iso_week(full_merged_df["datetime"])
     full_merged_df["gate"] = gate
     full_merged_df["model"] = model_data[gate]["model"]
 
+    if compact:
+        full_merged_df = compact_frame(full_merged_df)
+
     return full_merged_df
 
 
+def _avg_daily_time(post_processed_data: DataFrame, category: str) -> DataFrame:
+    """
+    Total time_unit per category divided by the number of days in the data.
+    """
+    days = bucket_ids(post_processed_data["datetime"], "day")
+    codes, categories = pd.factorize(post_processed_data[category], sort=True)
+    total = np.bincount(
+        codes,
+        weights=post_processed_data["time_unit"].to_numpy(dtype=float),
+        minlength=len(categories),
+    )
+    n_days = len(np.unique(days))
+    return DataFrame({category: np.asarray(categories), "time_unit": total / n_days})
+
+
+def _avg_daily_consec_time(
+    post_processed_data: DataFrame, category: str, group_column: str, out_column: str
+) -> DataFrame:
+    """
+    For each day and category the total time_unit divided by the number of distinct
+    `group_column` values, averaged over the days for each category.
+    """
+    days = bucket_ids(post_processed_data["datetime"], "day")
+    codes, categories = pd.factorize(post_processed_data[category], sort=True)
+    n_categories = len(categories)
+    day_codes = np.unique(days, return_inverse=True)[1].astype("i8")
+    key = day_codes * n_categories + codes
+
+    keys, inverse = np.unique(key, return_inverse=True)
+    total = np.bincount(
+        inverse, weights=post_processed_data["time_unit"].to_numpy(dtype=float)
+    )
+    _, n_groups = bucket_nunique(key, post_processed_data[group_column])
+    per_day = total / n_groups
+
+    key_category = keys % n_categories
+    mean = np.bincount(key_category, weights=per_day, minlength=n_categories)
+    mean = mean / np.bincount(key_category, minlength=n_categories)
+    return DataFrame({category: np.asarray(categories), out_column: mean})
+
+
 def calc_avg_daily_vel(post_processed_data: DataFrame) -> DataFrame:
     """
     Calculate daily average of total amount of time velocity is above and below 8ft/s.
@@ -362,17 +434,7 @@ def calc_avg_daily_vel(post_processed_data: DataFrame) -> DataFrame:
     Returns:
     - DataFrame
     """
-    daily_velocity = (
-        post_processed_data.groupby(["date", "Velocity_Category"])["time_unit"]
-        .sum()
-        .reset_index()
-    )
-    avg_daily_velocity = pd.DataFrame(
-        daily_velocity.groupby("Velocity_Category")["time_unit"].sum()
-        / daily_velocity["date"].nunique()
-    ).reset_index()
-
-    return avg_daily_velocity
+    return _avg_daily_time(post_processed_data, "Velocity_Category")
 
 
 def calc_avg_daily_gate(post_processed_data: DataFrame) -> DataFrame:
@@ -385,18 +447,7 @@ def calc_avg_daily_gate(post_processed_data: DataFrame) -> DataFrame:
     Returns:
     - DataFrame
     """
-
-    daily_gate = (
-        post_processed_data.groupby(["date", "gate_status"])["time_unit"]
-        .sum()
-        .reset_index()
-    )
-    avg_daily_gate = pd.DataFrame(
-        daily_gate.groupby("gate_status")["time_unit"].sum()
-        / daily_gate["date"].nunique()
-    ).reset_index()
-
-    return avg_daily_gate
+    return _avg_daily_time(post_processed_data, "gate_status")
 
 
 def calc_avg_len_consec_vel(post_processed_data: DataFrame) -> DataFrame:
@@ -409,29 +460,13 @@ def calc_avg_len_consec_vel(post_processed_data: DataFrame) -> DataFrame:
     Returns:
     - DataFrame
     """
-    daily_velocity_stats = (
-        post_processed_data.groupby(["date", "Velocity_Category"])
-        .agg(
-            unique_consecutive_groups=("consecutive_groups", "nunique"),
-            total_time=("time_unit", "sum"),
-        )
-        .reset_index()
+    return _avg_daily_consec_time(
+        post_processed_data,
+        "Velocity_Category",
+        "consecutive_groups",
+        "daily_average_time_per_consecutive_group",
     )
 
-    daily_velocity_stats["daily_average_time_per_consecutive_group"] = (
-        daily_velocity_stats["total_time"]
-        / daily_velocity_stats["unique_consecutive_groups"]
-    )
-    daily_average_per_duration_per_velocity_over_period = (
-        daily_velocity_stats.groupby(["Velocity_Category"])[
-            "daily_average_time_per_consecutive_group"
-        ]
-        .mean()
-        .reset_index()
-    )
-
-    return daily_average_per_duration_per_velocity_over_period
-
 
 def calc_avg_len_consec_gate(post_processed_data: DataFrame) -> DataFrame:
     """
@@ -443,23 +478,165 @@ def calc_avg_len_consec_gate(post_processed_data: DataFrame) -> DataFrame:
     Returns:
     - DataFrame
     """
-    daily_gate_stats = (
-        post_processed_data.groupby(["date", "gate_status"])
-        .agg(
-            unique_gate_count=("gate_count", "nunique"), total_time=("time_unit", "sum")
-        )
-        .reset_index()
+    return _avg_daily_consec_time(
+        post_processed_data,
+        "gate_status",
+        "gate_count",
+        "daily_average_time_per_consecutive_gate",
     )
 
-    daily_gate_stats["daily_average_time_per_consecutive_gate"] = (
-        daily_gate_stats["total_time"] / daily_gate_stats["unique_gate_count"]
+
+# summary metrics of a post processed frame by name
+METRICS = {
+    "calc_avg_daily_vel": calc_avg_daily_vel,
+    "calc_avg_daily_gate": calc_avg_daily_gate,
+    "calc_avg_len_consec_vel": calc_avg_len_consec_vel,
+    "calc_avg_len_consec_gate": calc_avg_len_consec_gate,
+}
+
+
+def node_rows(data: DataFrame, node: str) -> DataFrame:
+    """
+    Rows of a long format frame for `node`, matched case insensitively: `read_dss`
+    lower cases node names while `get_all_data_from_dsm2_dss` keeps the DSS B parts.
+    """
+    return data[data["node"].astype(str).str.lower() == node.lower()]
+
+
+# gate names used in the echo file GATE_WEIR_DEVICE table mapped to the gate IDs of gatef
+ECHO_GATE_IDS = {"grantline": "GLC", "middle_river": "MID", "old_river": "OLD"}
+
+
+def calc_scenario_velocity(
+    sdg_flow: DataFrame,
+    sdg_stage: DataFrame,
+    echo_config: Optional[Dict] = None,
+    gatef: Dict = gatef,
+) -> DataFrame:
+    """
+    Calculate fish passage velocity for every gate from long format SDG data.
+
+    Parameters:
+    - sdg_flow (DataFrame): Device flow data as returned by `read_dss`, node names
+      are matched in any case.
+    - sdg_stage (DataFrame): Gate stage data as returned by `read_dss`.
+    - echo_config (dict or None): Gate settings from the echo file, when given
+      these override the width and bottom elevation in gatef.
+    - gatef (Dictionary): Gate configuration data found in data_config.py.
+
+    Returns:
+    - DataFrame: Long format velocity with columns datetime, node, param, value, unit
+      where node is the lower case gate ID.
+    """
+    settings = {}
+    if echo_config:
+        settings = {
+            ECHO_GATE_IDS[k]: v for k, v in echo_config.items() if k in ECHO_GATE_IDS
+        }
+
+    out = []
+    for i, gate_id in enumerate(gatef["ID"]):
+        if gate_id in settings:
+            bottom_elev = float(settings[gate_id].bottom_elevation)
+            width = float(settings[gate_id].width)
+        else:
+            bottom_elev = gatef["bottom_elev"][i]
+            width = gatef["width"][i]
+
+        flow = node_rows(sdg_flow, gatef["flow_op"][i])
+        stage = node_rows(sdg_stage, gatef["gate_status"][i])
+        vel = calc_vel(
+            flow.set_index("datetime")["value"],
+            stage.set_index("datetime")["value"],
+            bottom_elev,
+            width,
+        ).dropna()
+        out.append(
+            DataFrame(
+                {
+                    "datetime": vel.index,
+                    "node": gate_id.lower(),
+                    "param": "velocity",
+                    "value": vel.to_numpy(),
+                    "unit": "FT/S",
+                }
+            )
+        )
+
+    return pd.concat(out, ignore_index=True)
+
+
+def calc_velocity_streaks(
+    velocity: DataFrame, threshold: float = VELOCITY_THRESHOLD
+) -> DataFrame:
+    """
+    Duration of the over/under threshold streak each velocity value belongs to.
+
+    Parameters:
+    - velocity (DataFrame): Long format velocity from `calc_scenario_velocity`.
+    - threshold (float): Velocity threshold in ft/s.
+
+    Returns:
+    - DataFrame: Long format streak durations in hours, one row per velocity value.
+    """
+    vel = velocity.sort_values(["node", "datetime"], kind="stable")
+    over = vel["value"].to_numpy() >= threshold
+    node_change = vel["node"].ne(vel["node"].shift()).to_numpy()
+    new_streak = node_change.copy()
+    new_streak[1:] |= over[1:] != over[:-1]
+    streak_id = np.cumsum(new_streak) - 1
+    streak_size = np.bincount(streak_id)[streak_id]
+
+    step_hours = (
+        vel.groupby("node", sort=False)["datetime"].diff().dt.total_seconds() / 3600
     )
-    daily_average_per_duration_per_gate_over_period = (
-        daily_gate_stats.groupby(["gate_status"])[
-            "daily_average_time_per_consecutive_gate"
-        ]
-        .mean()
-        .reset_index()
+    step_hours = step_hours.groupby(vel["node"], sort=False).transform("median")
+
+    return DataFrame(
+        {
+            "datetime": vel["datetime"].to_numpy(),
+            "node": vel["node"].to_numpy(),
+            "param": "velocity-streak",
+            "value": streak_size * step_hours.to_numpy(),
+            "unit": "HOURS",
+        }
     )
 
-    return daily_average_per_duration_per_gate_over_period
+
+def gate_model_data(
+    sdg_flow: DataFrame,
+    sdg_stage: DataFrame,
+    sdg_gate_ops: DataFrame,
+    gate: str,
+    model: str,
+    echo_config: Optional[Dict] = None,
+) -> Dict:
+    """
+    Build the model data dictionary used by `post_process_full_data` for one gate from
+    long format SDG data, e.g. from `read_scenario` or a store query.
+
+    Parameters:
+    - sdg_flow (DataFrame): Device flow data.
+    - sdg_stage (DataFrame): Gate stage data.
+    - sdg_gate_ops (DataFrame): Gate operation data.
+    - gate (str): Gate identifier, one of the IDs in gatef.
+    - model (str): model name.
+    - echo_config (dict or None): Gate settings from the echo file.
+
+    Returns:
+    - dict: {gate: {"vel", "gate_operation_data", "model", ...}}
+    """
+    i = gatef["ID"].index(gate)
+    gate_config = {k: v[i : i + 1] for k, v in gatef.items()}
+    velocity = calc_scenario_velocity(sdg_flow, sdg_stage, echo_config, gate_config)
+    gate_ops = node_rows(sdg_gate_ops, f"{gate}_GATEOP")
+    return {
+        gate: {
+            "name": gatef["name"][i],
+            "vel": velocity[["datetime", "value"]].reset_index(drop=True),
+            "gate_operation_data": gate_ops[["datetime", "value"]].reset_index(
+                drop=True
+            ),
+            "model": model,
+        }
+    }
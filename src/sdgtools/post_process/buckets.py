@@ -0,0 +1,190 @@
+"""
+Integer time buckets for daily/weekly/monthly aggregation.
+
+Timestamps are turned into integer bucket ids (days, Monday based weeks or months since
+the epoch) with integer arithmetic on the datetime64 values, and reductions over the
+buckets use `np.bincount`/`np.*.reduceat` instead of grouping on Python date objects
+or strings.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+NS_PER_HOUR = 3_600_000_000_000
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+BUCKET_FREQS = ["day", "week", "month"]
+
+
+def to_epoch_ns(datetimes) -> np.ndarray:
+    """
+    Datetimes (Series, Index or array) as int64 nanoseconds since the epoch.
+    """
+    values = np.asarray(datetimes)
+    if not np.issubdtype(values.dtype, np.datetime64):
+        # only parse when needed, pd.to_datetime on datetime64 input is slow
+        values = np.asarray(pd.to_datetime(datetimes))
+    return values.astype("datetime64[ns]").view("i8")
+
+
+def bucket_ids(datetimes, freq: str = "day") -> np.ndarray:
+    """
+    Integer bucket id of every timestamp.
+
+    - day: days since 1970-01-01
+    - week: Monday based weeks since the week of 1970-01-01
+    - month: months since 1970-01
+    """
+    if freq not in BUCKET_FREQS:
+        raise ValueError(f"freq must be one of {', '.join(BUCKET_FREQS)}")
+    if freq == "month":
+        return (
+            to_epoch_ns(datetimes)
+            .view("datetime64[ns]")
+            .astype("datetime64[M]")
+            .view("i8")
+        )
+    days = to_epoch_ns(datetimes) // NS_PER_DAY
+    if freq == "week":
+        # 1970-01-01 was a Thursday, shift so weeks start on Monday
+        return (days + 3) // 7
+    return days
+
+
+def bucket_start(ids: np.ndarray, freq: str = "day") -> np.ndarray:
+    """
+    First timestamp of each bucket id as datetime64[ns].
+    """
+    ids = np.asarray(ids, dtype="i8")
+    if freq == "month":
+        return ids.view("datetime64[M]").astype("datetime64[ns]")
+    if freq == "week":
+        ids = ids * 7 - 3
+    return (ids * NS_PER_DAY).view("datetime64[ns]")
+
+
+def iso_week(datetimes) -> np.ndarray:
+    """
+    ISO 8601 week number of every timestamp, same as `Series.dt.isocalendar().week`.
+    """
+    days = to_epoch_ns(datetimes) // NS_PER_DAY
+    weekday = (days + 3) % 7  # Monday == 0
+    thursday = days - weekday + 3
+    jan1 = (
+        thursday.astype("datetime64[D]").astype("datetime64[Y]").astype("datetime64[D]")
+    )
+    return (thursday - jan1.view("i8")) // 7 + 1
+
+
+def time_step_hours(datetimes) -> float:
+    """
+    Time step of a series in hours, the most common positive difference between
+    consecutive timestamps.
+    """
+    t = np.sort(to_epoch_ns(datetimes))
+    steps = np.diff(t)
+    steps = steps[steps > 0]
+    if len(steps) == 0:
+        return 0.0
+    values, counts = np.unique(steps, return_counts=True)
+    return values[np.argmax(counts)] / NS_PER_HOUR
+
+
+def bucket_reduce(
+    ids: np.ndarray, values: np.ndarray, how: str = "sum"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce `values` within each bucket id. NaN values are skipped like NULL in SQL:
+    count is the number of non-NaN values and a bucket without any is NaN (0 for
+    count).
+
+    Parameters:
+    - ids (array): Integer bucket id of every value.
+    - values (array): Values to reduce.
+    - how (str): One of sum, mean, count, min or max.
+
+    Returns:
+    - tuple: (sorted unique bucket ids, reduced value of each bucket).
+    """
+    ids = np.asarray(ids)
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    if how in ("sum", "mean", "count"):
+        unique, inverse = np.unique(ids, return_inverse=True)
+        count = np.bincount(inverse[valid], minlength=len(unique))
+        if how == "count":
+            return unique, count
+        total = np.bincount(
+            inverse[valid], weights=values[valid], minlength=len(unique)
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            total = np.where(count > 0, total, np.nan)
+            return unique, total if how == "sum" else total / count
+    if how in ("min", "max"):
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        # fmin/fmax only give NaN when every value of the bucket is NaN
+        ufunc = np.fmin if how == "min" else np.fmax
+        return sorted_ids[starts], ufunc.reduceat(values[order], starts)
+    raise ValueError("how must be one of sum, mean, count, min or max")
+
+
+def bucket_nunique(ids: np.ndarray, values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Number of distinct `values` within each bucket id.
+
+    Returns:
+    - tuple: (sorted unique bucket ids, number of distinct values in each bucket).
+    """
+    ids = np.asarray(ids, dtype="i8")
+    if len(ids) == 0:
+        return ids, np.array([], dtype="i8")
+    codes = pd.factorize(np.asarray(values))[0].astype("i8")
+    n_codes = codes.max() + 1
+    base = ids.min()
+    pairs = np.unique((ids - base) * n_codes + codes)
+    return np.unique(pairs // n_codes + base, return_counts=True)
+
+
+def aggregate(
+    data: pd.DataFrame,
+    freq: str = "day",
+    how: str = "mean",
+    by: str | List[str] | None = "node",
+) -> pd.DataFrame:
+    """
+    Aggregate a long format frame to daily, weekly or monthly values.
+
+    Parameters:
+    - data (DataFrame): Frame with datetime and value columns.
+    - freq (str): Bucket size, one of day, week or month.
+    - how (str): One of sum, mean, count, min or max, NaN values are skipped as
+      in `bucket_reduce`.
+    - by (str, list or None): Column(s) aggregated separately, e.g. node.
+
+    Returns:
+    - DataFrame: `by` columns (if any), datetime of the start of each bucket and value.
+    """
+    by = [by] if isinstance(by, str) else list(by or [])
+    ids = bucket_ids(data["datetime"], freq)
+    if len(ids) == 0:
+        return pd.DataFrame(columns=by + ["datetime", "value"])
+
+    offset = ids.min()
+    span = ids.max() - offset + 1
+    key = ids - offset
+    if by:
+        codes = data.groupby(by, sort=True, observed=True).ngroup().to_numpy()
+        key = codes.astype("i8") * span + key
+
+    keys, values = bucket_reduce(key, data["value"].to_numpy(), how)
+    out = {"datetime": bucket_start(keys % span + offset, freq), "value": values}
+    if by:
+        # first row of each group gives its `by` values
+        _, first = np.unique(codes, return_index=True)
+        groups = data[by].iloc[first].reset_index(drop=True)
+        out = {**groups.iloc[keys // span].reset_index(drop=True), **out}
+    return pd.DataFrame(out)
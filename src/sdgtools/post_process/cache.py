@@ -0,0 +1,273 @@
+"""
+On-disk cache for the post-processing metrics.
+
+A metric is stored under a key hashed from everything its value depends on: the
+content of the input series, the gate configuration (width, bottom elevation), the
+velocity and gate thresholds and the metric name. Rebuilding a report over scenarios
+that did not change only hashes the inputs and reads the stored results, the
+velocity calculation and post-processing are skipped.
+
+Results are Parquet files in one directory. The directory is kept under `max_bytes`
+by removing the least recently used files, several processes can share it.
+"""
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+from pandas import DataFrame
+
+from . import (
+    ECHO_GATE_IDS,
+    METRICS,
+    gate_model_data,
+    node_rows,
+    post_process_full_data,
+)
+from .data_config import GATE_CLOSED_VALUE, VELOCITY_THRESHOLD, gatef
+
+# bump when a change to the post-processing or the metrics changes their results
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "sdgtools", "metrics")
+
+
+class MetricCache:
+    """
+    Metric results stored as Parquet files, bounded by the total size of the files.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 512 * 1024**2):
+        path = path or os.environ.get("SDGTOOLS_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.path = Path(path).expanduser()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key: str) -> Path:
+        return self.path / f"{key}.parquet"
+
+    def get(self, key: str) -> Optional[DataFrame]:
+        file = self._file(key)
+        try:
+            value = pd.read_parquet(file)
+            # the modification time orders the files for eviction
+            os.utime(file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # partial or corrupt file, compute the value again
+            file.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: DataFrame):
+        tmp = self.path / f".{key}.{uuid.uuid4().hex}.tmp"
+        value.to_parquet(tmp, index=False)
+        os.replace(tmp, self._file(key))
+        self.evict()
+
+    def _entries(self) -> List[os.DirEntry]:
+        return [
+            e
+            for e in os.scandir(self.path)
+            if e.is_file() and e.name.endswith(".parquet")
+        ]
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used files until the cache fits in `max_bytes`.
+
+        Returns:
+        - int: number of files removed.
+        """
+        entries = []
+        for e in self._entries():
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+        size = sum(s for _, s, _ in entries)
+        removed = 0
+        for _, file_size, file in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for e in self._entries():
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        sizes = [e.stat().st_size for e in self._entries()]
+        return {
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _update(h, df: DataFrame, columns: List[str]):
+    df = df[columns]
+    h.update(repr([(c, str(df[c].dtype)) for c in columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+
+def metric_keys(
+    metrics: List[str], frames: List[DataFrame], columns: List[str], **params
+) -> Dict[str, str]:
+    """
+    Cache key of each metric, a hash of the frames (only `columns`), the keyword
+    parameters, the thresholds and CACHE_VERSION.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(
+        repr(
+            (
+                CACHE_VERSION,
+                VELOCITY_THRESHOLD,
+                GATE_CLOSED_VALUE,
+                sorted(params.items()),
+            )
+        ).encode()
+    )
+    for df in frames:
+        _update(h, df, columns)
+    keys = {}
+    for name in metrics:
+        metric_h = h.copy()
+        metric_h.update(name.encode())
+        keys[name] = metric_h.hexdigest()
+    return keys
+
+
+def _cached(
+    cache: MetricCache, keys: Dict[str, str], post_process
+) -> Dict[str, DataFrame]:
+    results = {name: cache.get(key) for name, key in keys.items()}
+    missing = [name for name, value in results.items() if value is None]
+    if missing:
+        data = post_process()
+        for name in missing:
+            results[name] = METRICS[name](data)
+            cache.put(keys[name], results[name])
+    return results
+
+
+def _metric_names(metrics: Optional[List[str]]) -> List[str]:
+    metrics = list(METRICS) if metrics is None else metrics
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise ValueError(
+            f"unknown metric {', '.join(unknown)}, expected one of {', '.join(METRICS)}"
+        )
+    return metrics
+
+
+def cached_metrics(
+    model_data: Dict,
+    gate: str,
+    metrics: Optional[List[str]] = None,
+    cache: Optional[MetricCache] = None,
+) -> Dict[str, DataFrame]:
+    """
+    Metrics of one gate of a model data dictionary (see `generate_full_model_data`),
+    read from the cache when the velocity and gate operation data did not change.
+
+    Parameters:
+    - model_data (dict): Model data dictionary.
+    - gate (str): Gate identifier.
+    - metrics (list or None): metric names from METRICS, defaults to all.
+    - cache (MetricCache or None): defaults to a MetricCache in SDGTOOLS_CACHE_DIR or
+      ~/.cache/sdgtools/metrics.
+
+    Returns:
+    - dict: metric name -> DataFrame.
+    """
+    cache = cache or MetricCache()
+    data = model_data[gate]
+    keys = metric_keys(
+        _metric_names(metrics),
+        [data["vel"], data["gate_operation_data"]],
+        ["datetime", "value"],
+        gate=gate,
+        bottom_elev=data.get("bottom_elev"),
+        width=data.get("width"),
+    )
+    return _cached(cache, keys, lambda: post_process_full_data(model_data, gate))
+
+
+def cached_gate_metrics(
+    sdg_flow: DataFrame,
+    sdg_stage: DataFrame,
+    sdg_gate_ops: DataFrame,
+    gate: str,
+    model: str,
+    echo_config: Optional[Dict] = None,
+    metrics: Optional[List[str]] = None,
+    cache: Optional[MetricCache] = None,
+) -> Dict[str, DataFrame]:
+    """
+    Metrics of one gate from long format SDG data, the cached version of
+    `gate_model_data` -> `post_process_full_data` -> metric. On a hit neither the
+    velocity nor the post-processing is computed.
+
+    Parameters:
+    - sdg_flow (DataFrame): Device flow data.
+    - sdg_stage (DataFrame): Gate stage data.
+    - sdg_gate_ops (DataFrame): Gate operation data.
+    - gate (str): Gate identifier, one of the IDs in gatef.
+    - model (str): model name.
+    - echo_config (dict or None): Gate settings from the echo file.
+    - metrics (list or None): metric names from METRICS, defaults to all.
+    - cache (MetricCache or None): defaults to a MetricCache in SDGTOOLS_CACHE_DIR or
+      ~/.cache/sdgtools/metrics.
+
+    Returns:
+    - dict: metric name -> DataFrame.
+    """
+    cache = cache or MetricCache()
+    i = gatef["ID"].index(gate)
+    bottom_elev, width = gatef["bottom_elev"][i], gatef["width"][i]
+    for name, settings in (echo_config or {}).items():
+        if ECHO_GATE_IDS.get(name) == gate:
+            bottom_elev = float(settings.bottom_elevation)
+            width = float(settings.width)
+
+    # only the rows of this gate go into the key, node names match in any case
+    flow = node_rows(sdg_flow, gatef["flow_op"][i])
+    stage = node_rows(sdg_stage, gatef["gate_status"][i])
+    gate_ops = node_rows(sdg_gate_ops, f"{gate}_GATEOP")
+    keys = metric_keys(
+        _metric_names(metrics),
+        [flow, stage, gate_ops],
+        ["datetime", "value"],
+        gate=gate,
+        bottom_elev=float(bottom_elev),
+        width=float(width),
+    )
+
+    def post_process():
+        model_data = gate_model_data(flow, stage, gate_ops, gate, model, echo_config)
+        return post_process_full_data(model_data, gate)
+
+    return _cached(cache, keys, post_process)
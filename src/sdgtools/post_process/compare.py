@@ -0,0 +1,252 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .buckets import NS_PER_HOUR
+
+
+@dataclass
+class ScenarioArray:
+    """
+    Scenarios aligned onto one shared time index.
+
+    `values` has shape (scenario, gate, time); missing timesteps are NaN.
+    """
+
+    scenarios: List[str]
+    gates: List[str]
+    index: pd.DatetimeIndex
+    values: np.ndarray
+
+    def scenario_pos(self, scenario: str) -> int:
+        try:
+            return self.scenarios.index(scenario)
+        except ValueError:
+            raise KeyError(f"scenario '{scenario}' is not part of this comparison")
+
+    def time_step_hours(self) -> float:
+        """
+        Time step of the shared index in hours, taken as the most common spacing.
+        """
+        if len(self.index) < 2:
+            return 0.0
+        # the index may be in s, ms, us or ns, the steps are taken in ns
+        steps = np.diff(self.index.as_unit("ns").asi8)
+        values, counts = np.unique(steps, return_counts=True)
+        return values[np.argmax(counts)] / NS_PER_HOUR
+
+    def to_frame(self) -> DataFrame:
+        """
+        Long format frame with columns scenario, gate, datetime, value.
+        """
+        n_scen, n_gate, n_time = self.values.shape
+        return DataFrame(
+            {
+                "scenario": np.repeat(self.scenarios, n_gate * n_time),
+                "gate": np.tile(np.repeat(self.gates, n_time), n_scen),
+                "datetime": np.tile(self.index.values, n_scen * n_gate),
+                "value": self.values.ravel(),
+            }
+        )
+
+
+def align_scenarios(
+    model_data: Dict[str, Dict],
+    field: str = "vel",
+    gates: Optional[List[str]] = None,
+    how: str = "union",
+) -> ScenarioArray:
+    """
+    Load the same series from several scenarios onto one shared time index.
+
+    Parameters:
+    - model_data (dict): Scenario name -> output of `generate_full_model_data`.
+    - field (str): Per gate frame to align, must have 'datetime' and 'value' columns.
+    - gates (list or None): Gate IDs to include, defaults to the gates of the first scenario.
+    - how (str): 'union' keeps every timestamp, 'intersection' only shared ones.
+
+    Returns:
+    - ScenarioArray: values with shape (scenario, gate, time).
+    """
+    if how not in ("union", "intersection"):
+        raise ValueError("how must be one of 'union' or 'intersection'")
+    if len(model_data) == 0:
+        raise ValueError("no scenarios to align")
+
+    scenarios = list(model_data.keys())
+    if gates is None:
+        gates = list(model_data[scenarios[0]].keys())
+
+    series = {}
+    for s in scenarios:
+        for g in gates:
+            df = model_data[s][g][field]
+            series[(s, g)] = (
+                df["datetime"].to_numpy(dtype="datetime64[ns]"),
+                df["value"].to_numpy(dtype=float),
+            )
+
+    stamps = [t for t, _ in series.values()]
+    if how == "union":
+        index = np.unique(np.concatenate(stamps))
+    else:
+        index = np.unique(stamps[0])
+        for t in stamps[1:]:
+            index = np.intersect1d(index, t, assume_unique=False)
+
+    values = np.full((len(scenarios), len(gates), len(index)), np.nan)
+    for (s, g), (t, v) in series.items():
+        pos = np.searchsorted(index, t)
+        in_range = pos < len(index)
+        hit = np.zeros(len(t), dtype=bool)
+        hit[in_range] = index[pos[in_range]] == t[in_range]
+        values[scenarios.index(s), gates.index(g), pos[hit]] = v[hit]
+
+    return ScenarioArray(
+        scenarios=scenarios,
+        gates=list(gates),
+        index=pd.DatetimeIndex(index),
+        values=values,
+    )
+
+
+def diff_from_baseline(data: ScenarioArray, baseline: str) -> ScenarioArray:
+    """
+    Difference of every scenario against the baseline at each timestep.
+
+    Parameters:
+    - data (ScenarioArray): Aligned scenarios.
+    - baseline (str): Name of the baseline scenario.
+
+    Returns:
+    - ScenarioArray: scenario minus baseline, the baseline row is all zeros (or NaN).
+    """
+    base = data.values[data.scenario_pos(baseline)]
+    return ScenarioArray(
+        scenarios=data.scenarios,
+        gates=data.gates,
+        index=data.index,
+        values=data.values - base[np.newaxis, :, :],
+    )
+
+
+def exceedance_delta(
+    data: ScenarioArray, baseline: str, threshold: float = 8.0
+) -> DataFrame:
+    """
+    Fraction of time at or above a threshold for each scenario/gate and its change from baseline.
+
+    Parameters:
+    - data (ScenarioArray): Aligned scenarios.
+    - baseline (str): Name of the baseline scenario.
+    - threshold (float): Exceedance threshold, defaults to the 8ft/s velocity criteria.
+
+    Returns:
+    - DataFrame: scenario, gate, hours_exceeded, exceedance, exceedance_delta.
+    """
+    valid = ~np.isnan(data.values)
+    exceeded = np.greater_equal(
+        data.values, threshold, where=valid, out=np.zeros_like(valid)
+    )
+    n_exceeded = exceeded.sum(axis=2)
+    n_valid = valid.sum(axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = n_exceeded / n_valid
+    delta = fraction - fraction[data.scenario_pos(baseline)][np.newaxis, :]
+
+    return DataFrame(
+        {
+            "scenario": np.repeat(data.scenarios, len(data.gates)),
+            "gate": np.tile(data.gates, len(data.scenarios)),
+            "hours_exceeded": (n_exceeded * data.time_step_hours()).ravel(),
+            "exceedance": fraction.ravel(),
+            "exceedance_delta": delta.ravel(),
+        }
+    )
+
+
+def streak_stats(
+    data: ScenarioArray, baseline: Optional[str] = None, threshold: float = 8.0
+) -> DataFrame:
+    """
+    Count and length of consecutive runs at or above a threshold for every scenario/gate.
+
+    Runs are found for all scenarios and gates at once from the edges of the
+    exceedance mask, a missing value ends a run.
+
+    Parameters:
+    - data (ScenarioArray): Aligned scenarios.
+    - baseline (str or None): When given, add the change in each stat from the baseline.
+    - threshold (float): Exceedance threshold, defaults to the 8ft/s velocity criteria.
+
+    Returns:
+    - DataFrame: scenario, gate, streak_count, mean_streak_duration, max_streak_duration (hours).
+    """
+    n_scen, n_gate, n_time = data.values.shape
+    n_rows = n_scen * n_gate
+    flat = data.values.reshape(n_rows, n_time)
+    above = np.greater_equal(
+        flat, threshold, where=~np.isnan(flat), out=np.zeros(flat.shape, dtype=bool)
+    )
+
+    padded = np.zeros((n_rows, n_time + 2), dtype=np.int8)
+    padded[:, 1:-1] = above
+    edges = np.diff(padded, axis=1)
+    start_rows, start_cols = np.nonzero(edges == 1)
+    _, end_cols = np.nonzero(edges == -1)
+    lengths = end_cols - start_cols
+
+    count = np.bincount(start_rows, minlength=n_rows)
+    total = np.bincount(start_rows, weights=lengths, minlength=n_rows)
+    longest = np.zeros(n_rows)
+    np.maximum.at(longest, start_rows, lengths)
+    step = data.time_step_hours()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, total / count, 0.0) * step
+
+    stats = DataFrame(
+        {
+            "scenario": np.repeat(data.scenarios, n_gate),
+            "gate": np.tile(data.gates, n_scen),
+            "streak_count": count,
+            "mean_streak_duration": mean,
+            "max_streak_duration": longest * step,
+        }
+    )
+
+    if baseline is not None:
+        b = data.scenario_pos(baseline)
+        for col in ["streak_count", "mean_streak_duration", "max_streak_duration"]:
+            values = stats[col].to_numpy().reshape(n_scen, n_gate)
+            stats[f"{col}_delta"] = (values - values[b][np.newaxis, :]).ravel()
+
+    return stats
+
+
+def compare_scenarios(
+    model_data: Dict[str, Dict],
+    baseline: str,
+    field: str = "vel",
+    threshold: float = 8.0,
+    gates: Optional[List[str]] = None,
+) -> DataFrame:
+    """
+    Align scenarios and summarise exceedance and streak statistics against a baseline.
+
+    Parameters:
+    - model_data (dict): Scenario name -> output of `generate_full_model_data`.
+    - baseline (str): Name of the baseline scenario.
+    - field (str): Per gate frame to compare, defaults to velocity.
+    - threshold (float): Exceedance threshold.
+    - gates (list or None): Gate IDs to include.
+
+    Returns:
+    - DataFrame: one row per scenario/gate.
+    """
+    data = align_scenarios(model_data, field=field, gates=gates)
+    exceedance = exceedance_delta(data, baseline, threshold)
+    streaks = streak_stats(data, baseline, threshold)
+    return pd.merge(exceedance, streaks, on=["scenario", "gate"])
@@ -26,3 +26,8 @@ flow_list = [
     "OLD_FLOW_GATE",
 ]
 stn_name = ["MHO", "DGL", "OLD"]
+
+# velocity (ft/s) at or above which fish passage is impaired
+VELOCITY_THRESHOLD = 8
+# gate operation value at or above which the gate is closed
+GATE_CLOSED_VALUE = 10
@@ -0,0 +1,443 @@
+"""
+Chunked post-process kernels for long format (datetime, node, param, value, unit) data.
+
+Each kernel is fed the input one chunk at a time with `update` and produces its result
+with `finalize`, so a large export never has to be loaded or pivoted as a whole. Rows
+of a node are expected in time order, which is how `read_dss` and `sdgtools dss` write
+them, but the rows of a node can be split over any number of chunks.
+"""
+
+import os
+from typing import Dict, Iterator, List, Optional, Type
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from . import calc_vel
+from .data_config import GATE_CLOSED_VALUE, gatef
+from .buckets import NS_PER_DAY, NS_PER_HOUR
+from .sketches import SketchSet
+from ..utils import compact_frame
+
+KERNELS: Dict[str, Type["Kernel"]] = {}
+
+
+def register_kernel(name: str):
+    """
+    Class decorator adding a kernel to the registry used by `sdgtools process --kind`.
+    """
+
+    def wrap(cls):
+        cls.name = name
+        KERNELS[name] = cls
+        return cls
+
+    return wrap
+
+
+def _node_arrays(chunk: DataFrame) -> Iterator:
+    """
+    Yield (node, datetime as int64 ns, value) for each node in a chunk.
+    """
+    for node, g in chunk.groupby("node", sort=False, observed=True):
+        t = pd.to_datetime(g["datetime"]).to_numpy(dtype="datetime64[ns]").view("i8")
+        yield node, t, g["value"].to_numpy(dtype=float)
+
+
+class Kernel:
+    """
+    Base class of the post-process kernels.
+    """
+
+    name: str = ""
+
+    def update(self, chunk: DataFrame):
+        raise NotImplementedError
+
+    def finalize(self) -> DataFrame:
+        raise NotImplementedError
+
+
+class _Step:
+    """
+    Time step (ns) of a series that arrives in pieces, the first positive difference.
+    """
+
+    def __init__(self):
+        self.last = None
+        self.step = None
+
+    def push(self, t: np.ndarray):
+        if self.step is None and len(t):
+            prev = t if self.last is None else np.r_[self.last, t]
+            diffs = np.diff(prev)
+            diffs = diffs[diffs > 0]
+            if len(diffs):
+                self.step = diffs[0]
+        if len(t):
+            self.last = t[-1]
+
+    def hours(self) -> float:
+        return 0.0 if self.step is None else self.step / NS_PER_HOUR
+
+
+class _Runs:
+    """
+    Run length state of a boolean series that arrives in pieces. Completed runs are
+    collected as arrays, the last run stays open until more data or `close`.
+    """
+
+    def __init__(self):
+        self.flag = None
+        self.start = None
+        self.last = None
+        self.count = 0
+        self.step = _Step()
+        self.done = {"flag": [], "start": [], "end": [], "count": []}
+
+    def push(self, t: np.ndarray, flag: np.ndarray):
+        if len(t) == 0:
+            return
+        self.step.push(t)
+
+        cuts = np.flatnonzero(flag[1:] != flag[:-1]) + 1
+        starts = np.r_[0, cuts]
+        ends = np.r_[cuts, len(t)]
+
+        run_flag = flag[starts]
+        run_start = t[starts]
+        run_end = t[ends - 1]
+        run_count = ends - starts
+
+        if self.flag is not None:
+            if self.flag == run_flag[0]:
+                run_start[0] = self.start
+                run_count[0] += self.count
+            else:
+                self._emit([self.flag], [self.start], [self.last], [self.count])
+
+        self._emit(run_flag[:-1], run_start[:-1], run_end[:-1], run_count[:-1])
+        self.flag = run_flag[-1]
+        self.start = run_start[-1]
+        self.last = run_end[-1]
+        self.count = run_count[-1]
+
+    def _emit(self, flag, start, end, count):
+        self.done["flag"].append(np.asarray(flag, dtype=bool))
+        self.done["start"].append(np.asarray(start, dtype="i8"))
+        self.done["end"].append(np.asarray(end, dtype="i8"))
+        self.done["count"].append(np.asarray(count, dtype="i8"))
+
+    def close(self) -> Dict[str, np.ndarray]:
+        if self.flag is not None:
+            self._emit([self.flag], [self.start], [self.last], [self.count])
+            self.flag = None
+        out = {
+            k: np.concatenate(v) if v else np.array([], dtype="i8")
+            for k, v in self.done.items()
+        }
+        out["flag"] = out["flag"].astype(bool)
+        out["duration"] = out["count"] * self.step.hours()
+        return out
+
+
+_NO_ROWS = (np.array([], dtype="i8"), np.array([], dtype=float))
+
+
+@register_kernel("velocity")
+class VelocityKernel(Kernel):
+    """
+    Fish passage velocity for each gate. Only the flow and upstream stage series of the
+    gates are used, every other node in the input is skipped.
+
+    Velocity is computed as the chunks arrive. Flow and stage values up to the last
+    time both series have reached are matched on datetime, only the later values are
+    carried to the next chunk, so the rows of each node must come in time order. When
+    the rows are ordered by time this holds about one chunk per gate. When a file has
+    one series after another, a gate's flow is held until its stage arrives.
+    """
+
+    def __init__(self, gatef: Dict = gatef, **kwargs):
+        self.gatef = gatef
+        # node -> (gate index, 0 for flow or 1 for stage)
+        self.nodes = {}
+        for i in range(len(gatef["ID"])):
+            self.nodes[gatef["flow_op"][i].lower()] = (i, 0)
+            self.nodes[gatef["gate_status"][i].lower()] = (i, 1)
+        self.wanted = set(self.nodes)
+        self.pending = {i: [_NO_ROWS, _NO_ROWS] for i in range(len(gatef["ID"]))}
+        self.velocity: Dict[int, List] = {i: [] for i in range(len(gatef["ID"]))}
+
+    def update(self, chunk: DataFrame):
+        chunk = chunk[chunk["node"].str.lower().isin(self.wanted)]
+        gates = set()
+        for node, t, v in _node_arrays(chunk):
+            i, side = self.nodes[node.lower()]
+            pending_t, pending_v = self.pending[i][side]
+            self.pending[i][side] = (np.r_[pending_t, t], np.r_[pending_v, v])
+            gates.add(i)
+        for i in gates:
+            self._match(i)
+
+    def _match(self, i: int, final: bool = False):
+        (flow_t, flow_v), (stage_t, stage_v) = self.pending[i]
+        if final:
+            cutoff = np.iinfo("i8").max
+        elif len(flow_t) and len(stage_t):
+            # later rows of either series come after its last time, values up to the
+            # earlier of the two last times either match now or never will
+            cutoff = min(flow_t[-1], stage_t[-1])
+        else:
+            return
+        n_flow = np.searchsorted(flow_t, cutoff, side="right")
+        n_stage = np.searchsorted(stage_t, cutoff, side="right")
+        t, fi, si = np.intersect1d(
+            flow_t[:n_flow], stage_t[:n_stage], return_indices=True
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vel = calc_vel(
+                flow_v[fi],
+                stage_v[si],
+                self.gatef["bottom_elev"][i],
+                self.gatef["width"][i],
+            )
+        keep = ~np.isnan(vel)
+        self.velocity[i].append((t[keep], vel[keep]))
+        self.pending[i] = [
+            (flow_t[n_flow:], flow_v[n_flow:]),
+            (stage_t[n_stage:], stage_v[n_stage:]),
+        ]
+
+    def finalize(self) -> DataFrame:
+        out = []
+        for i, gate_id in enumerate(self.gatef["ID"]):
+            self._match(i, final=True)
+            pieces = self.velocity[i]
+            out.append(
+                DataFrame(
+                    {
+                        "datetime": np.concatenate([p[0] for p in pieces]).view(
+                            "datetime64[ns]"
+                        ),
+                        "node": gate_id.lower(),
+                        "param": "velocity",
+                        "value": np.concatenate([p[1] for p in pieces]),
+                        "unit": "FT/S",
+                    }
+                )
+            )
+        return pd.concat(out, ignore_index=True)
+
+
+@register_kernel("gate-streaks")
+class GateStreakKernel(Kernel):
+    """
+    Consecutive runs of gate open/closed status, a gate is closed when its gate
+    operation value is at or above `threshold`. Only the gate operation series
+    (<gate>_GATEOP) are used, every other node in the input is skipped.
+    """
+
+    def __init__(
+        self, threshold: Optional[float] = None, gatef: Dict = gatef, **kwargs
+    ):
+        self.threshold = GATE_CLOSED_VALUE if threshold is None else threshold
+        self.wanted = {f"{gate_id}_GATEOP".lower() for gate_id in gatef["ID"]}
+        self.runs: Dict[str, _Runs] = {}
+
+    def update(self, chunk: DataFrame):
+        chunk = chunk[chunk["node"].str.lower().isin(self.wanted)]
+        for node, t, v in _node_arrays(chunk):
+            self.runs.setdefault(node, _Runs()).push(t, v >= self.threshold)
+
+    def finalize(self) -> DataFrame:
+        out = []
+        for node, runs in self.runs.items():
+            r = runs.close()
+            out.append(
+                DataFrame(
+                    {
+                        "node": node,
+                        "gate_status": np.where(r["flag"], "Closed", "Open"),
+                        "min_datetime": r["start"].view("datetime64[ns]"),
+                        "max_datetime": r["end"].view("datetime64[ns]"),
+                        "count": r["count"],
+                        "streak_duration": r["duration"],
+                    }
+                )
+            )
+        return pd.concat(out, ignore_index=True) if out else DataFrame()
+
+
+@register_kernel("consecutive-stats")
+class ConsecutiveStatsKernel(Kernel):
+    """
+    Number, mean and max length (hours) of consecutive runs above and below `threshold`
+    for each node, defaults to the 8ft/s velocity criteria.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, **kwargs):
+        self.threshold = 8 if threshold is None else threshold
+        self.runs: Dict[str, _Runs] = {}
+
+    def update(self, chunk: DataFrame):
+        for node, t, v in _node_arrays(chunk):
+            self.runs.setdefault(node, _Runs()).push(t, v >= self.threshold)
+
+    def finalize(self) -> DataFrame:
+        out = []
+        for node, runs in self.runs.items():
+            r = runs.close()
+            for flag in [True, False]:
+                d = r["duration"][r["flag"] == flag]
+                out.append(
+                    {
+                        "node": node,
+                        "above_threshold": flag,
+                        "streak_count": len(d),
+                        "mean_streak_duration": d.mean() if len(d) else 0.0,
+                        "max_streak_duration": d.max() if len(d) else 0.0,
+                    }
+                )
+        return DataFrame(out)
+
+
+@register_kernel("daily-average")
+class DailyAverageKernel(Kernel):
+    """
+    Daily mean of every node. Each chunk is reduced to per node/day sums and counts
+    which are combined at the end.
+    """
+
+    def __init__(self, **kwargs):
+        self.partials: List[DataFrame] = []
+
+    def update(self, chunk: DataFrame):
+        for node, t, v in _node_arrays(chunk):
+            valid = ~np.isnan(v)
+            days, inverse = np.unique(t[valid] // NS_PER_DAY, return_inverse=True)
+            self.partials.append(
+                DataFrame(
+                    {
+                        "node": node,
+                        "day": days,
+                        "sum": np.bincount(inverse, weights=v[valid]),
+                        "n": np.bincount(inverse),
+                    }
+                )
+            )
+
+    def finalize(self) -> DataFrame:
+        if not self.partials:
+            return DataFrame()
+        total = (
+            pd.concat(self.partials)
+            .groupby(["node", "day"], sort=True)[["sum", "n"]]
+            .sum()
+            .reset_index()
+        )
+        return DataFrame(
+            {
+                "node": total["node"],
+                "date": (total["day"].to_numpy() * NS_PER_DAY).view("datetime64[ns]"),
+                "value": total["sum"] / total["n"],
+                "count": total["n"],
+            }
+        )
+
+
+@register_kernel("exceedance")
+class ExceedanceKernel(Kernel):
+    """
+    Number of values and hours at or above `threshold` for every node, defaults to the
+    8ft/s velocity criteria.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, **kwargs):
+        self.threshold = 8 if threshold is None else threshold
+        self.counts: Dict[str, np.ndarray] = {}
+        self.steps: Dict[str, _Step] = {}
+
+    def update(self, chunk: DataFrame):
+        for node, t, v in _node_arrays(chunk):
+            valid = ~np.isnan(v)
+            counts = self.counts.setdefault(node, np.zeros(2, dtype="i8"))
+            counts[0] += np.count_nonzero(v[valid] >= self.threshold)
+            counts[1] += np.count_nonzero(valid)
+            self.steps.setdefault(node, _Step()).push(t)
+
+    def finalize(self) -> DataFrame:
+        out = []
+        for node, (exceeded, total) in self.counts.items():
+            out.append(
+                {
+                    "node": node,
+                    "exceeded_count": exceeded,
+                    "total_count": total,
+                    "hours_exceeded": exceeded * self.steps[node].hours(),
+                    "exceedance": exceeded / total if total else np.nan,
+                }
+            )
+        return DataFrame(out)
+
+
+@register_kernel("quantiles")
+class QuantileKernel(Kernel):
+    """
+    Percentiles 0 to 100 (the exceedance curve) of every node from a histogram sketch,
+    memory does not grow with the length of the records.
+    """
+
+    def __init__(self, **kwargs):
+        self.sketches = SketchSet()
+
+    def update(self, chunk: DataFrame):
+        self.sketches.update(chunk)
+
+    def finalize(self) -> DataFrame:
+        out = self.sketches.quantiles()
+        return out.drop(columns="scenario") if len(out) else out
+
+
+def iter_long_chunks(path: str, chunksize: int = 1_000_000) -> Iterator[DataFrame]:
+    """
+    Read a long format CSV or Parquet file in chunks of `chunksize` rows.
+    """
+    if os.path.splitext(path)[1].lower() in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, parse_dates=["datetime"])
+
+
+def run_kernel(
+    kind: str,
+    input_file: str,
+    chunksize: int = 1_000_000,
+    compact: bool = False,
+    **params,
+) -> DataFrame:
+    """
+    Stream a long format file through the post-process kernel registered as `kind`.
+
+    Parameters:
+    - kind (str): name of a registered kernel, see `KERNELS`.
+    - input_file (str): long format CSV or Parquet file.
+    - chunksize (int): number of rows read at a time.
+    - compact (bool): return categorical string columns and float32 values.
+    - params: passed on to the kernel, e.g. threshold.
+
+    Returns:
+    - DataFrame: output of the kernel.
+    """
+    if kind not in KERNELS:
+        raise ValueError(
+            f"unknown post process kind '{kind}', expected one of: {', '.join(KERNELS)}"
+        )
+    kernel = KERNELS[kind](**params)
+    for chunk in iter_long_chunks(input_file, chunksize):
+        kernel.update(chunk)
+    out = kernel.finalize()
+    return compact_frame(out) if compact else out
@@ -0,0 +1,294 @@
+"""
+Polars backend for post-processing.
+
+The same steps as `post_process_full_data` (velocity, gate operation and velocity
+streaks, merged on datetime) built as one lazy Polars query per gate. Reading from
+Parquet/CSV the node and date filters are pushed down into the scan, the plan is only
+materialized once at the end and `pl.collect_all` runs the plans of many gates and
+scenarios in parallel on all cores.
+
+Polars is an optional dependency, install it with `pip install polars`.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from pandas import DataFrame
+
+from .buckets import NS_PER_HOUR
+from .data_config import GATE_CLOSED_VALUE, VELOCITY_THRESHOLD, gatef
+from ..utils import compact_frame
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+
+def _require_polars():
+    if pl is None:
+        raise ImportError(
+            "the polars backend needs polars installed: pip install polars"
+        )
+
+
+def _step_hours(column: str = "datetime"):
+    """
+    Expression for the time step in hours, the most common positive difference between
+    consecutive timestamps (same as `buckets.time_step_hours`).
+    """
+    d = pl.col(column).sort().diff().dt.total_nanoseconds()
+    return (d.filter(d > 0).mode().min() / NS_PER_HOUR).fill_null(0.0)
+
+
+def _from_pandas(df: DataFrame) -> "pl.LazyFrame":
+    return (
+        pl.from_pandas(df[["datetime", "value"]])
+        .lazy()
+        .with_columns(pl.col("value").cast(pl.Float64))
+    )
+
+
+def scan_long(source, scenario: Optional[str] = None) -> "pl.LazyFrame":
+    """
+    Lazy frame over long format data (datetime, node, param, value, unit).
+
+    Parameters:
+    - source (str, DataFrame or LazyFrame): Parquet file/directory, CSV file or frame.
+    - scenario (str or None): keep only rows of this scenario, needs a scenario column.
+
+    Returns:
+    - LazyFrame
+    """
+    _require_polars()
+    if isinstance(source, pl.LazyFrame):
+        lf = source
+    elif isinstance(source, pl.DataFrame):
+        lf = source.lazy()
+    elif isinstance(source, DataFrame):
+        lf = pl.from_pandas(source).lazy()
+    elif str(source).lower().endswith(".csv"):
+        lf = pl.scan_csv(source, try_parse_dates=True)
+    else:
+        lf = pl.scan_parquet(source)
+    if scenario is not None:
+        lf = lf.filter(pl.col("scenario") == scenario)
+    return lf
+
+
+def scan_gate_data(
+    source,
+    gate: str,
+    scenario: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    echo_config: Optional[Dict] = None,
+) -> Tuple["pl.LazyFrame", "pl.LazyFrame"]:
+    """
+    Lazy velocity and gate operation frames of one gate, the lazy counterpart of
+    `gate_model_data`.
+
+    Parameters:
+    - source (str, DataFrame or LazyFrame): long format data, see `scan_long`.
+    - gate (str): Gate identifier, one of the IDs in gatef.
+    - scenario (str or None): scenario to read when the source holds several.
+    - start_date (str or None): Start date in YYYY-MM-DD format.
+    - end_date (str or None): End date in YYYY-MM-DD format.
+    - echo_config (dict or None): Gate settings from the echo file.
+
+    Returns:
+    - tuple: (velocity, gate operation) LazyFrames with datetime and value columns.
+    """
+    from . import ECHO_GATE_IDS
+
+    i = gatef["ID"].index(gate)
+    bottom_elev, width = gatef["bottom_elev"][i], gatef["width"][i]
+    for name, settings in (echo_config or {}).items():
+        if ECHO_GATE_IDS.get(name) == gate:
+            bottom_elev = float(settings.bottom_elevation)
+            width = float(settings.width)
+
+    flow_node = gatef["flow_op"][i].lower()
+    stage_node = gatef["gate_status"][i].lower()
+    gateop_node = f"{gate}_GATEOP".lower()
+
+    # dss B parts are upper case, node names are matched in any case
+    node_key = pl.col("node").cast(pl.String).str.to_lowercase()
+    lf = scan_long(source, scenario).filter(
+        node_key.is_in([flow_node, stage_node, gateop_node])
+    )
+    if start_date is not None:
+        lf = lf.filter(pl.col("datetime") >= pd.Timestamp(start_date))
+    if end_date is not None:
+        lf = lf.filter(pl.col("datetime") <= pd.Timestamp(end_date))
+
+    def node(name: str, alias: str):
+        return lf.filter(node_key == name).select(
+            "datetime", pl.col("value").cast(pl.Float64).alias(alias)
+        )
+
+    velocity = (
+        node(flow_node, "flow")
+        .join(node(stage_node, "stage"), on="datetime", how="inner")
+        .select(
+            "datetime",
+            value=pl.col("flow") / ((pl.col("stage") - bottom_elev) * width),
+        )
+        .filter(pl.col("value").is_not_nan())
+        .sort("datetime")
+    )
+    return velocity, node(gateop_node, "value")
+
+
+def _streaks(lf: "pl.LazyFrame", changes) -> "pl.LazyFrame":
+    """
+    Number the runs where `changes` stays the same and add their first/last datetime,
+    length and duration in hours.
+    """
+    group = pl.col("consecutive_groups")
+    size = pl.len().over(group).cast(pl.Int64)
+    return lf.with_columns(
+        consecutive_groups=(changes != changes.shift())
+        .fill_null(True)
+        .cum_sum()
+        .cast(pl.Int64)
+    ).with_columns(
+        min_datetime=pl.col("datetime").min().over(group),
+        max_datetime=pl.col("datetime").max().over(group),
+        count=size,
+        streak_duration=size * _step_hours(),
+    )
+
+
+def post_process_lazy(
+    velocity: "pl.LazyFrame", gate_ops: "pl.LazyFrame", gate: str, model: str
+) -> "pl.LazyFrame":
+    """
+    Lazy plan producing the same frame as `post_process_full_data`.
+
+    Parameters:
+    - velocity (LazyFrame): datetime and value of the gate velocity.
+    - gate_ops (LazyFrame): datetime and value of the gate operation.
+    - gate (str): Gate identifier.
+    - model (str): model name.
+
+    Returns:
+    - LazyFrame
+    """
+    _require_polars()
+    gate_df = (
+        _streaks(
+            gate_ops.select("datetime", "value").with_columns(
+                gate_status=pl.col("value") >= GATE_CLOSED_VALUE
+            ),
+            pl.col("value"),
+        )
+        # like the pandas groupby, missing gate operations only break streaks
+        .filter(pl.col("value").is_not_null() & pl.col("value").is_not_nan())
+        .drop("consecutive_groups", "value")
+        .rename(
+            {
+                "min_datetime": "gate_min_datetime",
+                "max_datetime": "gate_max_datetime",
+                "count": "gate_count",
+                "streak_duration": "gate_streak_duration",
+            }
+        )
+    )
+    vel_df = (
+        _streaks(
+            velocity.select("datetime", "value").with_columns(
+                Velocity_Category=pl.when(pl.col("value") >= VELOCITY_THRESHOLD)
+                .then(pl.lit(f"Over {VELOCITY_THRESHOLD}ft/s"))
+                .otherwise(pl.lit(f"Under {VELOCITY_THRESHOLD}ft/s"))
+            ),
+            pl.col("Velocity_Category"),
+        )
+        .with_columns(date=pl.col("datetime").dt.truncate("1d").cast(pl.Datetime("ns")))
+        .select(
+            "datetime",
+            "value",
+            "Velocity_Category",
+            "consecutive_groups",
+            "min_datetime",
+            "max_datetime",
+            "date",
+            "count",
+            "streak_duration",
+        )
+    )
+    return vel_df.join(
+        gate_df, on="datetime", how="inner", maintain_order="left"
+    ).with_columns(
+        time_unit=_step_hours(),
+        gate_status=pl.when(pl.col("gate_status"))
+        .then(pl.lit("Closed"))
+        .otherwise(pl.lit("Open")),
+        week=pl.col("datetime").dt.week().cast(pl.Int64),
+        gate=pl.lit(gate),
+        model=pl.lit(model),
+    )
+
+
+def _to_pandas(df: "pl.DataFrame", compact: bool) -> DataFrame:
+    out = df.to_pandas()
+    for column, dtype in df.schema.items():
+        if dtype == pl.String:
+            out[column] = out[column].astype("str")
+    return compact_frame(out) if compact else out
+
+
+def post_process_full_data_lazy(
+    model_data: Dict, gate: str, compact: bool = False
+) -> DataFrame:
+    """
+    Polars implementation of `post_process_full_data`, same arguments and output.
+    """
+    _require_polars()
+    plan = post_process_lazy(
+        _from_pandas(model_data[gate]["vel"]),
+        _from_pandas(model_data[gate]["gate_operation_data"]),
+        gate,
+        model_data[gate]["model"],
+    )
+    return _to_pandas(plan.collect(), compact)
+
+
+def post_process_batch(
+    sources: Dict[str, object],
+    gates: Optional[List[str]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    compact: bool = False,
+) -> Dict[Tuple[str, str], DataFrame]:
+    """
+    Post-process many scenarios and gates at once, all plans are executed together by
+    `pl.collect_all` so they share the Polars thread pool.
+
+    Parameters:
+    - sources (dict): scenario name -> long format source, see `scan_long`. When a
+      source holds several scenarios (a `scenario` column) its rows are filtered to
+      the scenario name.
+    - gates (list or None): gate IDs, defaults to every gate in gatef.
+    - start_date (str or None): Start date in YYYY-MM-DD format.
+    - end_date (str or None): End date in YYYY-MM-DD format.
+    - compact (bool): Return categorical string columns and float32 values.
+
+    Returns:
+    - dict: (scenario, gate) -> post processed DataFrame.
+    """
+    _require_polars()
+    gates = gates or gatef["ID"]
+    keys, plans = [], []
+    for scenario, source in sources.items():
+        lf = scan_long(source)
+        if "scenario" in lf.collect_schema().names():
+            lf = lf.filter(pl.col("scenario") == scenario)
+        for gate in gates:
+            velocity, gate_ops = scan_gate_data(lf, gate, None, start_date, end_date)
+            keys.append((scenario, gate))
+            plans.append(post_process_lazy(velocity, gate_ops, gate, scenario))
+
+    return {
+        key: _to_pandas(df, compact) for key, df in zip(keys, pl.collect_all(plans))
+    }
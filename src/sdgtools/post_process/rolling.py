@@ -0,0 +1,243 @@
+"""
+Running window statistics for compliance rules.
+
+Moving means, minimums, maximums and counts above a threshold over trailing windows
+(e.g. daily or 14-day), computed along the time axis of a `ScenarioArray` for every
+scenario and gate at once. Sums and counts come from cumulative sums and min/max
+from the van Herk/Gil-Werman block algorithm, each is O(n) whatever the window
+length and no Python runs per window.
+
+A window ending at a timestep covers that timestep and the `window - 1` before it,
+like `pandas.Series.rolling`. Windows with fewer than `min_periods` non missing
+values are NaN.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .compare import ScenarioArray
+
+
+def window_steps(data: ScenarioArray, window) -> int:
+    """
+    Number of timesteps in a window given as steps (int) or a duration ("14D",
+    pd.Timedelta), the time index must be regular.
+    """
+    if isinstance(window, (int, np.integer)):
+        steps = int(window)
+    else:
+        if len(data.index) > 1 and len(np.unique(np.diff(data.index.asi8))) > 1:
+            raise ValueError(
+                "rolling windows need a regular time index, align with how='intersection' "
+                "or resample the data first"
+            )
+        step = pd.Timedelta(hours=data.time_step_hours())
+        if step <= pd.Timedelta(0):
+            raise ValueError("can not find the time step of the data")
+        steps = int(pd.Timedelta(window) / step)
+    if steps < 1:
+        raise ValueError(f"window {window} is shorter than one time step")
+    return steps
+
+
+def _window_diff(cum: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sums over trailing windows from cumulative sums along the last axis, window i is
+    cum[i] - cum[i - window].
+    """
+    out = np.empty_like(cum)
+    out[..., :window] = cum[..., :window]
+    np.subtract(cum[..., window:], cum[..., :-window], out=out[..., window:])
+    return out
+
+
+def moving_count(mask: np.ndarray, window: int) -> np.ndarray:
+    """
+    Number of True values in each trailing window along the last axis.
+    """
+    return _window_diff(np.cumsum(mask, axis=-1, dtype="i8"), window)
+
+
+def _enough(count: np.ndarray, window: int, min_periods: Optional[int]) -> np.ndarray:
+    return count >= (window if min_periods is None else min_periods)
+
+
+def _sum(values: np.ndarray, valid: np.ndarray, count: np.ndarray, window: int):
+    # sums are taken around the mean of each series to keep the cumulative sum small,
+    # a series with no values is centered on 0
+    n_valid = valid.sum(axis=-1, keepdims=True)
+    center = np.where(valid, values, 0.0).sum(axis=-1, keepdims=True)
+    center /= np.maximum(n_valid, 1)
+    filled = np.where(valid, values - center, 0.0)
+    total = _window_diff(np.cumsum(filled, axis=-1), window)
+    total += count * center
+    return total
+
+
+def _extreme(values: np.ndarray, valid: np.ndarray, window: int, op, fill: float):
+    """
+    van Herk/Gil-Werman: the series is cut into blocks of `window` steps, a trailing
+    window spans the end of one block and the start of the next, so it is the
+    extreme of a suffix running extreme and a prefix running extreme.
+    """
+    n = values.shape[-1]
+    n_blocks = -(-n // window)
+    padded = np.full(values.shape[:-1] + (n_blocks * window,), fill)
+    np.copyto(padded[..., :n], values, where=valid)
+    blocks = padded.reshape(values.shape[:-1] + (n_blocks, window))
+    prefix = op.accumulate(blocks, axis=-1).reshape(padded.shape)[..., :n]
+    suffix = op.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1]
+    suffix = suffix.reshape(padded.shape)[..., :n]
+
+    out = prefix
+    if n >= window:
+        op(
+            suffix[..., : n - window + 1],
+            prefix[..., window - 1 :],
+            out=out[..., window - 1 :],
+        )
+    return out
+
+
+def moving_sum(
+    values: np.ndarray, window: int, min_periods: Optional[int] = None
+) -> np.ndarray:
+    """
+    Sum of the non missing values in each trailing window along the last axis.
+    """
+    valid = ~np.isnan(values)
+    count = moving_count(valid, window)
+    total = _sum(values, valid, count, window)
+    return np.where(_enough(count, window, min_periods), total, np.nan)
+
+
+def moving_mean(
+    values: np.ndarray, window: int, min_periods: Optional[int] = None
+) -> np.ndarray:
+    """
+    Mean of the non missing values in each trailing window along the last axis.
+    """
+    valid = ~np.isnan(values)
+    count = moving_count(valid, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _sum(values, valid, count, window) / count
+    return np.where(_enough(count, window, min_periods), mean, np.nan)
+
+
+def moving_max(
+    values: np.ndarray, window: int, min_periods: Optional[int] = None
+) -> np.ndarray:
+    """
+    Maximum of each trailing window along the last axis.
+    """
+    valid = ~np.isnan(values)
+    out = _extreme(values, valid, window, np.maximum, -np.inf)
+    return np.where(
+        _enough(moving_count(valid, window), window, min_periods), out, np.nan
+    )
+
+
+def moving_min(
+    values: np.ndarray, window: int, min_periods: Optional[int] = None
+) -> np.ndarray:
+    """
+    Minimum of each trailing window along the last axis.
+    """
+    valid = ~np.isnan(values)
+    out = _extreme(values, valid, window, np.minimum, np.inf)
+    return np.where(
+        _enough(moving_count(valid, window), window, min_periods), out, np.nan
+    )
+
+
+def _like(data: ScenarioArray, values: np.ndarray) -> ScenarioArray:
+    return ScenarioArray(
+        scenarios=data.scenarios, gates=data.gates, index=data.index, values=values
+    )
+
+
+def rolling_stats(
+    data: ScenarioArray,
+    window="1D",
+    threshold: Optional[float] = None,
+    min_periods: Optional[int] = None,
+) -> Dict[str, ScenarioArray]:
+    """
+    Trailing window mean, min and max of every scenario and gate, and with a threshold
+    the number of hours at or above it within each window.
+
+    Parameters:
+    - data (ScenarioArray): Aligned scenarios, see `align_scenarios`. Use
+      field="water_level_data" for stage at the stations.
+    - window (str, Timedelta or int): window length, e.g. "1D", "14D" or a number of
+      timesteps.
+    - threshold (float or None): e.g. 8 for the 8ft/s velocity criteria.
+    - min_periods (int or None): non missing values needed in a window, defaults to
+      the full window.
+
+    Returns:
+    - dict: "mean", "min", "max" (and "hours_above") -> ScenarioArray.
+    """
+    steps = window_steps(data, window)
+    values = data.values
+    # the missing value mask and window counts are shared by all statistics
+    valid = ~np.isnan(values)
+    count = moving_count(valid, steps)
+    missing = ~_enough(count, steps, min_periods)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _sum(values, valid, count, steps) / count
+    out = {"mean": mean}
+    out["min"] = _extreme(values, valid, steps, np.minimum, np.inf)
+    out["max"] = _extreme(values, valid, steps, np.maximum, -np.inf)
+    for stat in out.values():
+        stat[missing] = np.nan
+    out = {name: _like(data, stat) for name, stat in out.items()}
+
+    if threshold is not None:
+        above = np.greater_equal(
+            values, threshold, where=valid, out=np.zeros(values.shape, dtype=bool)
+        )
+        out["hours_above"] = _like(
+            data, moving_count(above, steps) * data.time_step_hours()
+        )
+    return out
+
+
+def worst_windows(stats: Dict[str, ScenarioArray]) -> pd.DataFrame:
+    """
+    Highest and lowest window of each rolling statistic for every scenario and gate,
+    e.g. the highest 14-day mean velocity and when that window ends.
+
+    Parameters:
+    - stats (dict): output of `rolling_stats`.
+
+    Returns:
+    - DataFrame: scenario, gate, stat, max, max_window_end, min, min_window_end.
+    """
+    out = []
+    for name, data in stats.items():
+        n_scen, n_gate, n_time = data.values.shape
+        flat = data.values.reshape(n_scen * n_gate, n_time)
+        has_values = ~np.isnan(flat).all(axis=1)
+        safe = np.where(has_values[:, None], flat, 0.0)
+        i_max = np.nanargmax(safe, axis=1)
+        i_min = np.nanargmin(safe, axis=1)
+        rows = np.arange(len(flat))
+        ends = data.index.values
+        out.append(
+            pd.DataFrame(
+                {
+                    "scenario": np.repeat(data.scenarios, n_gate),
+                    "gate": np.tile(data.gates, n_scen),
+                    "stat": name,
+                    "max": np.where(has_values, flat[rows, i_max], np.nan),
+                    "max_window_end": pd.DatetimeIndex(ends[i_max]).where(has_values),
+                    "min": np.where(has_values, flat[rows, i_min], np.nan),
+                    "min_window_end": pd.DatetimeIndex(ends[i_min]).where(has_values),
+                }
+            )
+        )
+    return pd.concat(out, ignore_index=True)
@@ -0,0 +1,339 @@
+"""
+Streaming quantile and exceedance statistics.
+
+Values are counted into fixed width histogram bins as they arrive, one chunk at a
+time, so percentiles and exceedance curves of long records take one pass and the
+memory of the bins only. Sketches with the same bins are merged by adding counts,
+which gives the same result as sketching all the data at once, so scenarios can be
+sketched by parallel workers (or on other machines, see `SketchSet.save`) and
+combined afterwards.
+
+Percentiles are exact to within one bin width (0.01 by default) for values inside
+[lo, hi), values outside the range are still counted and interpolated between the
+range and the observed min/max.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# stage in feet at the compliance stations falls well inside this range
+DEFAULT_RANGE = (-20.0, 40.0)
+DEFAULT_BIN_WIDTH = 0.01
+
+PERCENTILES = np.arange(0, 101)
+
+
+class HistogramSketch:
+    """
+    Fixed width histogram of a stream of values with an underflow and an overflow bin,
+    the count, sum, min and max.
+    """
+
+    def __init__(
+        self,
+        lo: float = DEFAULT_RANGE[0],
+        hi: float = DEFAULT_RANGE[1],
+        bin_width: float = DEFAULT_BIN_WIDTH,
+    ):
+        if hi <= lo or bin_width <= 0:
+            raise ValueError("need lo < hi and a positive bin_width")
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.bin_width = float(bin_width)
+        self.n_bins = int(np.ceil((self.hi - self.lo) / self.bin_width))
+        # counts[0] is below lo, counts[-1] at or above hi
+        self.counts = np.zeros(self.n_bins + 2, dtype="i8")
+        self.n = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values) -> "HistogramSketch":
+        v = np.asarray(values, dtype=float)
+        v = v[np.isfinite(v)]
+        if len(v) == 0:
+            return self
+        idx = np.floor((v - self.lo) / self.bin_width)
+        idx = np.clip(idx, -1, self.n_bins).astype("i8") + 1
+        self.counts += np.bincount(idx, minlength=self.n_bins + 2)
+        self.n += len(v)
+        self.total += float(v.sum())
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+        return self
+
+    def _check_bins(self, other: "HistogramSketch"):
+        if (self.lo, self.hi, self.bin_width) != (other.lo, other.hi, other.bin_width):
+            raise ValueError("only sketches with the same bins can be merged")
+
+    def merge(self, other: "HistogramSketch") -> "HistogramSketch":
+        self._check_bins(other)
+        self.counts += other.counts
+        self.n += other.n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else np.nan
+
+    def _edges(self) -> np.ndarray:
+        """
+        Lower edge of every bin and the upper edge of the last, the underflow and
+        overflow bins reach to the observed min and max.
+        """
+        inner = self.lo + self.bin_width * np.arange(self.n_bins + 1)
+        inner[-1] = self.hi
+        edges = np.r_[min(self.min, self.lo), inner, max(self.max, self.hi)]
+        return np.clip(edges, self.min, self.max)
+
+    def quantile(self, q) -> np.ndarray:
+        """
+        Values below which a fraction `q` (0 to 1) of the data falls, interpolated
+        linearly within a bin.
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.n == 0:
+            return np.full(len(q), np.nan)
+        edges = self._edges()
+        cum = np.r_[0, np.cumsum(self.counts)]
+        target = np.clip(q, 0, 1) * self.n
+        # first bin whose cumulative count reaches the target
+        b = np.clip(
+            np.searchsorted(cum, target, side="left") - 1, 0, len(self.counts) - 1
+        )
+        inside = target - cum[b]
+        count = self.counts[b]
+        frac = np.divide(inside, count, out=np.zeros(len(q)), where=count > 0)
+        out = edges[b] + frac * (edges[b + 1] - edges[b])
+        out[q <= 0] = self.min
+        out[q >= 1] = self.max
+        return out
+
+    def exceedance(self, levels) -> np.ndarray:
+        """
+        Fraction of the values at or above each level.
+        """
+        levels = np.atleast_1d(np.asarray(levels, dtype=float))
+        if self.n == 0:
+            return np.full(len(levels), np.nan)
+        edges = self._edges()
+        above = np.r_[np.cumsum(self.counts[::-1])[::-1], 0]
+        b = np.clip(
+            np.searchsorted(edges, levels, side="right") - 1, 0, len(self.counts) - 1
+        )
+        width = edges[b + 1] - edges[b]
+        frac = np.divide(
+            edges[b + 1] - levels, width, out=np.zeros(len(levels)), where=width > 0
+        )
+        out = above[b + 1] + np.clip(frac, 0, 1) * self.counts[b]
+        out = out / self.n
+        out[levels <= self.min] = 1.0
+        out[levels > self.max] = 0.0
+        return out
+
+
+class SketchSet:
+    """
+    One HistogramSketch per scenario and node, all on the same bins.
+    """
+
+    def __init__(
+        self,
+        lo: float = DEFAULT_RANGE[0],
+        hi: float = DEFAULT_RANGE[1],
+        bin_width: float = DEFAULT_BIN_WIDTH,
+    ):
+        self.lo = lo
+        self.hi = hi
+        self.bin_width = bin_width
+        self.sketches: Dict[Tuple[str, str], HistogramSketch] = {}
+
+    def sketch(self, scenario: str, node: str) -> HistogramSketch:
+        key = (scenario, node)
+        if key not in self.sketches:
+            self.sketches[key] = HistogramSketch(self.lo, self.hi, self.bin_width)
+        return self.sketches[key]
+
+    def update(self, chunk: DataFrame, scenario: str = "") -> "SketchSet":
+        """
+        Add a long format chunk (node and value columns) of a scenario.
+        """
+        for node, g in chunk.groupby("node", sort=False, observed=True):
+            self.sketch(scenario, str(node)).update(g["value"].to_numpy(dtype=float))
+        return self
+
+    def merge(self, other: "SketchSet") -> "SketchSet":
+        for (scenario, node), sketch in other.sketches.items():
+            self.sketch(scenario, node).merge(sketch)
+        return self
+
+    def summary(self) -> DataFrame:
+        return DataFrame(
+            [
+                {
+                    "scenario": scenario,
+                    "node": node,
+                    "count": s.n,
+                    "mean": s.mean,
+                    "min": s.min if s.n else np.nan,
+                    "max": s.max if s.n else np.nan,
+                }
+                for (scenario, node), s in self.sketches.items()
+            ]
+        )
+
+    def quantiles(self, percentiles: Iterable[float] = PERCENTILES) -> DataFrame:
+        """
+        Percentiles of every scenario and node, as an exceedance curve: the value is
+        exceeded `exceedance_probability` percent of the time.
+        """
+        percentiles = np.asarray(list(percentiles), dtype=float)
+        out = []
+        for (scenario, node), s in self.sketches.items():
+            out.append(
+                DataFrame(
+                    {
+                        "scenario": scenario,
+                        "node": node,
+                        "percentile": percentiles,
+                        "exceedance_probability": 100 - percentiles,
+                        "value": s.quantile(percentiles / 100),
+                    }
+                )
+            )
+        return pd.concat(out, ignore_index=True) if out else DataFrame()
+
+    def exceedance(self, levels: Iterable[float]) -> DataFrame:
+        """
+        Fraction of the values at or above each level for every scenario and node.
+        """
+        levels = np.asarray(list(levels), dtype=float)
+        out = []
+        for (scenario, node), s in self.sketches.items():
+            out.append(
+                DataFrame(
+                    {
+                        "scenario": scenario,
+                        "node": node,
+                        "level": levels,
+                        "exceedance": s.exceedance(levels),
+                    }
+                )
+            )
+        return pd.concat(out, ignore_index=True) if out else DataFrame()
+
+    def save(self, path: str):
+        """
+        Write the sketches to a .npz file, e.g. to merge the results of several
+        machines with `load` and `merge`.
+        """
+        keys = list(self.sketches)
+        sketches = [self.sketches[k] for k in keys]
+        np.savez_compressed(
+            path,
+            bins=np.array([self.lo, self.hi, self.bin_width]),
+            keys=np.array(keys, dtype=str).reshape(-1, 2),
+            counts=np.array([s.counts for s in sketches], dtype="i8").reshape(
+                len(keys), -1
+            ),
+            stats=np.array([[s.n, s.total, s.min, s.max] for s in sketches]).reshape(
+                -1, 4
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "SketchSet":
+        with np.load(path) as f:
+            lo, hi, bin_width = f["bins"]
+            out = cls(lo, hi, bin_width)
+            for (scenario, node), counts, (n, total, lo_, hi_) in zip(
+                f["keys"], f["counts"], f["stats"]
+            ):
+                s = out.sketch(str(scenario), str(node))
+                s.counts[:] = counts
+                s.n, s.total, s.min, s.max = int(n), float(total), lo_, hi_
+        return out
+
+
+def _sketch_dss_file(
+    scenario: str,
+    path: str,
+    parts_regex: str,
+    lo: float,
+    hi: float,
+    bin_width: float,
+    chunk_years: Optional[int],
+) -> SketchSet:
+    from ..readers.dss import iter_dss
+
+    sketches = SketchSet(lo, hi, bin_width)
+    for chunk in iter_dss(path, parts_regex, chunk_years):
+        sketches.update(chunk, scenario)
+    return sketches
+
+
+def sketch_dss_files(
+    files: Dict[str, str],
+    parts_regex: Optional[str] = None,
+    lo: float = DEFAULT_RANGE[0],
+    hi: float = DEFAULT_RANGE[1],
+    bin_width: float = DEFAULT_BIN_WIDTH,
+    chunk_years: Optional[int] = 10,
+    max_workers: Optional[int] = None,
+) -> Tuple[SketchSet, Dict[str, str]]:
+    """
+    Sketch the series of many DSS files in a process pool, each file is read a series
+    and `chunk_years` at a time and the sketches of the workers are merged.
+
+    Parameters:
+    - files (dict): scenario name -> DSS file.
+    - parts_regex (str or None): pathnames to read, defaults to the stage of the water
+      level compliance stations (HYDRO_STATION_NAMES).
+    - lo, hi, bin_width (float): histogram bins.
+    - chunk_years (int or None): years read at a time, None reads whole series.
+    - max_workers (int or None): number of processes, defaults to the number of CPUs.
+
+    Returns:
+    - tuple: (merged SketchSet, errors by scenario).
+    """
+    if parts_regex is None:
+        from ..readers.dss import make_dss_regex_from_parts
+        from ..readers.scenario import HYDRO_STATION_NAMES
+
+        parts_regex = make_dss_regex_from_parts(B=HYDRO_STATION_NAMES, C="STAGE")
+
+    results, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(
+                _sketch_dss_file,
+                scenario,
+                str(path),
+                parts_regex,
+                lo,
+                hi,
+                bin_width,
+                chunk_years,
+            ): scenario
+            for scenario, path in files.items()
+        }
+        for future in as_completed(futures):
+            scenario = futures[future]
+            try:
+                results[scenario] = future.result()
+            except Exception as e:
+                errors[scenario] = str(e)
+
+    # merged in the order of `files` whatever order the workers finish in
+    merged = SketchSet(lo, hi, bin_width)
+    for scenario in files:
+        if scenario in results:
+            merged.merge(results[scenario])
+    return merged, errors
@@ -0,0 +1,330 @@
+"""
+Persistent index of the DSS pathnames in a model output tree.
+
+`PathCatalog.build` scans a directory tree once and records for every DSS file its
+size, modification time and pathnames (A-F parts and period of record) in a SQLite
+file. Later builds only rescan files that were added or changed and drop files that
+are gone.
+
+Readers take the catalog as `catalog=` (see `read_dss`, `read_scenario`): for a file
+that is indexed and unchanged the matching pathnames come from the index, a file
+without matches is not opened at all and a file with matches is read without
+cataloging it again. Files missing from the index, or changed since it was built,
+are read the usual way.
+"""
+
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyhecdss
+
+DEFAULT_INDEX = "sdgtools_catalog.sqlite"
+
+PARTS = ["a", "b", "c", "d", "e", "f"]
+
+
+@dataclass
+class BuildResult:
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+def _period(d_part: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    First and last day (ISO dates) of a condensed D part "01JAN1990 - 31DEC2015", a
+    single block "01JAN2000" is both.
+    """
+    try:
+        days = [_day(d) for d in d_part.split(" - ")]
+    except ValueError:
+        return None, None
+    if len(days) == 1:
+        return days[0], days[0]
+    if len(days) != 2:
+        return None, None
+    return days[0], days[1]
+
+
+def _day(date) -> str:
+    day = pd.Timestamp(str(date).strip())
+    if pd.isna(day):
+        raise ValueError(f"not a date: {date!r}")
+    return day.date().isoformat()
+
+
+def _scan_file(path: str) -> List[Tuple]:
+    """
+    Pathname rows (A-F parts, start, end, pathname) of a DSS file.
+    """
+    with pyhecdss.DSSFile(path) as dss:
+        catalog = dss.read_catalog()
+        if catalog is None or len(catalog) == 0:
+            return []
+        rows = []
+        for pathname in dss.get_pathnames(catalog):
+            parts = pathname.split("/")[1:7]
+            rows.append((*parts, *_period(parts[3]), pathname))
+    return rows
+
+
+def _regexp(pattern: str, value: str) -> bool:
+    # same matching as pyhecdss.get_matching_ts, anchored at the start of the part
+    return value is not None and re.match(pattern, value) is not None
+
+
+def _stat(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _dss_files(root: str) -> Iterator[str]:
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(".dss"):
+                yield os.path.abspath(os.path.join(dirpath, name))
+
+
+class PathCatalog:
+    """
+    DSS pathnames of many files in a SQLite file.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX):
+        self.path = path
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.create_function("REGEXP", 2, _regexp, deterministic=True)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self):
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    n_paths INTEGER NOT NULL,
+                    scanned REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS paths (
+                    file_id INTEGER NOT NULL,
+                    a TEXT, b TEXT, c TEXT, d TEXT, e TEXT, f TEXT,
+                    start TEXT,
+                    end TEXT,
+                    pathname TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS paths_file ON paths (file_id);
+                CREATE INDEX IF NOT EXISTS paths_b_c ON paths (b, c);
+                """)
+
+    def build(
+        self,
+        root: str,
+        max_workers: Optional[int] = None,
+        on_file: Optional[Callable[[str, str], None]] = None,
+    ) -> BuildResult:
+        """
+        Index every DSS file under `root`. Files already indexed with the same size and
+        modification time are skipped, files no longer on disk are removed from the
+        index.
+
+        Parameters:
+        - root (str): directory to scan.
+        - max_workers (int or None): number of scanning processes, defaults to the
+          number of CPUs.
+        - on_file (callable or None): called with (path, "added"/"updated"/"failed")
+          as files are scanned.
+
+        Returns:
+        - BuildResult
+        """
+        self.create()
+        root = os.path.abspath(root)
+        result = BuildResult()
+        with self._connect() as conn:
+            known = {
+                path: (size, mtime_ns, file_id)
+                for file_id, path, size, mtime_ns in conn.execute(
+                    """SELECT id, path, size, mtime_ns FROM files
+                       WHERE substr(path, 1, length(?1)) = ?1""",
+                    (os.path.join(root, ""),),
+                )
+            }
+
+        on_disk = {}
+        for path in _dss_files(root):
+            try:
+                on_disk[path] = _stat(path)
+            except OSError:
+                continue
+        to_scan = [
+            p for p, stat in on_disk.items() if known.get(p, (None,))[:2] != stat
+        ]
+        result.unchanged = len(on_disk) - len(to_scan)
+        removed = [p for p in known if p not in on_disk]
+
+        with self._connect() as conn:
+            for path in removed:
+                self._delete(conn, known[path][2])
+                result.removed.append(path)
+
+        if not to_scan:
+            return result
+        # heclib is not thread safe, files are cataloged in separate processes
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_scan_file, path): path for path in to_scan}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    result.errors[path] = str(e)
+                    if on_file is not None:
+                        on_file(path, "failed")
+                    continue
+                with self._connect() as conn:
+                    if path in known:
+                        self._delete(conn, known[path][2])
+                    cur = conn.execute(
+                        """INSERT INTO files (path, size, mtime_ns, n_paths, scanned)
+                           VALUES (?, ?, ?, ?, ?)""",
+                        (path, *on_disk[path], len(rows), time.time()),
+                    )
+                    conn.executemany(
+                        f"""INSERT INTO paths (file_id, {", ".join(PARTS)}, start, end,
+                                               pathname)
+                            VALUES ({cur.lastrowid}, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                        rows,
+                    )
+                status = "updated" if path in known else "added"
+                getattr(result, status).append(path)
+                if on_file is not None:
+                    on_file(path, status)
+        return result
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, file_id: int):
+        conn.execute("DELETE FROM paths WHERE file_id = ?", (file_id,))
+        conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def find(
+        self,
+        parts_regex: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        files: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Pathnames matching a parts regex (see `make_dss_regex_from_parts`) whose period
+        of record overlaps start-end.
+
+        Parameters:
+        - parts_regex (str or None): /A/B/C/D/E/F/ regular expressions, the D part is
+          not used, filter on dates with start and end instead.
+        - start (str or None): only series with data on or after this day.
+        - end (str or None): only series with data on or before this day.
+        - files (list or None): only these files.
+
+        Returns:
+        - DataFrame: file, a-f, start, end, pathname.
+        """
+        where, params = [], []
+        if parts_regex is not None:
+            patterns = parts_regex.upper().split("/")[1:7]
+            for part, pattern in zip(PARTS, patterns):
+                if part != "d" and pattern not in ("", ".*"):
+                    where.append(f"p.{part} REGEXP ?")
+                    params.append(pattern)
+        if start is not None:
+            where.append("p.end >= ?")
+            params.append(_day(start))
+        if end is not None:
+            where.append("p.start <= ?")
+            params.append(_day(end))
+        if files is not None:
+            where.append(f"f.path IN ({', '.join('?' * len(files))})")
+            params.extend(os.path.abspath(p) for p in files)
+
+        self.create()
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                f"""SELECT f.path AS file, {", ".join("p." + p for p in PARTS)},
+                           p.start, p.end, p.pathname
+                    FROM paths p JOIN files f ON f.id = p.file_id
+                    {"WHERE " + " AND ".join(where) if where else ""}
+                    ORDER BY f.path, p.rowid""",
+                conn,
+                params=params,
+            )
+
+    def files(self) -> pd.DataFrame:
+        self.create()
+        with self._connect() as conn:
+            return pd.read_sql_query(
+                "SELECT path, size, mtime_ns, n_paths, scanned FROM files ORDER BY path",
+                conn,
+            )
+
+    def pathnames(self, file: str, parts_regex: str) -> Optional[List[str]]:
+        """
+        Pathnames of `file` matching `parts_regex`, None when the file is not in the
+        index or changed since it was indexed.
+        """
+        path = os.path.abspath(file)
+        self.create()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT size, mtime_ns FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        try:
+            if row is None or tuple(row) != _stat(path):
+                return None
+        except OSError:
+            return None
+        return self.find(parts_regex, files=[path])["pathname"].tolist()
+
+
+def get_matching_ts(file: str, parts_regex: str, catalog: Optional[PathCatalog] = None):
+    """
+    `pyhecdss.get_matching_ts` that takes the pathnames from `catalog` when the file
+    is indexed and unchanged. Like pyhecdss it raises when nothing in the file matches,
+    without opening the file.
+    """
+    pathnames = None if catalog is None else catalog.pathnames(file, parts_regex)
+    if pathnames is None:
+        return pyhecdss.get_matching_ts(file, parts_regex)
+    if not pathnames:
+        raise Exception(f"No pathname found in {file} for {parts_regex.upper()}")
+    return _read_pathnames(file, pathnames, parts_regex.upper().split("/")[4].strip())
+
+
+def _read_pathnames(file: str, pathnames: List[str], window: str):
+    start = end = None
+    if window:
+        try:
+            start, end = pyhecdss.get_start_end_dates(window)
+        except Exception:
+            start = end = None
+    with pyhecdss.DSSFile(file) as dss:
+        for pathname in pathnames:
+            if pathname.split("/")[5].startswith("IR-"):
+                yield dss.read_its(pathname, start, end)
+            else:
+                yield dss.read_rts(pathname, start, end)
@@ -1,6 +1,10 @@
+from typing import Iterator, List, Optional, Tuple
+
 import pyhecdss
 import pandas as pd
 
+from ..utils import CategoryDictionary, compact_frame, make_wide_frame
+from .catalog import PathCatalog, get_matching_ts
 
 PARAM_TO_UNIT = {"flow": "CFS", "stage": "FEET", "device-flow": "CFS"}
 
@@ -16,6 +20,11 @@ def add_node_and_param_cols(df):
     return df_copy
 
 
+def _path_unit(dss_data) -> str:
+    param = dss_data.data.columns[0].split("/")[3].lower()
+    return PARAM_TO_UNIT.get(param, dss_data.units)
+
+
 def make_dss_regex_from_parts(A=None, B=None, C=None, D=None, E=None, F=None):
     def do_regex_or(part):
         if part is None:
@@ -31,13 +40,119 @@ def make_dss_regex_from_parts(A=None, B=None, C=None, D=None, E=None, F=None):
 
 
 def read_dss(
-    file: str, parts_regex: str | None = make_dss_regex_from_parts()
+    file: str,
+    parts_regex: str | None = make_dss_regex_from_parts(),
+    compact: bool = False,
+    categories: CategoryDictionary | None = None,
+    wide: bool = False,
+    catalog: PathCatalog | None = None,
 ) -> pd.DataFrame:
-    all_paths = list(pyhecdss.get_matching_ts(file, parts_regex))
+    """
+    Read all time series matching `parts_regex` into a long format frame with columns
+    datetime, node, param, value, unit. With `compact` the string columns are
+    categoricals (encoded with `categories` when given) and values are float32.
+
+    With `wide` the result instead has a shared DatetimeIndex and one column per
+    pathname, the columns are a MultiIndex of pathname, node, param and unit.
+
+    With a `catalog` (see `sdgtools.readers.catalog`) the pathnames are looked up in
+    the index instead of the file, a file without matching pathnames is not opened.
+    """
+    all_paths = list(get_matching_ts(file, parts_regex, catalog))
     if len(all_paths) == 0:
         return pd.DataFrame()
+    if wide:
+        return make_wide_frame(
+            [p.data for p in all_paths],
+            [_path_unit(p) for p in all_paths],
+            float_dtype="float32" if compact else "float64",
+        )
     data = [add_node_and_param_cols(all_paths[i].data) for i in range(len(all_paths))]
     concat_data = pd.concat(data)
     concat_data["unit"] = concat_data["param"].map(PARAM_TO_UNIT)
     concat_data = concat_data[["datetime", "node", "param", "value", "unit"]]
+    if compact:
+        concat_data = compact_frame(concat_data, categories)
     return concat_data
+
+
+def _time_windows(
+    pathname: str, chunk_years: Optional[int]
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Start/end date strings covering the D part time window of a condensed catalog
+    pathname in steps of `chunk_years`.
+    """
+    if chunk_years is None:
+        return [(None, None)]
+    try:
+        start, end = [
+            pd.Timestamp(d.strip()) for d in pathname.split("/")[4].split("-")
+        ]
+    except ValueError:
+        return [(None, None)]
+    bounds = list(pd.date_range(start, end, freq=pd.DateOffset(years=chunk_years)))
+    if bounds[-1] < end:
+        bounds.append(end)
+    if len(bounds) < 2:
+        return [(None, None)]
+    fmt = "%d%b%Y"
+    return [
+        (s.strftime(fmt).upper(), e.strftime(fmt).upper())
+        for s, e in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def iter_dss(
+    file: str,
+    parts_regex: str | None = make_dss_regex_from_parts(),
+    chunk_years: Optional[int] = None,
+    compact: bool = False,
+    categories: CategoryDictionary | None = None,
+    catalog: PathCatalog | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read the time series matching `parts_regex` one at a time as long format frames
+    (datetime, node, param, value, unit), the file is opened once. With `chunk_years`
+    each series is also read that many years at a time, so only one chunk is in memory
+    however long the records are. With a `catalog` the pathnames come from the index.
+    With `compact` all the frames of the file share `categories`.
+    """
+    pathnames = None if catalog is None else catalog.pathnames(file, parts_regex)
+    if pathnames == []:
+        return
+    if compact and categories is None:
+        categories = CategoryDictionary()
+    with pyhecdss.DSSFile(file) as dss:
+        if pathnames is None:
+            dss_catalog = dss.read_catalog()
+            parts = parts_regex.upper().split("/")
+            keep = pd.Series(True, index=dss_catalog.index)
+            for part, column in zip(parts[1:4] + parts[5:7], list("ABCEF")):
+                if part:
+                    keep &= dss_catalog[column].str.match(part)
+            pathnames = dss.get_pathnames(dss_catalog[keep])
+        for pathname in pathnames:
+            read = (
+                dss.read_its
+                if pathname.split("/")[5].startswith("IR-")
+                else dss.read_rts
+            )
+            last = None
+            for start, end in _time_windows(pathname, chunk_years):
+                data = read(pathname, start, end)
+                df = data.data
+                t = df.index
+                if isinstance(t, pd.PeriodIndex):
+                    t = t.to_timestamp()
+                # windows share their boundary, keep each timestamp once
+                if last is not None:
+                    df = df[t > last]
+                    t = t[t > last]
+                if len(df) == 0:
+                    continue
+                last = t[-1]
+                out = add_node_and_param_cols(df)
+                out["unit"] = out["param"].map(PARAM_TO_UNIT)
+                out = out[["datetime", "node", "param", "value", "unit"]]
+                yield compact_frame(out, categories) if compact else out
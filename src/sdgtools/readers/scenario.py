@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from typing import Dict, Any
+from .catalog import PathCatalog
 from .dss import read_dss, make_dss_regex_from_parts
 
 import pandas as pd
@@ -73,44 +74,79 @@ def read_gate_settings(df: pd.DataFrame) -> Dict[str, GateSettings]:
     return echo_settings
 
 
-def read_scenario(
-    scenario_name: str,
-    sdg_path: str,
-    hydro_path: str,
-    echo_path: str,
-) -> ScenarioData:
+def read_sdg(
+    sdg_path: str, compact: bool = False, catalog: PathCatalog | None = None
+) -> Dict[str, pd.DataFrame]:
     """
-    Reads a colleciton of three files to compile a scenario
+    Read the gate stage, device flow and gate operation series from an SDG dss file
     """
     sdg_stage = read_dss(
-        sdg_path, make_dss_regex_from_parts(B=SDG_ELEVATION_LIST, C="STAGE")
+        sdg_path,
+        make_dss_regex_from_parts(B=SDG_ELEVATION_LIST, C="STAGE"),
+        compact=compact,
+        catalog=catalog,
     )
-    # sdg_stage['scenario_name'] = scenario_name
     sdg_flow = read_dss(
-        sdg_path, make_dss_regex_from_parts(B=SDG_FLOW_LIST, C="DEVICE-FLOW")
+        sdg_path,
+        make_dss_regex_from_parts(B=SDG_FLOW_LIST, C="DEVICE-FLOW"),
+        compact=compact,
+        catalog=catalog,
     )
-    # sdg_flow['scenario_name'] = scenario_name
     sdg_gate_ops = read_dss(
-        sdg_path, make_dss_regex_from_parts(B=SDG_GATE_OP_LIST, C="ELEV")
+        sdg_path,
+        make_dss_regex_from_parts(B=SDG_GATE_OP_LIST, C="ELEV"),
+        compact=compact,
+        catalog=catalog,
     )
-    # sdg_gate_ops['scenario_name'] = scenario_name
+    return {"sdg_stage": sdg_stage, "sdg_flow": sdg_flow, "sdg_gate_ops": sdg_gate_ops}
 
-    hydro_data = read_dss(
-        hydro_path, make_dss_regex_from_parts(B=HYDRO_STATION_NAMES, C="STAGE")
+
+def read_hydro(
+    hydro_path: str, compact: bool = False, catalog: PathCatalog | None = None
+) -> pd.DataFrame:
+    """
+    Read the water level compliance stations from a hydro dss file
+    """
+    return read_dss(
+        hydro_path,
+        make_dss_regex_from_parts(B=HYDRO_STATION_NAMES, C="STAGE"),
+        compact=compact,
+        catalog=catalog,
     )
-    # hydro_data['scenario_name'] = scenario_name
 
-    # echo file
+
+def read_echo_settings(echo_path: str) -> Dict[str, GateSettings]:
+    """
+    Read the fish passage gate settings from a hydro echo file
+    """
     echo_data = read_input(echo_path)
     gate_weir_dev = echo_data["GATE_WEIR_DEVICE"]
     gate_weir_dev = gate_weir_dev[gate_weir_dev["DEVICE"] == "fish_passage"]
-    echo_settings = read_gate_settings(gate_weir_dev)
+    return read_gate_settings(gate_weir_dev)
+
+
+def read_scenario(
+    scenario_name: str,
+    sdg_path: str,
+    hydro_path: str,
+    echo_path: str,
+    compact: bool = False,
+    catalog: PathCatalog | None = None,
+) -> ScenarioData:
+    """
+    Reads a colleciton of three files to compile a scenario. With `compact` the frames use
+    categoricals and float32 values (see `sdgtools.utils.compact_frame`). With a
+    `catalog` the pathnames are looked up in the index (see `sdgtools.readers.catalog`).
+    """
+    sdg_data = read_sdg(sdg_path, compact, catalog)
+    hydro_data = read_hydro(hydro_path, compact, catalog)
+    echo_settings = read_echo_settings(echo_path)
 
     return ScenarioData(
         name=scenario_name,
-        sdg_stage=sdg_stage,
-        sdg_flow=sdg_flow,
-        sdg_gate_ops=sdg_gate_ops,
+        sdg_stage=sdg_data["sdg_stage"],
+        sdg_flow=sdg_data["sdg_flow"],
+        sdg_gate_ops=sdg_data["sdg_gate_ops"],
         wl_compliance=hydro_data,
         echo_config=echo_settings,
     )
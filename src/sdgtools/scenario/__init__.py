@@ -1 +1,297 @@
-def read_scenario(sdg_path, hydro_path, ccf_path, echo_path): ...
+"""
+Scenario level processing: read -> post-process -> load as one pipelined job.
+
+The hydro and SDG dss files are read in separate processes (heclib is not thread
+safe) that send each series, or chunk of a series, to this process as soon as it is
+read. Every chunk is validated and handed to a single loader thread that COPYs it
+into the database while the readers go on with the next one, and the flow and stage
+series also go to a post-processing thread that computes velocity once the SDG file
+is read. The stages are connected by bounded queues so a slow loader holds back the
+readers instead of buffering everything.
+"""
+
+import multiprocessing
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+import psycopg2
+
+from ..db import (
+    copy_dsm2_data,
+    delete_scenario_data,
+    get_scenario_id,
+    make_conn_string,
+)
+from ..post_process import calc_scenario_velocity, calc_velocity_streaks
+from ..readers.dss import iter_dss, make_dss_regex_from_parts
+from ..readers.scenario import (
+    HYDRO_STATION_NAMES,
+    SDG_ELEVATION_LIST,
+    SDG_FLOW_LIST,
+    SDG_GATE_OP_LIST,
+    read_echo_settings,
+)
+from ..validation import ValidationReport, validate_frames
+
+# marks the end of the frames a stage puts on a queue
+_DONE = object()
+
+# markers a reader process sends after its last series or when it failed, in place
+# of the frame name
+_READ_DONE = "__read_done__"
+_READ_ERROR = "__read_error__"
+
+# frame name -> (file, B parts, C part) of the series loaded for a scenario
+SCENARIO_FRAMES = {
+    "wl_compliance": ("hydro", HYDRO_STATION_NAMES, "STAGE"),
+    "sdg_stage": ("sdg", SDG_ELEVATION_LIST, "STAGE"),
+    "sdg_flow": ("sdg", SDG_FLOW_LIST, "DEVICE-FLOW"),
+    "sdg_gate_ops": ("sdg", SDG_GATE_OP_LIST, "ELEV"),
+}
+
+
+class ScenarioPipelineError(Exception):
+    pass
+
+
+def _drain(q: queue.Queue, n_done: int):
+    """
+    Keep taking items off a queue until `n_done` end markers have been seen, used after a
+    failure so upstream stages never block on a full queue.
+    """
+    while n_done > 0:
+        if q.get() is _DONE:
+            n_done -= 1
+
+
+def _read_file(path: str, frames: Dict[str, str], chunk_years: Optional[int], out_q):
+    """
+    Reader process: put (frame name, chunk) on `out_q` for every chunk of every series
+    of `path` matching the parts regex of each frame, then _READ_DONE.
+    """
+    try:
+        for name, parts_regex in frames.items():
+            for df in iter_dss(path, parts_regex, chunk_years=chunk_years):
+                out_q.put((name, df))
+    except Exception as e:
+        # the exception may not pickle, send its message
+        out_q.put((_READ_ERROR, f"reading {path}: {type(e).__name__}: {e}"))
+    finally:
+        out_q.put((_READ_DONE, None))
+
+
+def _process_stage(
+    process_q: queue.Queue,
+    load_q: queue.Queue,
+    echo_config: Dict,
+    errors: List[Exception],
+):
+    """
+    Collect the flow and stage series until _DONE, then compute velocity and
+    velocity streaks for the loader.
+    """
+    series: Dict[str, List[pd.DataFrame]] = {"sdg_flow": [], "sdg_stage": []}
+    done = False
+    try:
+        while not done:
+            item = process_q.get()
+            if item is _DONE:
+                done = True
+                continue
+            name, df = item
+            series[name].append(df)
+        if not errors and all(series.values()):
+            velocity = calc_scenario_velocity(
+                pd.concat(series["sdg_flow"], ignore_index=True),
+                pd.concat(series["sdg_stage"], ignore_index=True),
+                echo_config,
+            )
+            load_q.put(("velocity", velocity))
+            load_q.put(("velocity-streak", calc_velocity_streaks(velocity)))
+    except Exception as e:
+        errors.append(e)
+        _drain(process_q, 0 if done else 1)
+    finally:
+        load_q.put(_DONE)
+
+
+def _load_stage(
+    cur,
+    scenario_id: int,
+    load_q: queue.Queue,
+    n_producers: int,
+    loaded: Dict[str, int],
+    errors: List[Exception],
+    on_load: Optional[Callable[[str, int], None]],
+):
+    try:
+        while n_producers > 0:
+            item = load_q.get()
+            if item is _DONE:
+                n_producers -= 1
+                continue
+            if errors:
+                # another stage failed, the transaction will be rolled back
+                continue
+            name, df = item
+            rows = copy_dsm2_data(cur, df, scenario_id)
+            loaded[name] = loaded.get(name, 0) + rows
+            if on_load is not None:
+                on_load(name, rows)
+    except Exception as e:
+        errors.append(e)
+        _drain(load_q, n_producers)
+
+
+def run_scenario(
+    scenario_name: str,
+    sdg_path: str,
+    hydro_path: str,
+    echo_path: str,
+    conn_creds: dict | str,
+    queue_size: int = 4,
+    on_load: Optional[Callable[[str, int], None]] = None,
+    validate: bool = True,
+    quarantine_path: Optional[str] = None,
+    on_validate: Optional[Callable[[str, ValidationReport], None]] = None,
+    replace: bool = False,
+    chunk_years: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Read a scenario from model output, post-process it and load it into the database.
+
+    All data for the scenario is loaded in a single transaction, nothing is committed if
+    any stage fails. The files are read one series at a time (one `chunk_years` window
+    at a time with `chunk_years`) and every chunk is validated (see
+    `sdgtools.validation`) as soon as it is read, before it is loaded, so the COPY of a
+    chunk overlaps the reading of the next and bad data fails the load early.
+
+    Parameters:
+    - scenario_name (str): name of the scenario in the scenarios table.
+    - sdg_path (str): path to the SDG dss file.
+    - hydro_path (str): path to the hydro dss file.
+    - echo_path (str): path to the hydro echo file.
+    - conn_creds (dict or str): database connection string or credentials.
+    - queue_size (int): maximum number of chunks waiting between two stages.
+    - on_load (callable or None): called with (frame name, row count) after the COPY
+      of each chunk.
+    - validate (bool): validate the frames before they are loaded.
+    - quarantine_path (str or None): instead of failing on bad rows, load the rest and
+      write the bad rows to this CSV file.
+    - on_validate (callable or None): called with (frame name, report) for every
+      chunk that passed validation.
+    - replace (bool): delete the rows already loaded for the scenario in the same
+      transaction, so loading a scenario again does not duplicate it.
+    - chunk_years (int or None): read the series this many years at a time, by default
+      each series is read whole.
+
+    Returns:
+    - dict: rows loaded per frame name (see SCENARIO_FRAMES), velocity and
+      velocity-streak.
+    """
+    # the echo file is small and needed by post-processing, read it first to fail fast
+    echo_config = read_echo_settings(echo_path)
+
+    paths = {"sdg": sdg_path, "hydro": hydro_path}
+    read_q = multiprocessing.Queue(maxsize=queue_size)
+    # readers are started before any thread or connection exists in this process
+    readers = [
+        multiprocessing.Process(
+            target=_read_file,
+            args=(
+                path,
+                {
+                    name: make_dss_regex_from_parts(B=b_parts, C=c_part)
+                    for name, (file, b_parts, c_part) in SCENARIO_FRAMES.items()
+                    if file == kind
+                },
+                chunk_years,
+                read_q,
+            ),
+            name=f"read-{kind}",
+            daemon=True,
+        )
+        for kind, path in paths.items()
+    ]
+    for reader in readers:
+        reader.start()
+
+    load_q = queue.Queue(maxsize=queue_size)
+    process_q = queue.Queue(maxsize=queue_size)
+    loaded: Dict[str, int] = {}
+    errors: List[Exception] = []
+    quarantined: List[pd.DataFrame] = []
+
+    try:
+        conn = psycopg2.connect(make_conn_string(conn_creds))
+    except Exception:
+        for reader in readers:
+            reader.terminate()
+        raise
+    try:
+        # commits on success, rolls back on error
+        with conn:
+            with conn.cursor() as cur:
+                scenario_id = get_scenario_id(cur, scenario_name)
+                if replace:
+                    delete_scenario_data(cur, scenario_id)
+
+                # the reader (this thread) and the process stage both feed the loader
+                loader = threading.Thread(
+                    target=_load_stage,
+                    args=(cur, scenario_id, load_q, 2, loaded, errors, on_load),
+                )
+                processor = threading.Thread(
+                    target=_process_stage,
+                    args=(process_q, load_q, echo_config, errors),
+                )
+                loader.start()
+                processor.start()
+
+                try:
+                    reading = len(readers)
+                    while reading and not errors:
+                        name, df = read_q.get()
+                        if name == _READ_DONE:
+                            reading -= 1
+                            continue
+                        if name == _READ_ERROR:
+                            raise RuntimeError(df)
+                        if validate:
+                            frames, bad, reports = validate_frames(
+                                {name: df}, echo_config, quarantine_path is not None
+                            )
+                            df = frames[name]
+                            quarantined.extend(bad)
+                            if on_validate is not None:
+                                on_validate(name, reports[name])
+                        if name in ("sdg_flow", "sdg_stage"):
+                            process_q.put((name, df))
+                        load_q.put((name, df))
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    process_q.put(_DONE)
+                    load_q.put(_DONE)
+                    processor.join()
+                    loader.join()
+
+                if errors:
+                    raise ScenarioPipelineError(
+                        f"failed to load scenario '{scenario_name}': {errors[0]}"
+                    ) from errors[0]
+
+                if quarantined:
+                    pd.concat(quarantined, ignore_index=True).to_csv(
+                        quarantine_path, index=False
+                    )
+    finally:
+        conn.close()
+        for reader in readers:
+            # a reader still running is only left after a failure
+            reader.terminate()
+            reader.join()
+
+    return loaded
@@ -0,0 +1,320 @@
+"""
+Local analytical query service.
+
+A small asyncio HTTP server answering scenario/node/param/window queries and the
+`calc_avg_*` metrics from any store in `sdgtools.db.stores`. Store queries and
+post-processing run in a thread pool so the event loop keeps serving other clients,
+identical requests that arrive while one is running share its result, and decoded
+series and computed metrics are kept in an LRU cache bounded by size.
+
+Endpoints (all GET, JSON responses):
+
+- /scenarios
+- /series?scenario=&node=[&param=][&start=][&end=]
+- /metrics
+- /metrics/<name>?scenario=&gate=[&start=][&end=]
+- /cache
+"""
+
+import asyncio
+import json
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from ..db.stores import SeriesStore
+from ..post_process import METRICS, gate_model_data, post_process_full_data
+from ..post_process.data_config import gatef
+
+HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Server Error"}
+
+_MISSING = object()
+
+
+class QueryError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _size_of(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    LRU cache bounded by the total size in bytes of the values it holds.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+        self.misses += 1
+        return _MISSING
+
+    def put(self, key, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _window(df: pd.DataFrame, start: Optional[str], end: Optional[str]):
+    if start is None and end is None:
+        return df
+    keep = pd.Series(True, index=df.index)
+    if start is not None:
+        keep &= df["datetime"] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= df["datetime"] <= pd.Timestamp(end)
+    return df[keep]
+
+
+class QueryService:
+    """
+    Cached queries over a store, the HTTP handler is a thin layer over these methods.
+    """
+
+    def __init__(
+        self,
+        store: SeriesStore,
+        cache_bytes: int = 256 * 1024**2,
+        max_workers: Optional[int] = None,
+    ):
+        self.store = store
+        self.cache = ResultCache(cache_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+
+    async def _cached(self, key: Tuple, func, *args):
+        value = self.cache.get(key)
+        if value is not _MISSING:
+            return value
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, func, *args)
+        self._inflight[key] = future
+        try:
+            value = await future
+        finally:
+            del self._inflight[key]
+        self.cache.put(key, value)
+        return value
+
+    async def scenarios(self):
+        return await self._cached(("scenarios",), self.store.scenarios)
+
+    async def series(
+        self,
+        scenario: str,
+        node: str,
+        param: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> pd.DataFrame:
+        # the whole series is cached so any window of it is served from memory
+        full = await self._cached(
+            ("series", scenario, node, param), self.store.query, scenario, node, param
+        )
+        return _window(full, start, end)
+
+    async def gate_series(
+        self, scenario: str, node: str, start: Optional[str], end: Optional[str]
+    ) -> pd.DataFrame:
+        """
+        Series of a gate node stored lower case (`read_dss`) or with the upper case
+        DSS B part (`sdgtools dss`).
+        """
+        df = await self.series(scenario, node.lower(), None, start, end)
+        if len(df) == 0:
+            df = await self.series(scenario, node.upper(), None, start, end)
+        return df
+
+    async def post_processed(
+        self, scenario: str, gate: str, start: Optional[str], end: Optional[str]
+    ) -> pd.DataFrame:
+        if gate not in gatef["ID"]:
+            raise QueryError(
+                f"unknown gate '{gate}', expected one of {', '.join(gatef['ID'])}"
+            )
+        i = gatef["ID"].index(gate)
+        flow, stage, gate_ops = await asyncio.gather(
+            self.gate_series(scenario, gatef["flow_op"][i], start, end),
+            self.gate_series(scenario, gatef["gate_status"][i], start, end),
+            self.gate_series(scenario, f"{gate}_GATEOP", start, end),
+        )
+        for name, df in [("flow", flow), ("stage", stage), ("gate op", gate_ops)]:
+            if len(df) == 0:
+                raise QueryError(f"no {name} data for gate {gate} in '{scenario}'", 404)
+
+        def compute():
+            model_data = gate_model_data(flow, stage, gate_ops, gate, scenario)
+            return post_process_full_data(model_data, gate)
+
+        return await self._cached(("post", scenario, gate, start, end), compute)
+
+    async def metric(
+        self,
+        name: str,
+        scenario: str,
+        gate: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> pd.DataFrame:
+        if name not in METRICS:
+            raise QueryError(f"unknown metric '{name}'", 404)
+        key = ("metric", name, scenario, gate, start, end)
+        value = self.cache.get(key)
+        if value is not _MISSING:
+            return value
+        data = await self.post_processed(scenario, gate, start, end)
+        return await self._cached(key, METRICS[name], data)
+
+    async def route(self, path: str, params: Dict[str, str]):
+        def required(*names):
+            missing = [n for n in names if not params.get(n)]
+            if missing:
+                raise QueryError(f"missing query parameter: {', '.join(missing)}")
+            return [params[n] for n in names]
+
+        parts = [p for p in path.split("/") if p]
+        if parts == ["scenarios"]:
+            return await self.scenarios()
+        if parts == ["series"]:
+            scenario, node = required("scenario", "node")
+            return await self.series(
+                scenario,
+                node,
+                params.get("param"),
+                params.get("start"),
+                params.get("end"),
+            )
+        if parts == ["metrics"]:
+            return list(METRICS)
+        if len(parts) == 2 and parts[0] == "metrics":
+            scenario, gate = required("scenario", "gate")
+            return await self.metric(
+                parts[1], scenario, gate, params.get("start"), params.get("end")
+            )
+        if parts == ["cache"]:
+            return self.cache.stats()
+        raise QueryError(f"not found: {path}", 404)
+
+    async def respond(self, target: str) -> Tuple[int, bytes]:
+        url = urlsplit(target)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            result = await self.route(url.path, params)
+        except QueryError as e:
+            return e.status, json.dumps({"error": str(e)}).encode()
+        except Exception as e:
+            return 500, json.dumps({"error": str(e)}).encode()
+
+        if isinstance(result, pd.DataFrame):
+            loop = asyncio.get_running_loop()
+            body = await loop.run_in_executor(
+                self.executor,
+                lambda: result.to_json(orient="records", date_format="iso"),
+            )
+            return 200, body.encode()
+        return 200, json.dumps(result).encode()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                if int(headers.get("content-length", 0)):
+                    await reader.readexactly(int(headers["content-length"]))
+
+                if method != "GET":
+                    status, body = 400, b'{"error": "only GET is supported"}'
+                else:
+                    status, body = await self.respond(target)
+
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(body)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                        "\r\n"
+                    ).encode("latin-1")
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def serve(
+    store: SeriesStore,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    cache_bytes: int = 256 * 1024**2,
+    max_workers: Optional[int] = None,
+):
+    """
+    Run the query service until interrupted.
+    """
+
+    async def main():
+        server = await QueryService(store, cache_bytes, max_workers).start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
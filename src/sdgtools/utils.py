@@ -1,3 +1,7 @@
+import pandas as pd
+import numpy as np
+
+
 def concat_columns(df):
     columns = ["A", "B", "C", "F", "E", "D"]
     return df[columns].astype(str).agg("/".join, axis=1)
@@ -12,3 +16,158 @@ def add_node_and_param_cols(df):
     df_copy["param"] = dss_parts[3]
     df_copy = df_copy.rename(columns={col_to_sep: "value"})
     return df_copy
+
+
+COMPACT_CATEGORY_COLUMNS = [
+    "node",
+    "param",
+    "unit",
+    "gate_status",
+    "Velocity_Category",
+    "gate",
+    "model",
+    "scenario",
+]
+
+# only the measured values are downcast, float32 keeps about 7 significant digits which
+# is plenty for stage, flow and velocity but not for e.g. hours since an epoch
+COMPACT_FLOAT_COLUMNS = ["value"]
+
+
+class CategoryDictionary:
+    """
+    Shared categories for the repeated string columns of long format frames.
+
+    Categories are only ever appended to, so the codes of frames encoded earlier stay
+    valid and frames from different scenarios can be put on the same categories with
+    `harmonize` before they are concatenated.
+
+    A dictionary lives in one process. Frames encoded in reader processes each have
+    their own categories, `harmonize` (or `concat_compact`) adds them to this dictionary
+    in the process that combines the frames.
+    """
+
+    def __init__(self):
+        self.categories = {}
+
+    def dtype(self, column: str) -> pd.CategoricalDtype:
+        return pd.CategoricalDtype(self.categories.get(column, []))
+
+    def encode(self, values: pd.Series, column: str) -> pd.Series:
+        cats = self.categories.setdefault(column, [])
+        known = set(cats)
+        cats.extend(v for v in pd.unique(values.dropna()) if v not in known)
+        return pd.Series(
+            pd.Categorical(values, categories=cats),
+            index=values.index,
+            name=values.name,
+        )
+
+    def harmonize(self, frames):
+        """
+        Put the categorical columns of every frame on the full set of categories of all
+        the frames and those seen so far.
+        """
+        frames = list(frames)
+        for df in frames:
+            for col in df.columns:
+                if isinstance(df[col].dtype, pd.CategoricalDtype):
+                    self.encode(pd.Series(df[col].cat.categories), col)
+        out = []
+        for df in frames:
+            df = df.copy(deep=False)
+            for col in self.categories:
+                if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                    df[col] = df[col].cat.set_categories(self.categories[col])
+            out.append(df)
+        return out
+
+
+def compact_frame(
+    df: pd.DataFrame,
+    categories: CategoryDictionary | None = None,
+    float_dtype: str = "float32",
+) -> pd.DataFrame:
+    """
+    Return a copy of a frame with its repeated string columns as categoricals (see
+    COMPACT_CATEGORY_COLUMNS) and its value column downcast to `float_dtype`, other
+    float columns are left as they are. Datetime columns are left as datetime64, which
+    are int64 epoch values already.
+
+    The categories are added to `categories`, pass the same dictionary to encode
+    several frames alike. Without one the frame gets its own categories.
+    """
+    categories = CategoryDictionary() if categories is None else categories
+    df = df.copy(deep=False)
+    for col in COMPACT_CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = categories.encode(df[col], col)
+    for col in COMPACT_FLOAT_COLUMNS:
+        if col in df.columns and pd.api.types.is_float_dtype(df[col].dtype):
+            df[col] = df[col].astype(float_dtype)
+    return df
+
+
+def concat_compact(
+    frames, categories: CategoryDictionary | None = None
+) -> pd.DataFrame:
+    """
+    Concatenate compact frames, e.g. from several scenarios or reader processes,
+    keeping the categoricals.
+    """
+    categories = CategoryDictionary() if categories is None else categories
+    return pd.concat(categories.harmonize(frames), ignore_index=True)
+
+
+WIDE_COLUMN_LEVELS = ["pathname", "node", "param", "unit"]
+
+
+def make_wide_frame(
+    data,
+    units,
+    lower: bool = True,
+    float_dtype: str = "float64",
+) -> pd.DataFrame:
+    """
+    Combine single column dss frames (as returned by pyhecdss) into one wide frame with a
+    shared DatetimeIndex and one column per pathname. The columns are a MultiIndex of
+    pathname, node, param and unit so the metadata is held once per column.
+
+    Parameters:
+    - data (list): DataFrames with one column named by the pathname.
+    - units (list): unit of each frame.
+    - lower (bool): lower case node and param, as `read_dss` does.
+    - float_dtype (str): dtype of the values.
+    """
+    indexes = []
+    for df in data:
+        index = df.index
+        if isinstance(index, pd.PeriodIndex):
+            index = index.to_timestamp()
+        indexes.append(pd.DatetimeIndex(index))
+
+    shared = indexes[0]
+    if not all(shared.equals(ix) for ix in indexes[1:]):
+        for ix in indexes[1:]:
+            shared = shared.union(ix)
+
+    values = np.full((len(shared), len(data)), np.nan, dtype=float_dtype)
+    columns = []
+    for i, (df, index, unit) in enumerate(zip(data, indexes, units)):
+        col = df.iloc[:, 0].to_numpy()
+        if shared.equals(index):
+            values[:, i] = col
+        else:
+            values[shared.get_indexer(index), i] = col
+        pathname = df.columns[0]
+        parts = pathname.split("/")
+        node, param = parts[2], parts[3]
+        if lower:
+            node, param = node.lower(), param.lower()
+        columns.append((pathname, node, param, unit))
+
+    return pd.DataFrame(
+        values,
+        index=shared.rename("datetime"),
+        columns=pd.MultiIndex.from_tuples(columns, names=WIDE_COLUMN_LEVELS),
+    )
@@ -0,0 +1,280 @@
+"""
+Pre-load validation of long format (datetime, node, param, value, unit) frames.
+
+All checks run on the column arrays (factorized codes, int64 timestamps and a single
+sort by series and time), so millions of rows are checked in about a second and a
+bad export fails before any COPY starts instead of rolling back a half loaded scenario.
+
+Checks with severity "error" mark rows that would fail the load or corrupt the
+post-processing, these rows can be quarantined with `ValidationReport.split`.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .post_process import ECHO_GATE_IDS
+from .post_process.data_config import gatef
+from .readers.dss import PARAM_TO_UNIT
+
+CHECKS = {
+    "missing_datetime": "error",
+    "non_finite_value": "error",
+    "unit_missing": "error",
+    "unit_mismatch": "error",
+    "duplicate": "error",
+    "stage_below_bottom": "error",
+    "missing_value": "warning",
+    "gap": "warning",
+}
+
+NAT = np.iinfo("i8").min
+
+# gate operation series (C part ELEV) hold operation codes and are read without a unit
+UNITLESS_PARAMS = {"elev"}
+
+
+class ValidationError(Exception):
+    def __init__(self, message: str, report: "ValidationReport"):
+        super().__init__(message)
+        self.report = report
+
+
+@dataclass
+class ValidationReport:
+    """
+    Result of `validate_long`.
+
+    `issues` has one row per check and series (node/param) with the number of rows
+    flagged and the first datetime flagged. `bad` is True for the rows failing an error
+    check and `failed_check` the name of the first error check each bad row failed.
+    """
+
+    rows: int
+    issues: DataFrame
+    bad: np.ndarray
+    failed_check: np.ndarray
+
+    @property
+    def ok(self) -> bool:
+        return not self.bad.any()
+
+    @property
+    def n_bad(self) -> int:
+        return int(self.bad.sum())
+
+    def summary(self, name: str = "data") -> str:
+        """
+        Compact text report, one line per check and series.
+        """
+        n_errors = (self.issues["severity"] == "error").sum()
+        n_warnings = len(self.issues) - n_errors
+        lines = [
+            f"{name}: {self.rows} rows, {self.n_bad} bad, "
+            f"{n_errors} errors, {n_warnings} warnings"
+        ]
+        for r in self.issues.itertuples(index=False):
+            lines.append(
+                f"  {r.severity:<8}{r.check:<20}{r.node}/{r.param}: {r.rows} rows, "
+                f"first at {r.first_datetime}"
+            )
+        return "\n".join(lines)
+
+    def split(self, data: DataFrame) -> Tuple[DataFrame, DataFrame]:
+        """
+        Split `data` (the frame that was validated) into the rows passing every error
+        check and the quarantined rows, the latter with the failed check in `check`.
+        """
+        checks = np.asarray(list(CHECKS), dtype=object)
+        quarantined = data[self.bad].assign(check=checks[self.failed_check[self.bad]])
+        return data[~self.bad], quarantined
+
+
+def _gate_bottoms(echo_config: Optional[Dict]) -> Dict[str, float]:
+    """
+    Bottom elevation of each gate keyed by the lower case upstream stage node.
+    """
+    settings = {ECHO_GATE_IDS[k]: v for k, v in (echo_config or {}).items()}
+    bottoms = {}
+    for i, gate_id in enumerate(gatef["ID"]):
+        bottom = gatef["bottom_elev"][i]
+        if gate_id in settings:
+            bottom = float(settings[gate_id].bottom_elevation)
+        bottoms[gatef["gate_status"][i].lower()] = bottom
+    return bottoms
+
+
+def _group_mode(group: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Most common value in each group (smallest on ties), 0 for groups without values.
+    """
+    codes, uniques = pd.factorize(values, sort=True)
+    mode = np.zeros(n_groups, dtype="i8")
+    if len(uniques) == 0:
+        return mode
+    if n_groups * len(uniques) <= 10_000_000:
+        # regular series have only a handful of distinct steps, count them in a table
+        counts = np.bincount(
+            group * len(uniques) + codes, minlength=n_groups * len(uniques)
+        ).reshape(n_groups, len(uniques))
+        has_values = counts.any(axis=1)
+        mode[has_values] = uniques[counts.argmax(axis=1)[has_values]]
+        return mode
+    order = np.lexsort((codes, group))
+    g, c = group[order], codes[order]
+    starts = np.flatnonzero(np.r_[True, (g[1:] != g[:-1]) | (c[1:] != c[:-1])])
+    run_group, run_code = g[starts], c[starts]
+    run_count = np.diff(np.r_[starts, len(g)])
+    best = np.lexsort((run_code, -run_count, run_group))
+    first = best[np.r_[True, run_group[best][1:] != run_group[best][:-1]]]
+    mode[run_group[first]] = uniques[run_code[first]]
+    return mode
+
+
+def validate_long(
+    data: DataFrame,
+    echo_config: Optional[Dict] = None,
+    param_units: Dict[str, str] = PARAM_TO_UNIT,
+    unitless_params: Iterable[str] = UNITLESS_PARAMS,
+) -> ValidationReport:
+    """
+    Check a long format frame before it is loaded.
+
+    - missing_datetime: datetime is missing or can not be parsed.
+    - non_finite_value: value is +/-inf.
+    - unit_missing: unit is empty, e.g. the param is missing from PARAM_TO_UNIT, except
+      for the params in UNITLESS_PARAMS.
+    - unit_mismatch: unit differs from the one PARAM_TO_UNIT gives for the param.
+    - duplicate: repeated datetime within a node/param series.
+    - stage_below_bottom: gate stage at or below the gate bottom elevation, velocity
+      would divide by zero or go negative.
+    - missing_value (warning): value is NaN.
+    - gap (warning): step to the previous value is longer than the usual step of the
+      series, flagged on the first value after the gap.
+
+    Parameters:
+    - data (DataFrame): long format data.
+    - echo_config (dict or None): Gate settings from the echo file, override the
+      bottom elevations in gatef.
+    - param_units (dict): expected unit of each param.
+    - unitless_params (iterable): params that have no unit, e.g. gate operations.
+
+    Returns:
+    - ValidationReport
+    """
+    n = len(data)
+    t = (
+        pd.to_datetime(data["datetime"], errors="coerce")
+        .to_numpy(dtype="datetime64[ns]")
+        .view("i8")
+    )
+    values = pd.to_numeric(data["value"], errors="coerce").to_numpy(dtype=float)
+    group = (
+        data.groupby(["node", "param"], sort=False, dropna=False, observed=True)
+        .ngroup()
+        .to_numpy()
+    )
+    n_groups = group.max() + 1 if n else 0
+
+    masks = {name: np.zeros(n, dtype=bool) for name in CHECKS}
+    masks["missing_datetime"] = t == NAT
+    masks["non_finite_value"] = np.isinf(values)
+    masks["missing_value"] = np.isnan(values)
+
+    # units are checked on the (param, unit) pairs, not on every row
+    param_codes, params = pd.factorize(data["param"], use_na_sentinel=False)
+    unit_codes, units = pd.factorize(data["unit"])
+    unit_ok = np.ones((len(params), len(units) + 1), dtype=bool)
+    for i, param in enumerate(params):
+        expected = param_units.get(param)
+        for j, unit in enumerate(units):
+            unit_ok[i, j] = expected is None or str(unit) == expected
+    # dtype is given so a frame without any unit still indexes with an empty bool array
+    empty = np.array([str(u).strip() == "" for u in units] + [True], dtype=bool)
+    unitless = {str(p).lower() for p in unitless_params}
+    has_unit = np.array([str(p).lower() not in unitless for p in params], dtype=bool)
+    masks["unit_missing"] = empty[unit_codes] & has_unit[param_codes]
+    masks["unit_mismatch"] = ~unit_ok[param_codes, unit_codes] & ~empty[unit_codes]
+
+    node_codes, nodes = pd.factorize(data["node"])
+    bottoms = _gate_bottoms(echo_config)
+    bottom = np.r_[[bottoms.get(str(node).lower(), np.nan) for node in nodes], np.nan]
+    masks["stage_below_bottom"] = values <= bottom[node_codes]
+
+    # duplicates and gaps on the rows sorted by series and time
+    order = np.lexsort((t, group))
+    g, ts = group[order], t[order]
+    same = np.r_[False, g[1:] == g[:-1]] & (ts != NAT) & np.r_[False, ts[:-1] != NAT]
+    step = np.r_[0, np.diff(ts)]
+    masks["duplicate"][order] = same & (step == 0)
+    positive = same & (step > 0)
+    usual = _group_mode(g[positive], step[positive], n_groups)
+    masks["gap"][order] = positive & (step > usual[g])
+
+    failed_check = np.full(n, -1)
+    issues = []
+    _, first_row = np.unique(group, return_index=True)
+    for k, (name, severity) in enumerate(CHECKS.items()):
+        mask = masks[name]
+        if not mask.any():
+            continue
+        if severity == "error":
+            failed_check[mask & (failed_check < 0)] = k
+        flagged = pd.DataFrame({"group": group[mask], "t": t[mask]})
+        flagged["t"] = flagged["t"].where(flagged["t"] != NAT)
+        per_series = flagged.groupby("group").agg(
+            rows=("t", "size"), first=("t", "min")
+        )
+        series = data.iloc[first_row[per_series.index]]
+        issues.append(
+            DataFrame(
+                {
+                    "check": name,
+                    "severity": severity,
+                    "node": series["node"].to_numpy(),
+                    "param": series["param"].to_numpy(),
+                    "rows": per_series["rows"].to_numpy(),
+                    "first_datetime": pd.to_datetime(per_series["first"].to_numpy()),
+                }
+            )
+        )
+
+    columns = ["check", "severity", "node", "param", "rows", "first_datetime"]
+    issues = (
+        pd.concat(issues, ignore_index=True) if issues else DataFrame(columns=columns)
+    )
+    return ValidationReport(n, issues, failed_check >= 0, failed_check)
+
+
+def validate_frames(
+    frames: Dict[str, DataFrame],
+    echo_config: Optional[Dict] = None,
+    quarantine: bool = False,
+) -> Tuple[Dict[str, DataFrame], List[DataFrame], Dict[str, ValidationReport]]:
+    """
+    Validate several named frames, e.g. the frames of a scenario.
+
+    Parameters:
+    - frames (dict): name -> long format frame.
+    - echo_config (dict or None): Gate settings from the echo file.
+    - quarantine (bool): drop bad rows instead of raising ValidationError.
+
+    Returns:
+    - tuple: (frames with bad rows removed, quarantined rows with a frame column,
+      reports by frame name).
+    """
+    clean, quarantined, reports = {}, [], {}
+    for name, df in frames.items():
+        report = validate_long(df, echo_config)
+        reports[name] = report
+        if report.ok:
+            clean[name] = df
+        elif quarantine:
+            clean[name], bad = report.split(df)
+            quarantined.append(bad.assign(frame=name))
+        else:
+            raise ValidationError(report.summary(name), report)
+    return clean, quarantined, reports
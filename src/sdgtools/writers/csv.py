@@ -0,0 +1,248 @@
+"""
+Chunked and compressed CSV output.
+
+Frames are cut into chunks of rows and a thread pool serializes each chunk to CSV and
+compresses it (gzip or zstd) while the caller goes on reading or computing the next
+frame, the chunks are written to the file in order. Every chunk is a complete gzip
+member or zstd frame, and concatenated members/frames are a valid file for gzip, zstd,
+pandas, DuckDB and `open_csv`.
+
+On the reading side `open_csv` recognizes compressed files by their first bytes and
+decompresses them as they are read, so nothing is unpacked to disk first.
+
+zstd needs the optional `zstandard` package, install it with `pip install zstandard`.
+"""
+
+import gzip
+import os
+import queue
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+import pandas as pd
+from pandas import DataFrame
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compression -> file name suffix
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+# fast levels, most of the size reduction of CSV comes at the lowest levels
+DEFAULT_LEVELS = {"gzip": 1, "zstd": 3}
+DEFAULT_CHUNK_ROWS = 250_000
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError(
+            "zstd compression needs zstandard installed: pip install zstandard"
+        )
+
+
+def compressed_path(path: str, compress: Optional[str]) -> str:
+    """
+    `path` with the suffix of `compress` (.gz or .zst) added when it is missing.
+    """
+    if compress is None:
+        return path
+    suffix = COMPRESSIONS[compress]
+    return path if path.lower().endswith(suffix) else path + suffix
+
+
+def _compressor(compress: Optional[str], level: Optional[int]) -> Callable:
+    if compress is None:
+        return lambda data: data
+    if compress not in COMPRESSIONS:
+        raise ValueError(
+            f"unknown compression {compress}, expected one of {', '.join(COMPRESSIONS)}"
+        )
+    level = DEFAULT_LEVELS[compress] if level is None else level
+    if compress == "gzip":
+
+        def gzip_member(data: bytes) -> bytes:
+            # wbits 31 writes the gzip header and trailer, zlib releases the GIL
+            c = zlib.compressobj(level, zlib.DEFLATED, 31)
+            return c.compress(data) + c.flush()
+
+        return gzip_member
+
+    _require_zstandard()
+    # a ZstdCompressor is not thread safe, each chunk gets its own
+    return lambda data: zstandard.ZstdCompressor(level=level).compress(data)
+
+
+class CSVWriter:
+    """
+    CSV file written in chunks of `chunk_rows` rows, each serialized and compressed by
+    a pool of `threads` threads. At most two chunks per thread are in flight, so a fast
+    producer does not hold the whole output in memory. Frames passed to `write` must
+    not be modified afterwards.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compress: Optional[str] = None,
+        level: Optional[int] = None,
+        threads: Optional[int] = None,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        **to_csv_kwargs,
+    ):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._compress = _compressor(compress, level)
+        self._header = to_csv_kwargs.pop("header", True)
+        self._to_csv_kwargs = {"index": False, **to_csv_kwargs}
+        threads = threads or min(8, os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="csv-writer")
+        self._pending = deque()
+        self._max_pending = 2 * threads
+        self._file = open(path, "wb")
+
+    def _encode(self, chunk: DataFrame, header) -> bytes:
+        text = chunk.to_csv(header=header, **self._to_csv_kwargs)
+        return self._compress(text.encode())
+
+    def _submit(self, chunk: DataFrame):
+        self._pending.append(self._pool.submit(self._encode, chunk, self._header))
+        self._header = False
+        while len(self._pending) > self._max_pending:
+            self._file.write(self._pending.popleft().result())
+
+    def write(self, df: DataFrame) -> "CSVWriter":
+        if len(df) == 0:
+            # an empty first frame still writes the header
+            if self._header is not False:
+                self._submit(df)
+            return self
+        for start in range(0, len(df), self.chunk_rows):
+            chunk = df.iloc[start : start + self.chunk_rows]
+            self._submit(chunk)
+            self.rows += len(chunk)
+        return self
+
+    def close(self):
+        try:
+            while self._pending:
+                self._file.write(self._pending.popleft().result())
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+            self._file.close()
+
+    def __enter__(self) -> "CSVWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_csv(
+    df: DataFrame,
+    path: str,
+    compress: Optional[str] = None,
+    threads: Optional[int] = None,
+    **to_csv_kwargs,
+) -> str:
+    """
+    Write a frame to CSV, with `compress` ("gzip" or "zstd") in compressed chunks on a
+    thread pool (see `CSVWriter`) and the suffix added to `path`.
+
+    Parameters:
+    - df (DataFrame): data to write.
+    - path (str): output file.
+    - compress (str or None): "gzip", "zstd" or None for plain `DataFrame.to_csv`.
+    - threads (int or None): compression threads, defaults to the number of CPUs (up
+      to 8).
+    - to_csv_kwargs: passed to `DataFrame.to_csv`, index defaults to False.
+
+    Returns:
+    - str: the path written.
+    """
+    if compress is None:
+        df.to_csv(path, **{"index": False, **to_csv_kwargs})
+        return path
+    path = compressed_path(path, compress)
+    with CSVWriter(path, compress, threads=threads, **to_csv_kwargs) as writer:
+        writer.write(df)
+    return path
+
+
+def open_csv(path: str) -> BinaryIO:
+    """
+    Open a (possibly compressed) CSV file for reading in binary mode. gzip and zstd
+    files are recognized by their first bytes, whatever their name, and decompressed
+    as they are read.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, "rb")
+    if magic == ZSTD_MAGIC:
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+    return open(path, "rb")
+
+
+def prefetch(items: Iterable, depth: int = 2) -> Iterator:
+    """
+    Yield from `items` while a background thread produces up to `depth` items ahead,
+    e.g. to parse the next chunk of a file while the current one is loaded.
+    """
+    done = object()
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((done, e))
+            return
+        put((done, None))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def read_csv_chunks(
+    path: str, chunksize: int = 1_000_000, **read_csv_kwargs
+) -> Iterator[DataFrame]:
+    """
+    Read a (possibly compressed, see `open_csv`) CSV file in chunks of `chunksize`
+    rows, the next chunk is decompressed and parsed in the background while the
+    current one is used.
+    """
+    with open_csv(path) as f:
+        yield from prefetch(pd.read_csv(f, chunksize=chunksize, **read_csv_kwargs))
@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from pyhecdss import DSSFile
+
+from ..post_process.buckets import time_step_hours
+
+# value heclib reads as missing
+HEC_MISSING = -901.0
+
+# post processed column -> (C part, units, type) of the series written for it
+POST_PROCESSED_SERIES = {
+    "value": ("VELOCITY", "FT/S", "INST-VAL"),
+    "streak_duration": ("VEL-STREAK", "HOURS", "INST-VAL"),
+    "gate_status": ("GATE-STATUS", "CLOSED=1", "INST-VAL"),
+    "gate_streak_duration": ("GATE-STREAK", "HOURS", "INST-VAL"),
+}
+
+
+@dataclass
+class DSSSeries:
+    pathname: str
+    values: pd.Series
+    units: str
+    type: str
+
+
+def make_pathname(A: str, B: str, C: str, F: str, D: str = "", E: str = "") -> str:
+    """
+    DSS pathname from its parts, the E part is set from the series frequency by
+    `DSSFile.write_rts` when left empty.
+    """
+    return f"/{A}/{B}/{C}/{D}/{E}/{F}/".upper()
+
+
+def regular_series(datetimes, values, interval: Optional[str] = None) -> pd.Series:
+    """
+    Values on a regular DatetimeIndex (with freq set) from the first to the last
+    timestamp, the step is the most common step of the data and timesteps without a
+    value are HEC_MISSING.
+
+    A series with a single timestamp has no step, give it as the E part `interval`
+    (e.g. "15MIN", "1HOUR", "1DAY").
+    """
+    s = pd.Series(
+        np.asarray(values, dtype="d"), index=pd.DatetimeIndex(datetimes)
+    ).sort_index()
+    s = s[~s.index.duplicated()]
+    if len(s) == 0:
+        raise ValueError("can not write a series without values")
+    if interval is not None:
+        step = pd.Timedelta(interval.lower())
+    elif len(s) < 2:
+        raise ValueError(
+            f"can not find the time step of a series with one value at {s.index[0]}, "
+            "give the interval (E part)"
+        )
+    else:
+        step = pd.Timedelta(hours=time_step_hours(s.index))
+    index = pd.date_range(s.index[0], s.index[-1], freq=step)
+    return s.reindex(index).fillna(HEC_MISSING)
+
+
+def post_processed_series(post_processed: pd.DataFrame, a_part: str = "SDG"):
+    """
+    DSS series of a `post_process_full_data` frame: velocity, velocity streak, gate
+    status (1 closed, 0 open) and gate streak, with B part the gate and F part the
+    model/scenario.
+    """
+    gate = post_processed["gate"].iloc[0]
+    model = post_processed["model"].iloc[0]
+    if post_processed["datetime"].nunique() < 2:
+        raise ValueError(
+            f"{gate} in {model} has a single timestep, its time step is unknown"
+        )
+    columns = {
+        "value": post_processed["value"],
+        "streak_duration": post_processed["streak_duration"],
+        "gate_status": post_processed["gate_status"].eq("Closed").astype("d"),
+        "gate_streak_duration": post_processed["gate_streak_duration"],
+    }
+    out = []
+    for column, values in columns.items():
+        c_part, units, data_type = POST_PROCESSED_SERIES[column]
+        out.append(
+            DSSSeries(
+                make_pathname(a_part, gate, c_part, model),
+                regular_series(post_processed["datetime"], values),
+                units,
+                data_type,
+            )
+        )
+    return out
+
+
+def write_dss(file: str, series: Iterable[DSSSeries]) -> int:
+    """
+    Write regular time series to a DSS file, each series is written whole with one call
+    and the file is opened once for all of them. The file is created if needed.
+
+    Returns:
+    - int: number of series written.
+    """
+    n = 0
+    with DSSFile(file, create_new=True) as dss:
+        for s in series:
+            dss.write_rts(s.pathname, s.values.to_frame(), s.units, s.type)
+            n += 1
+    return n
+
+
+def write_post_processed_dss(
+    file: str,
+    results: Dict | Iterable[pd.DataFrame],
+    a_part: str = "SDG",
+) -> int:
+    """
+    Write the velocity and gate status series of many gates and scenarios to one DSS
+    file.
+
+    Parameters:
+    - file (str): DSS file, created if it does not exist.
+    - results (dict or list): `post_process_full_data` frames, e.g. the dict returned by
+      `post_process_batch`.
+    - a_part (str): A part of the pathnames.
+
+    Returns:
+    - int: number of series written.
+    """
+    frames: List[pd.DataFrame] = list(
+        results.values() if isinstance(results, dict) else results
+    )
+    return write_dss(
+        file,
+        (s for df in frames if len(df) for s in post_processed_series(df, a_part)),
+    )
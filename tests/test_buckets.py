@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from sdgtools.db.stores import DuckDBStore, SQLiteStore
+from sdgtools.post_process.buckets import (
+    aggregate,
+    bucket_ids,
+    bucket_nunique,
+    bucket_reduce,
+    bucket_start,
+    iso_week,
+    time_step_hours,
+)
+
+RESAMPLE = {"day": "D", "week": "W-MON", "month": "MS"}
+
+
+def long_frame(periods=3000, seed=0, missing=False):
+    """
+    Hourly values of two nodes, with `missing` some NaN values, a day of NaN and a
+    gap of two days.
+    """
+    rng = np.random.default_rng(seed)
+    t = pd.date_range("1999-12-20", periods=periods, freq="h")
+    data = DataFrame(
+        {
+            "datetime": np.tile(t, 2),
+            "node": np.repeat(["rold024", "mho"], periods),
+            "value": rng.normal(2, 1, 2 * periods),
+        }
+    )
+    if missing:
+        t = data["datetime"]
+        some = rng.choice(len(data), len(data) // 10, replace=False)
+        data.loc[some, "value"] = np.nan
+        data.loc[(t >= "2000-01-03") & (t < "2000-01-04"), "value"] = np.nan
+        data = data[(t < "2000-01-10") | (t >= "2000-01-12")]
+    return data
+
+
+def resample(data, freq, how):
+    """
+    pandas reference, sum with min_count=1 so a bucket without values is NaN as in SQL.
+    """
+    grouped = (
+        data.set_index("datetime")
+        .groupby("node")["value"]
+        .resample(RESAMPLE[freq], label="left", closed="left")
+    )
+    out = grouped.sum(min_count=1) if how == "sum" else grouped.agg(how)
+    # resample fills the gaps with empty buckets, aggregate has no rows there
+    present = data.assign(bucket=bucket_ids(data["datetime"], freq))
+    out = out.reset_index()
+    out = out[
+        pd.MultiIndex.from_arrays(
+            [out["node"], bucket_ids(out["datetime"], freq)]
+        ).isin(pd.MultiIndex.from_frame(present[["node", "bucket"]]))
+    ]
+    return out.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("missing", [False, True])
+@pytest.mark.parametrize("freq", ["day", "week", "month"])
+@pytest.mark.parametrize("how", ["mean", "sum", "count", "min", "max"])
+def test_aggregate_matches_pandas_resample(freq, how, missing):
+    data = long_frame(missing=missing)
+    out = aggregate(data, freq, how)
+    expected = resample(data, freq, how)
+    assert list(out.columns) == ["node", "datetime", "value"]
+    np.testing.assert_array_equal(out["node"], expected["node"])
+    np.testing.assert_array_equal(
+        out["datetime"].to_numpy(), expected["datetime"].to_numpy("datetime64[ns]")
+    )
+    np.testing.assert_allclose(out["value"], expected["value"].astype(float))
+
+
+def test_bucket_start_inverts_bucket_ids():
+    t = pd.date_range("1969-12-25", "1970-03-01", freq="7h")
+    for freq in ["day", "week", "month"]:
+        start = bucket_start(bucket_ids(t, freq), freq)
+        assert (start <= t.to_numpy("datetime64[ns]")).all()
+        np.testing.assert_array_equal(bucket_ids(start, freq), bucket_ids(t, freq))
+    weeks = pd.DatetimeIndex(bucket_start(bucket_ids(t, "week"), "week"))
+    assert (weeks.dayofweek == 0).all()
+
+
+def test_iso_week_and_time_step():
+    t = pd.Series(pd.date_range("2015-12-25", "2021-01-10", freq="D"))
+    np.testing.assert_array_equal(iso_week(t), t.dt.isocalendar().week)
+    hourly = pd.date_range("2000-01-01", periods=10, freq="15min", unit="s")
+    assert time_step_hours(hourly.delete(3)) == 0.25
+    assert time_step_hours(hourly[:1]) == 0.0
+
+
+def test_bucket_nunique():
+    ids = np.array([3, 1, 3, 3, 1])
+    ids_out, counts = bucket_nunique(ids, ["a", "a", "b", "a", "c"])
+    np.testing.assert_array_equal(ids_out, [1, 3])
+    np.testing.assert_array_equal(counts, [2, 2])
+
+
+def test_bucket_reduce_skips_nan():
+    ids = np.array([1, 1, 1, 2, 2, 3])
+    values = np.array([1.0, np.nan, 3.0, np.nan, np.nan, 5.0])
+    expected = {
+        "mean": [2.0, np.nan, 5.0],
+        "sum": [4.0, np.nan, 5.0],
+        "count": [2, 0, 1],
+        "min": [1.0, np.nan, 5.0],
+        "max": [3.0, np.nan, 5.0],
+    }
+    for how, reduced in expected.items():
+        out_ids, out = bucket_reduce(ids, values, how)
+        np.testing.assert_array_equal(out_ids, [1, 2, 3])
+        np.testing.assert_array_equal(out, reduced)
+
+
+@pytest.mark.parametrize("how", ["mean", "sum", "count", "min", "max"])
+def test_aggregate_same_in_every_store(how, tmp_path):
+    # SQLiteStore aggregates with `aggregate`, DuckDBStore in SQL
+    pytest.importorskip("duckdb")
+    data = long_frame(periods=1000, missing=True).assign(param="stage", unit="FEET")
+    results = []
+    for store in [
+        SQLiteStore(str(tmp_path / "s.sqlite")),
+        DuckDBStore(str(tmp_path / "s.duckdb")),
+    ]:
+        store.append(data, "base")
+        results.append(store.aggregate("day", how))
+
+    pd.testing.assert_frame_equal(results[0], results[1], check_dtype=False)
@@ -0,0 +1,192 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+import sdgtools.post_process.cache as cache_module
+from sdgtools.post_process import METRICS
+from sdgtools.post_process.cache import MetricCache, cached_gate_metrics, metric_keys
+from sdgtools.post_process.data_config import gatef
+
+pytest.importorskip("pyarrow")
+
+
+def series(node, param, values, start="2016-01-01"):
+    return DataFrame(
+        {
+            "datetime": pd.date_range(start, periods=len(values), freq="15min"),
+            "node": node,
+            "param": param,
+            "value": values,
+            "unit": "",
+        }
+    )
+
+
+def sdg_frames(node_case=str.lower, scale=1.0):
+    """
+    flow, stage and gate operation frames for GLC with the rows of another gate mixed
+    in, node names in `node_case`.
+    """
+    t = np.arange(192)
+    flow = [
+        series(node_case(gatef["flow_op"][i]), "device-flow", scale * (t % 50) * 10.0)
+        for i in range(3)
+    ]
+    stage = [
+        series(node_case(gatef["gate_status"][i]), "stage", np.full(len(t), 0.0))
+        for i in range(3)
+    ]
+    gate_ops = [
+        series(node_case(f"{g}_GATEOP"), "elev", np.repeat([0.0, 10.0], 96))
+        for g in gatef["ID"]
+    ]
+    return pd.concat(flow), pd.concat(stage), pd.concat(gate_ops)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    Count the post-processing runs behind the cache.
+    """
+    made = []
+    post_process_full_data = cache_module.post_process_full_data
+
+    def counting(*args, **kwargs):
+        made.append(args[1])
+        return post_process_full_data(*args, **kwargs)
+
+    monkeypatch.setattr(cache_module, "post_process_full_data", counting)
+    return made
+
+
+def test_metric_keys_stable():
+    frames = [series("a", "flow", np.arange(10.0)), series("b", "flow", np.ones(10))]
+    keys = metric_keys(list(METRICS), frames, ["datetime", "value"], gate="GLC")
+
+    # same content in new frames, other columns and index do not matter
+    again = [df.assign(unit="CFS").set_axis(range(5, 15)) for df in frames]
+    assert metric_keys(list(METRICS), again, ["datetime", "value"], gate="GLC") == keys
+    # one key per metric
+    assert len(set(keys.values())) == len(METRICS)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda frames, params: (
+            [frames[0].assign(value=frames[0]["value"] + 1e-9), frames[1]],
+            params,
+        ),
+        lambda frames, params: (
+            [frames[0], series("b", "flow", np.ones(10), start="2016-01-02")],
+            params,
+        ),
+        lambda frames, params: (frames[::-1], params),
+        lambda frames, params: (frames, {**params, "width": 6.0}),
+        lambda frames, params: (frames, {**params, "gate": "OLD"}),
+    ],
+)
+def test_metric_keys_change(change):
+    frames = [series("a", "flow", np.arange(10.0)), series("b", "flow", np.ones(10))]
+    params = {"gate": "GLC", "width": 5.0}
+    keys = metric_keys(list(METRICS), frames, ["datetime", "value"], **params)
+
+    frames, params = change(frames, params)
+    changed = metric_keys(list(METRICS), frames, ["datetime", "value"], **params)
+
+    assert not set(changed.values()) & set(keys.values())
+
+
+def test_hit_and_miss(tmp_path, calls):
+    cache = MetricCache(str(tmp_path))
+
+    first = cached_gate_metrics(*sdg_frames(), "GLC", "s1", cache=cache)
+    assert calls == ["GLC"]
+    assert cache.stats()["misses"] == len(METRICS)
+    assert cache.stats()["entries"] == len(METRICS)
+
+    second = cached_gate_metrics(*sdg_frames(), "GLC", "s1", cache=cache)
+    assert calls == ["GLC"]
+    assert cache.stats()["hits"] == len(METRICS)
+    for name in METRICS:
+        pd.testing.assert_frame_equal(second[name], first[name], check_dtype=False)
+
+    # new data for the gate is computed again
+    cached_gate_metrics(*sdg_frames(scale=2.0), "GLC", "s1", cache=cache)
+    assert calls == ["GLC", "GLC"]
+
+
+def test_only_missing_metrics_are_stored(tmp_path, calls):
+    cache = MetricCache(str(tmp_path))
+    name = "calc_avg_daily_vel"
+    cached_gate_metrics(*sdg_frames(), "GLC", "s1", metrics=[name], cache=cache)
+
+    result = cached_gate_metrics(*sdg_frames(), "GLC", "s1", cache=cache)
+
+    assert len(calls) == 2
+    assert cache.hits == 1
+    assert set(result) == set(METRICS)
+
+
+def test_upper_case_nodes(tmp_path, calls):
+    cache = MetricCache(str(tmp_path))
+    lower = cached_gate_metrics(*sdg_frames(), "GLC", "s1", cache=cache)
+
+    # the dss B parts are upper case, the key and the result are the same
+    upper = cached_gate_metrics(*sdg_frames(str.upper), "GLC", "s1", cache=cache)
+
+    assert calls == ["GLC"]
+    assert len(upper["calc_avg_daily_vel"]) > 0
+    for name in METRICS:
+        pd.testing.assert_frame_equal(upper[name], lower[name], check_dtype=False)
+
+
+def test_unknown_metric(tmp_path):
+    with pytest.raises(ValueError, match="unknown metric"):
+        cached_gate_metrics(
+            *sdg_frames(), "GLC", "s1", metrics=["nope"], cache=MetricCache(tmp_path)
+        )
+
+
+def test_evict_least_recently_used(tmp_path):
+    value = DataFrame({"value": np.arange(100.0)})
+    cache = MetricCache(str(tmp_path))
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, value)
+        os.utime(cache._file(key), (1000 + i, 1000 + i))
+    size = cache.stats()["bytes"] // 3
+
+    # reading a marks it as used
+    assert cache.get("a") is not None
+    cache.max_bytes = 2 * size
+    assert cache.evict() == 1
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_put_keeps_max_bytes(tmp_path):
+    value = DataFrame({"value": np.arange(100.0)})
+    cache = MetricCache(str(tmp_path))
+    cache.put("a", value)
+    cache.max_bytes = cache.stats()["bytes"]
+
+    for i, key in enumerate(["b", "c"]):
+        os.utime(cache._file("a" if i == 0 else "b"), (1000, 1000))
+        cache.put(key, value)
+
+    assert cache.stats()["entries"] == 1
+    assert cache.get("c") is not None
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = MetricCache(str(tmp_path))
+    cache._file("a").write_bytes(b"not parquet")
+
+    assert cache.get("a") is None
+    assert not cache._file("a").exists()
+    assert cache.misses == 1
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from sdgtools.readers import catalog
+from sdgtools.readers.catalog import PathCatalog, _period
+
+PATHNAMES = {
+    "base.dss": [
+        "/HIST/MID_GATEOP/ELEV/01JAN1990 - 31DEC2015/15MIN/DCP/",
+        "/HIST/OLD_GATEOP/ELEV/01JAN2000/15MIN/DCP/",
+        "/HIST/ROLD024/STAGE/01JAN2010 - 31DEC2015/15MIN/DCP/",
+    ],
+    "alt.dss": ["/ALT/MID_GATEOP/ELEV/01JAN2016 - 31DEC2020/15MIN/DCP/"],
+}
+
+
+class FakeDSSFile:
+    """
+    Stand in for pyhecdss.DSSFile, the catalog of a file comes from PATHNAMES.
+    """
+
+    def __init__(self, path):
+        self.pathnames = PATHNAMES[path.rsplit("/", 1)[-1]]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def read_catalog(self):
+        return pd.DataFrame({"pathname": self.pathnames})
+
+    def get_pathnames(self, catalog):
+        return list(catalog["pathname"])
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog.pyhecdss, "DSSFile", FakeDSSFile)
+    for name in PATHNAMES:
+        (tmp_path / name).write_bytes(b"dss")
+    return tmp_path
+
+
+def test_period():
+    assert _period("01JAN1990 - 31DEC2015") == ("1990-01-01", "2015-12-31")
+    assert _period("01JAN2000") == ("2000-01-01", "2000-01-01")
+    assert _period("") == (None, None)
+
+
+def test_build_and_find(tree, tmp_path):
+    index = PathCatalog(str(tmp_path / "index.sqlite"))
+    result = index.build(str(tree), max_workers=1)
+    assert sorted(result.added) == sorted(str(tree / name) for name in PATHNAMES)
+    assert result.errors == {}
+
+    found = index.find("/.*/.*_GATEOP/.*/.*/.*/.*/")
+    assert len(found) == 3
+    single = found[found["b"] == "OLD_GATEOP"].iloc[0]
+    assert (single["start"], single["end"]) == ("2000-01-01", "2000-01-01")
+
+    found = index.find(
+        "/.*/.*_GATEOP/.*/.*/.*/.*/", start="1999-06-01", end="2000-06-01"
+    )
+    assert sorted(found["b"]) == ["MID_GATEOP", "OLD_GATEOP"]
+    found = index.find(start="2016-01-01")
+    assert list(found["a"]) == ["ALT"]
+
+    assert index.pathnames(str(tree / "alt.dss"), "/.*/ROLD024/.*/.*/.*/.*/") == []
+    assert index.build(str(tree), max_workers=1).unchanged == 2
+
+    (tree / "alt.dss").unlink()
+    assert index.build(str(tree), max_workers=1).removed == [str(tree / "alt.dss")]
+    assert index.pathnames(str(tree / "alt.dss"), "/.*/.*/.*/.*/.*/.*/") is None
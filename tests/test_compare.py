@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from sdgtools.post_process.compare import (
+    align_scenarios,
+    compare_scenarios,
+    diff_from_baseline,
+    exceedance_delta,
+    streak_stats,
+)
+
+nan = np.nan
+
+
+def frame(values, start=0, unit="us"):
+    t = pd.date_range("2016-01-01", periods=8, freq="h", unit=unit)[start:]
+    return DataFrame({"datetime": t[: len(values)], "value": values})
+
+
+def model_data(unit="us"):
+    """
+    Two scenarios of two gates, hourly. alt has a NaN velocity at GLC and its OLD
+    series starts and ends an hour later, so the union index has 7 steps.
+    """
+    return {
+        "base": {
+            "GLC": {"vel": frame([9.0, 9, 1, 9, 1, 1], unit=unit)},
+            "OLD": {"vel": frame([0.0] * 6, unit=unit)},
+        },
+        "alt": {
+            "GLC": {"vel": frame([9.0, 9, 9, nan, 9, 1], unit=unit)},
+            "OLD": {"vel": frame([10.0] * 6, start=1, unit=unit)},
+        },
+    }
+
+
+def test_align_union():
+    data = align_scenarios(model_data())
+
+    assert data.scenarios == ["base", "alt"]
+    assert data.gates == ["GLC", "OLD"]
+    pd.testing.assert_index_equal(
+        data.index, pd.date_range("2016-01-01", periods=7, freq="h", unit="ns")
+    )
+    np.testing.assert_array_equal(
+        data.values,
+        [
+            [[9, 9, 1, 9, 1, 1, nan], [0, 0, 0, 0, 0, 0, nan]],
+            [[9, 9, 9, nan, 9, 1, nan], [nan, 10, 10, 10, 10, 10, 10]],
+        ],
+    )
+    assert data.time_step_hours() == 1.0
+
+    long = data.to_frame()
+    assert len(long) == 2 * 2 * 7
+    assert long.iloc[7].tolist()[:2] == ["base", "OLD"]
+
+
+def test_align_intersection():
+    data = align_scenarios(model_data(), gates=["OLD"], how="intersection")
+
+    assert data.gates == ["OLD"]
+    assert data.index[0] == pd.Timestamp("2016-01-01 01:00")
+    assert len(data.index) == 5
+    np.testing.assert_array_equal(data.values, [[[0] * 5], [[10] * 5]])
+
+
+def test_align_errors():
+    with pytest.raises(ValueError, match="how must be"):
+        align_scenarios(model_data(), how="outer")
+    with pytest.raises(ValueError, match="no scenarios"):
+        align_scenarios({})
+
+
+def test_diff_from_baseline():
+    data = diff_from_baseline(align_scenarios(model_data()), "base")
+
+    np.testing.assert_array_equal(
+        data.values[1],
+        [[0, 0, 8, nan, 8, 0, nan], [nan, 10, 10, 10, 10, 10, nan]],
+    )
+    np.testing.assert_array_equal(data.values[0], [[0] * 6 + [nan], [0] * 6 + [nan]])
+    with pytest.raises(KeyError, match="not part of this comparison"):
+        diff_from_baseline(align_scenarios(model_data()), "other")
+
+
+@pytest.mark.parametrize("unit", ["s", "ms", "us", "ns"])
+def test_exceedance_delta(unit):
+    out = exceedance_delta(align_scenarios(model_data(unit)), "base", threshold=8)
+
+    expected = DataFrame(
+        {
+            "scenario": ["base", "base", "alt", "alt"],
+            "gate": ["GLC", "OLD", "GLC", "OLD"],
+            "hours_exceeded": [3.0, 0, 4, 6],
+            "exceedance": [0.5, 0, 0.8, 1],
+            "exceedance_delta": [0.0, 0, 0.3, 1],
+        }
+    )
+    pd.testing.assert_frame_equal(out, expected)
+
+
+@pytest.mark.parametrize("unit", ["s", "ms", "us", "ns"])
+def test_streak_stats(unit):
+    out = streak_stats(align_scenarios(model_data(unit)), "base", threshold=8)
+
+    # a NaN ends a streak: alt GLC has runs of 3 and 1 hours
+    expected = DataFrame(
+        {
+            "scenario": ["base", "base", "alt", "alt"],
+            "gate": ["GLC", "OLD", "GLC", "OLD"],
+            "streak_count": [2, 0, 2, 1],
+            "mean_streak_duration": [1.5, 0, 2, 6],
+            "max_streak_duration": [2.0, 0, 3, 6],
+            "streak_count_delta": [0, 0, 0, 1],
+            "mean_streak_duration_delta": [0.0, 0, 0.5, 6],
+            "max_streak_duration_delta": [0.0, 0, 1, 6],
+        }
+    )
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
+
+
+def test_compare_scenarios():
+    out = compare_scenarios(model_data(), "base").set_index(["scenario", "gate"])
+
+    assert out.loc[("alt", "GLC"), "exceedance"] == pytest.approx(0.8)
+    assert out.loc[("alt", "GLC"), "exceedance_delta"] == pytest.approx(0.3)
+    assert out.loc[("alt", "GLC"), "max_streak_duration"] == 3
+    assert out.loc[("alt", "OLD"), "hours_exceeded"] == 6
+    assert out.loc[("base", "OLD"), "streak_count"] == 0
+    assert len(out) == 4
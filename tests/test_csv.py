@@ -0,0 +1,82 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from sdgtools.writers.csv import (
+    CSVWriter,
+    compressed_path,
+    open_csv,
+    prefetch,
+    read_csv_chunks,
+    write_csv,
+)
+
+
+def long_frame(periods=1000):
+    return DataFrame(
+        {
+            "datetime": pd.date_range("2000-01-01", periods=periods, freq="15min"),
+            "node": np.tile(["rold024", "mho"], periods // 2),
+            "value": np.linspace(-1, 1, periods),
+        }
+    )
+
+
+@pytest.mark.parametrize("compress", [None, "gzip", "zstd"])
+def test_round_trip(tmp_path, compress):
+    if compress == "zstd":
+        pytest.importorskip("zstandard")
+    df = long_frame()
+    path = tmp_path / "out.csv"
+    with CSVWriter(compressed_path(str(path), compress), compress, chunk_rows=64) as w:
+        w.write(df.iloc[:500]).write(df.iloc[:0]).write(df.iloc[500:])
+    assert w.rows == len(df)
+
+    written = compressed_path(str(path), compress)
+    chunks = list(read_csv_chunks(written, chunksize=300, parse_dates=["datetime"]))
+    assert [len(c) for c in chunks] == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True), df, check_dtype=False
+    )
+    pd.testing.assert_frame_equal(
+        pd.read_csv(written, parse_dates=["datetime"]), df, check_dtype=False
+    )
+
+
+def test_write_csv_adds_suffix_and_writes_gzip_members(tmp_path):
+    df = long_frame()
+    path = write_csv(df, str(tmp_path / "out.csv"), "gzip")
+    assert path.endswith(".csv.gz")
+    with gzip.open(path, "rt") as f:
+        assert f.readline().strip() == "datetime,node,value"
+    # the file is recognized by its first bytes whatever its name
+    renamed = tmp_path / "renamed.csv"
+    (tmp_path / "out.csv.gz").rename(renamed)
+    with open_csv(str(renamed)) as f:
+        assert f.readline() == b"datetime,node,value\n"
+
+
+def test_empty_frame_writes_header(tmp_path):
+    path = write_csv(long_frame().iloc[:0], str(tmp_path / "empty.csv"), "gzip")
+    assert list(pd.read_csv(path).columns) == ["datetime", "node", "value"]
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError, match="unknown compression"):
+        CSVWriter(str(tmp_path / "out.csv"), "bz2")
+
+
+def test_prefetch_keeps_order_and_raises_producer_errors():
+    assert list(prefetch(range(10), depth=2)) == list(range(10))
+
+    def items():
+        yield 1
+        raise OSError("truncated file")
+
+    out = prefetch(items())
+    assert next(out) == 1
+    with pytest.raises(OSError, match="truncated file"):
+        next(out)
@@ -0,0 +1,135 @@
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from pandas import DataFrame
+
+from sdgtools import cli
+from sdgtools.writers.csv import write_csv
+
+# the sdgtools.db attribute is the `db` command group
+db = importlib.import_module("sdgtools.db")
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return (7,)
+
+    def copy_expert(self, query, buffer):
+        rows = pd.read_csv(buffer, header=None)
+        if len(self.conn.copied) == self.conn.fail_on:
+            raise RuntimeError("COPY failed")
+        self.conn.copied.append(rows)
+
+
+class FakeConnection:
+    """
+    Stand in for a psycopg2 connection that records the copied chunks.
+    """
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.copied = []
+        self.committed = self.rolled_back = self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.committed = True
+        else:
+            self.rolled_back = True
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class Connections(list):
+    # index of the chunk whose COPY fails in the next connections
+    fail_on = None
+
+    def connect(self, conn_creds):
+        self.append(FakeConnection(self.fail_on))
+        return self[-1]
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    made = Connections()
+    monkeypatch.setattr(db.psycopg2, "connect", made.connect)
+    return made
+
+
+def long_frame(periods=100):
+    return DataFrame(
+        {
+            "datetime": pd.date_range("2016-01-01", periods=periods, freq="15min"),
+            "node": "rold024",
+            "param": "STAGE",
+            "value": np.linspace(1, 2, periods),
+            "unit": "FEET",
+        }
+    )
+
+
+def test_insert_copies_chunks_in_one_transaction(connections):
+    chunks = [long_frame(10), long_frame(5)]
+    assert db.insert_dsm2_data(iter(chunks), "FPV1Ma", "postgresql://x") == 15
+    conn = connections[0]
+    assert [len(c) for c in conn.copied] == [10, 5]
+    assert conn.copied[0].iloc[0, 5] == 7
+    assert conn.committed and conn.closed
+
+
+def test_failed_copy_is_raised_and_rolled_back(connections):
+    connections.fail_on = 1
+    with pytest.raises(RuntimeError, match="COPY failed"):
+        db.insert_dsm2_data([long_frame(10), long_frame(5)], "FPV1Ma", "postgresql://x")
+    conn = connections[0]
+    assert conn.rolled_back and not conn.committed and conn.closed
+
+
+def test_cli_streams_and_validates_chunks(connections, tmp_path):
+    data = long_frame()
+    data.loc[50, "value"] = np.inf
+    path = write_csv(data, str(tmp_path / "stage.csv"), "gzip")
+    runner = CliRunner()
+
+    args = ["db", "insert", path, "FPV1Ma", "postgresql://x", "--chunksize", "30"]
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 1
+    assert "nothing loaded" in result.output
+    assert connections[-1].rolled_back and connections[-1].closed
+    # the chunks before the bad one were copied inside the rolled back transaction
+    assert [len(c) for c in connections[-1].copied] == [30]
+
+    quarantine = tmp_path / "bad.csv"
+    result = runner.invoke(cli, args + ["--quarantine", str(quarantine)])
+    assert result.exit_code == 0, result.output
+    assert [len(c) for c in connections[-1].copied] == [30, 29, 30, 10]
+    assert connections[-1].committed
+    assert pd.read_csv(quarantine)["check"].tolist() == ["non_finite_value"]
+
+    connections.fail_on = 0
+    result = runner.invoke(cli, args[:-2] + ["--no-validate"])
+    assert result.exit_code == 1
+    assert "nothing loaded: COPY failed" in result.output
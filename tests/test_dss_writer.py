@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from pandas import DataFrame
+
+from sdgtools import cli
+from sdgtools.post_process.data_config import gatef
+from sdgtools.writers import dss
+
+
+class FakeDSSFile:
+    """
+    Stand in for pyhecdss.DSSFile that keeps the written series in `written`.
+    """
+
+    written = {}
+
+    def __init__(self, path, create_new=False):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def write_rts(self, pathname, df, units, data_type):
+        self.written[pathname] = (df, units, data_type)
+
+
+@pytest.fixture
+def written(monkeypatch):
+    monkeypatch.setattr(dss, "DSSFile", FakeDSSFile)
+    FakeDSSFile.written = {}
+    return FakeDSSFile.written
+
+
+def dss_style_export(periods=200):
+    """
+    Long format SDG data as `sdgtools dss` writes it, with the upper case B parts.
+    """
+    rng = np.random.default_rng(0)
+    t = pd.date_range("2016-01-01", periods=periods, freq="15min")
+    frames = []
+    for i, gate_id in enumerate(gatef["ID"]):
+        for node, param, unit, values in [
+            (gatef["flow_op"][i], "FLOW", "CFS", rng.uniform(0, 400, periods)),
+            (gatef["gate_status"][i], "STAGE", "FEET", rng.uniform(0, 4, periods)),
+            (f"{gate_id}_GATEOP", "ELEV", "", rng.choice([0.0, 10.0], periods)),
+        ]:
+            frames.append(
+                DataFrame(
+                    {
+                        "datetime": t,
+                        "node": node,
+                        "param": param,
+                        "value": values,
+                        "unit": unit,
+                    }
+                )
+            )
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_export_upper_case_dss_nodes(written, tmp_path):
+    data = dss_style_export()
+    data.to_csv(tmp_path / "FPV1Ma_export.csv", index=False)
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "dss-export",
+            str(tmp_path / "out.dss"),
+            str(tmp_path / "FPV1Ma_export.csv"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "no data" not in result.output
+    assert len(written) == 4 * len(gatef["ID"])
+
+    df, units, _ = written["/SDG/GLC/VELOCITY///FPV1MA/"]
+    assert units == "FT/S"
+    flow = data[data["node"] == "GLC_FLOW_FISH"]["value"].to_numpy()
+    stage = data[data["node"] == "GLC_GATE_UP"]["value"].to_numpy()
+    expected = flow / ((stage - gatef["bottom_elev"][0]) * gatef["width"][0])
+    np.testing.assert_allclose(df.iloc[:, 0].to_numpy(), expected)
+
+
+def test_regular_series_fills_gaps():
+    t = pd.date_range("2016-01-01", periods=6, freq="15min")
+    s = dss.regular_series(t.delete(2)[::-1], [5.0, 4.0, 3.0, 1.0, 0.0])
+    assert s.index.freq == pd.Timedelta("15min")
+    assert list(s.index) == list(t)
+    assert list(s) == [0.0, 1.0, dss.HEC_MISSING, 3.0, 4.0, 5.0]
+
+
+def test_regular_series_with_one_timestamp():
+    t = [pd.Timestamp("2016-01-01")]
+    with pytest.raises(ValueError, match="give the interval"):
+        dss.regular_series(t, [1.0])
+    s = dss.regular_series(t, [1.0], interval="15MIN")
+    assert list(s) == [1.0]
+    assert s.index.freq == pd.Timedelta("15min")
+    with pytest.raises(ValueError, match="without values"):
+        dss.regular_series([], [])
+
+
+def test_write_post_processed_dss(written):
+    t = pd.date_range("2016-01-01", periods=4, freq="h")
+    frame = DataFrame(
+        {
+            "datetime": t,
+            "value": [1.0, 9.0, 9.5, 2.0],
+            "streak_duration": [1.0, 2.0, 2.0, 1.0],
+            "gate_status": ["Open", "Closed", "Closed", "Open"],
+            "gate_streak_duration": [1.0, 2.0, 2.0, 1.0],
+            "gate": "MID",
+            "model": "FPV2Ma",
+        }
+    )
+    assert dss.write_post_processed_dss("out.dss", {"FPV2Ma": frame}) == 4
+    df, units, data_type = written["/SDG/MID/GATE-STATUS///FPV2MA/"]
+    assert (units, data_type) == ("CLOSED=1", "INST-VAL")
+    assert list(df.iloc[:, 0]) == [0.0, 1.0, 1.0, 0.0]
+
+    with pytest.raises(ValueError, match="single timestep"):
+        dss.write_post_processed_dss("out.dss", [frame.iloc[:1]])
+
+
+def test_export_reports_a_single_timestep(written, tmp_path):
+    dss_style_export(periods=1).to_csv(tmp_path / "FPV1Ma_export.csv", index=False)
+    result = CliRunner().invoke(
+        cli,
+        ["dss-export", str(tmp_path / "out.dss"), str(tmp_path / "FPV1Ma_export.csv")],
+    )
+    assert result.exit_code == 1
+    assert "single timestep" in result.output
@@ -0,0 +1,94 @@
+import time
+
+import pandas as pd
+
+from sdgtools.jobs import JobQueue, is_permanent, run_worker
+from sdgtools.scenario import ScenarioPipelineError
+from sdgtools.validation import ValidationError, ValidationReport
+
+
+def make_queue(tmp_path, n=1, max_attempts=3):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    queue.create()
+    for i in range(n):
+        queue.enqueue(f"S{i}", "target", {}, max_attempts=max_attempts)
+    return queue
+
+
+def status(queue):
+    return queue.jobs().set_index("scenario")[["status", "attempts"]]
+
+
+def validation_error():
+    report = ValidationReport(0, pd.DataFrame(), None, None)
+    return ValidationError("bad data", report)
+
+
+def test_claim_complete_and_no_duplicates(tmp_path):
+    queue = make_queue(tmp_path, n=2)
+    assert not queue.enqueue("S0", "target", {})
+    a = queue.claim("w1", lease=60)
+    b = queue.claim("w2", lease=60)
+    assert {a.scenario, b.scenario} == {"S0", "S1"}
+    assert queue.claim("w3", lease=60) is None
+    assert queue.complete(a.id, "w1", {"rows": 1})
+    assert not queue.complete(b.id, "w1", {})
+    assert queue.counts() == {"queued": 0, "running": 1, "done": 1, "failed": 0}
+
+
+def test_failed_jobs_are_retried_with_backoff(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    job = queue.claim("w", lease=60)
+    queue.fail(job.id, "w", "boom", backoff=0)
+    assert status(queue).loc["S0", "status"] == "queued"
+    job = queue.claim("w", lease=60)
+    assert job.attempts == 2
+    queue.fail(job.id, "w", "boom", backoff=0)
+    assert status(queue).loc["S0", "status"] == "failed"
+    assert queue.retry_failed() == 1
+    assert queue.claim("w", lease=60).attempts == 1
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    assert queue.claim("dead1", lease=-1).attempts == 1
+    job = queue.claim("dead2", lease=-1)
+    assert job.attempts == 2
+    # the second worker died on the last attempt as well
+    assert queue.claim("w", lease=60) is None
+    row = queue.jobs().iloc[0]
+    assert row["status"] == "failed"
+    assert "dead2" in row["error"]
+
+
+def test_wrapped_validation_error_is_permanent(tmp_path):
+    def runner(job):
+        try:
+            raise validation_error()
+        except ValidationError as e:
+            raise ScenarioPipelineError("failed to load scenario") from e
+
+    assert is_permanent(ScenarioPipelineError("x")) is False
+    queue = make_queue(tmp_path)
+    n = run_worker(
+        queue, "w", exit_when_empty=True, poll=0.01, backoff=0, runner=runner
+    )
+    assert n == 1
+    assert status(queue).loc["S0"].tolist() == ["failed", 1]
+
+
+def test_worker_retries_transient_errors(tmp_path):
+    calls = []
+
+    def runner(job):
+        calls.append(time.time())
+        if len(calls) == 1:
+            raise ConnectionError("database went away")
+        return {"rows": 10}
+
+    queue = make_queue(tmp_path)
+    n = run_worker(
+        queue, "w", exit_when_empty=True, poll=0.01, backoff=0, runner=runner
+    )
+    assert n == 2
+    assert status(queue).loc["S0"].tolist() == ["done", 2]
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from sdgtools.post_process import calc_vel
+from sdgtools.post_process.data_config import gatef
+from sdgtools.post_process.kernels import (
+    ConsecutiveStatsKernel,
+    DailyAverageKernel,
+    ExceedanceKernel,
+    GateStreakKernel,
+    VelocityKernel,
+)
+
+
+def long_frame(node, values, start="2000-01-01", freq="15min", param="flow"):
+    return DataFrame(
+        {
+            "datetime": pd.date_range(start, periods=len(values), freq=freq),
+            "node": node,
+            "param": param,
+            "value": np.asarray(values, dtype=float),
+            "unit": "",
+        }
+    )
+
+
+def gate_frames(periods=200, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i, gate_id in enumerate(gatef["ID"]):
+        flow = long_frame(gatef["flow_op"][i], rng.uniform(0, 400, periods))
+        # stage starts later and misses a value, so the series only partly overlap
+        stage = long_frame(
+            gatef["gate_status"][i],
+            rng.uniform(0, 4, periods),
+            start="2000-01-01 01:00",
+            param="stage",
+        ).drop(index=50)
+        gateop = long_frame(f"{gate_id}_GATEOP", rng.choice([0, 10], periods))
+        frames += [flow, stage, gateop]
+    frames.append(long_frame("ROLD024", rng.uniform(0, 10, periods), param="stage"))
+    return frames
+
+
+def reference_velocity(data: DataFrame) -> DataFrame:
+    out = []
+    for i, gate_id in enumerate(gatef["ID"]):
+        series = {
+            node: g.set_index("datetime")["value"] for node, g in data.groupby("node")
+        }
+        vel = calc_vel(
+            series[gatef["flow_op"][i]],
+            series[gatef["gate_status"][i]],
+            gatef["bottom_elev"][i],
+            gatef["width"][i],
+        ).dropna()
+        out.append(
+            DataFrame(
+                {
+                    "datetime": vel.index.as_unit("ns"),
+                    "node": gate_id.lower(),
+                    "value": vel.to_numpy(),
+                }
+            )
+        )
+    return pd.concat(out, ignore_index=True)
+
+
+def run(kernel, data: DataFrame, chunksize: int) -> DataFrame:
+    for start in range(0, len(data), chunksize):
+        kernel.update(data.iloc[start : start + chunksize])
+    return kernel.finalize()
+
+
+def test_velocity_matches_reference_in_any_row_order():
+    frames = gate_frames()
+    expected = reference_velocity(pd.concat(frames, ignore_index=True))
+    series_by_series = pd.concat(frames, ignore_index=True)
+    by_time = series_by_series.sort_values("datetime", kind="stable")
+    for data in [series_by_series, by_time]:
+        for chunksize in [7, 100, len(data)]:
+            out = run(VelocityKernel(), data, chunksize)
+            assert (out["param"] == "velocity").all()
+            pd.testing.assert_frame_equal(out[["datetime", "node", "value"]], expected)
+
+
+def test_velocity_carries_only_the_unmatched_tail():
+    frames = gate_frames(periods=1000)
+    data = pd.concat(frames, ignore_index=True).sort_values("datetime", kind="stable")
+    kernel = VelocityKernel()
+    for start in range(0, len(data), 100):
+        kernel.update(data.iloc[start : start + 100])
+        pending = max(len(t) for sides in kernel.pending.values() for t, _ in sides)
+        assert pending <= 100
+
+
+def test_gate_streaks_only_use_gate_operation_nodes():
+    data = pd.concat(gate_frames(), ignore_index=True)
+    out = run(GateStreakKernel(), data, 64)
+    assert set(out["node"].str.lower()) == {
+        f"{gate_id}_gateop".lower() for gate_id in gatef["ID"]
+    }
+    for node, g in data[data["node"].str.endswith("_GATEOP")].groupby("node"):
+        runs = out[out["node"] == node]
+        closed = g["value"].to_numpy() >= 10
+        n_runs = 1 + int(np.count_nonzero(closed[1:] != closed[:-1]))
+        assert len(runs) == n_runs
+        assert runs["count"].sum() == len(g)
+
+
+def stage_data(periods=500, seed=1):
+    rng = np.random.default_rng(seed)
+    frames = [
+        long_frame(node, rng.uniform(0, 12, periods), param="stage")
+        for node in ["rold024", "mho", "dgl"]
+    ]
+    data = pd.concat(frames, ignore_index=True).sort_values("datetime", kind="stable")
+    data.loc[data.index[::17], "value"] = np.nan
+    return data
+
+
+def test_daily_average_matches_groupby():
+    data = stage_data()
+    out = run(DailyAverageKernel(), data, 101)
+    expected = (
+        data.dropna(subset=["value"])
+        .groupby(["node", data["datetime"].dt.floor("D")])["value"]
+        .agg(["mean", "count"])
+        .reset_index()
+    )
+    np.testing.assert_array_equal(out["node"], expected["node"])
+    np.testing.assert_array_equal(
+        out["date"].to_numpy(), expected["datetime"].to_numpy("datetime64[ns]")
+    )
+    np.testing.assert_allclose(out["value"], expected["mean"])
+    np.testing.assert_array_equal(out["count"], expected["count"])
+
+
+def test_exceedance_and_streaks_match_groupby():
+    data = stage_data()
+    exceedance = run(ExceedanceKernel(threshold=8), data, 101).set_index("node")
+    streaks = run(ConsecutiveStatsKernel(threshold=8), data, 101)
+    for node, g in data.groupby("node"):
+        v = g["value"].dropna()
+        row = exceedance.loc[node]
+        assert row["exceeded_count"] == (v >= 8).sum()
+        assert row["total_count"] == len(v)
+        assert row["hours_exceeded"] == (v >= 8).sum() * 0.25
+
+        above = (g["value"] >= 8).to_numpy()
+        n_runs = 1 + int(np.count_nonzero(above[1:] != above[:-1]))
+        assert streaks.loc[streaks["node"] == node, "streak_count"].sum() == n_runs
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from sdgtools.post_process import gate_model_data, post_process_full_data
+from sdgtools.post_process.data_config import gatef
+
+pytest.importorskip("polars")
+from sdgtools.post_process.lazy import post_process_batch  # noqa: E402
+
+
+def long_frame(node_case=str.upper):
+    """
+    Long format SDG data for every gate with gaps in time, NaN values and velocity
+    going over and under the threshold, node names in `node_case`.
+    """
+    rng = np.random.default_rng(1)
+    t = pd.date_range("2016-01-01", periods=400, freq="15min")
+    frames = []
+    for i, gate_id in enumerate(gatef["ID"]):
+        bottom = gatef["bottom_elev"][i]
+        flow = rng.uniform(0, 400, len(t))
+        flow[rng.choice(len(t), 10, replace=False)] = np.nan
+        stage = bottom + rng.uniform(2, 6, len(t))
+        gate_ops = np.repeat(rng.choice([0.0, 10.0, 20.0], len(t) // 20), 20)
+        gate_ops[rng.choice(len(t), 5, replace=False)] = np.nan
+        for node, param, unit, values, keep in [
+            (gatef["flow_op"][i], "device-flow", "CFS", flow, slice(None)),
+            # the stage misses a few hours, velocity has a gap there
+            (gatef["gate_status"][i], "stage", "FEET", stage, np.r_[0:100, 120:400]),
+            (f"{gate_id}_GATEOP", "elev", None, gate_ops, np.r_[0:200, 230:400]),
+        ]:
+            frames.append(
+                DataFrame(
+                    {
+                        "datetime": t[keep],
+                        "node": node_case(node),
+                        "param": param,
+                        "value": values[keep],
+                        "unit": unit,
+                    }
+                )
+            )
+    return pd.concat(frames, ignore_index=True)
+
+
+def pandas_result(data, gate, model):
+    model_data = gate_model_data(
+        data[data["param"] == "device-flow"],
+        data[data["param"] == "stage"],
+        data[data["param"] == "elev"],
+        gate,
+        model,
+    )
+    return model_data, post_process_full_data(model_data, gate)
+
+
+def assert_same(result, expected):
+    assert list(result.columns) == list(expected.columns)
+    result, expected = result.copy(), expected.copy()
+    for df in (result, expected):
+        for column in df.columns:
+            if df[column].dtype.kind == "M":
+                df[column] = df[column].astype("datetime64[ns]")
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True),
+        expected.reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize("node_case", [str.upper, str.lower])
+def test_batch_matches_pandas(node_case):
+    data = long_frame(node_case)
+
+    results = post_process_batch({"s1": data})
+
+    for gate in gatef["ID"]:
+        _, expected = pandas_result(data, gate, "s1")
+        assert len(expected) > 0
+        assert_same(results[("s1", gate)], expected)
+
+
+def test_full_data_polars_matches_pandas():
+    data = long_frame()
+    for gate in gatef["ID"]:
+        model_data, expected = pandas_result(data, gate, "s1")
+
+        result = post_process_full_data(model_data, gate, backend="polars")
+
+        assert_same(result, expected)
+
+
+def test_batch_date_range():
+    data = long_frame()
+
+    results = post_process_batch(
+        {"s1": data}, gates=["GLC"], start_date="2016-01-02", end_date="2016-01-03"
+    )
+
+    data = data[(data["datetime"] >= "2016-01-02") & (data["datetime"] <= "2016-01-03")]
+    _, expected = pandas_result(data, "GLC", "s1")
+    assert_same(results[("s1", "GLC")], expected)
@@ -0,0 +1,70 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sdgtools.post_process.compare import ScenarioArray
+from sdgtools.post_process.rolling import moving_sum, rolling_stats
+
+
+def scenario_array(n_time=500, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(1e4, 5, (2, 3, n_time))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    # a gate without any values in one scenario
+    values[1, 2] = np.nan
+    return ScenarioArray(
+        scenarios=["base", "alt"],
+        gates=["glc", "mid", "old"],
+        index=pd.date_range("2000-01-01", periods=n_time, freq="15min", unit="ns"),
+        values=values,
+    )
+
+
+@pytest.mark.parametrize("window, min_periods", [(4, None), (96, 48), (600, 1)])
+def test_rolling_stats_match_pandas(window, min_periods):
+    data = scenario_array()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        stats = rolling_stats(data, window, threshold=1e4, min_periods=min_periods)
+
+    for s in range(len(data.scenarios)):
+        for g in range(len(data.gates)):
+            series = pd.Series(data.values[s, g])
+            rolling = series.rolling(window, min_periods=min_periods or window)
+            for name in ["mean", "min", "max"]:
+                np.testing.assert_allclose(
+                    stats[name].values[s, g], rolling.agg(name).to_numpy(), rtol=1e-9
+                )
+            above = (series >= 1e4).astype(float).rolling(window, min_periods=1)
+            np.testing.assert_allclose(
+                stats["hours_above"].values[s, g], above.sum().to_numpy() * 0.25
+            )
+
+
+def test_moving_sum_of_missing_series_is_nan_without_warnings():
+    values = np.full((2, 10), np.nan)
+    values[0] = np.arange(10)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        out = moving_sum(values, 3, min_periods=1)
+    assert np.isnan(out[1]).all()
+    np.testing.assert_allclose(
+        out[0], pd.Series(values[0]).rolling(3, min_periods=1).sum()
+    )
+
+
+@pytest.mark.parametrize("unit", ["s", "ms", "us", "ns"])
+def test_duration_windows_in_any_index_unit(unit):
+    data = scenario_array(n_time=200)
+    data.index = data.index.as_unit(unit)
+    assert data.time_step_hours() == 0.25
+
+    stats = rolling_stats(data, "1D", threshold=1e4, min_periods=1)
+    series = pd.Series(data.values[0, 0])
+    np.testing.assert_allclose(
+        stats["mean"].values[0, 0], series.rolling(96, min_periods=1).mean()
+    )
+    above = (series >= 1e4).astype(float).rolling(96, min_periods=1).sum()
+    np.testing.assert_allclose(stats["hours_above"].values[0, 0], above * 0.25)
@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from pandas import DataFrame
+
+import sdgtools.dss_reader as dss_reader
+from sdgtools import cli
+from sdgtools.dss_reader import find_scenario_files, read_scenario_dir
+
+ECHO = """GATE_WEIR_DEVICE
+GATE_NAME DEVICE NDUPLICATE WIDTH ELEV HEIGHT CF_FROM_NODE CF_TO_NODE DEFAULT_OP
+grantline fish_passage 1 5.0 -6.0 10.0 0.8 0.8 gate_open
+grantline boat_lock 1 5.0 -6.0 10.0 0.8 0.8 gate_open
+END
+"""
+
+
+def fake_dss(path, catalog=None):
+    if "broken" in path:
+        raise OSError("can not open file")
+    name = path.rsplit("/", 1)[-1]
+    return DataFrame({"node": [name], "value": [1.0]})
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    # reader processes are forked and see the fake reader
+    monkeypatch.setattr(dss_reader, "get_all_data_from_dsm2_dss", fake_dss)
+    output = tmp_path / "output"
+    output.mkdir()
+    for name in [
+        "FPV1Ma_SDG.dss",
+        "FPV1Ma_hydro_V7.dss",
+        "hydro_echo_FPV1Ma.inp",
+        "FPV2Ma_SDG_V7.dss",
+        "FPV2Ma_hydro_V7.dss",
+        "FPV2Ma_hydro_V6.dss",
+        "hydro_echo_FPV2Ma.inp",
+        "FPV3Ma_sdg.dss",
+        "FPV4Ma_SDG.dss",
+        "FPV4Ma_hydro_broken.dss",
+        "FPV5Ma_SDG.dss",
+        "FPV5Ma_hydro.dss",
+        "hydro_echo_FPV5Ma.inp",
+        "notes.txt",
+    ]:
+        (output / name).write_text(ECHO)
+    (output / "hydro_echo_FPV5Ma.inp").write_text("no gate table\n")
+    return tmp_path
+
+
+def test_find_scenario_files(output_dir):
+    files = find_scenario_files(str(output_dir))
+    assert sorted(files) == ["FPV1Ma", "FPV2Ma", "FPV3Ma", "FPV4Ma", "FPV5Ma"]
+    assert {k: [p.name for p in v] for k, v in files["FPV1Ma"].items()} == {
+        "sdg": ["FPV1Ma_SDG.dss"],
+        "hydro": ["FPV1Ma_hydro_V7.dss"],
+        "echo": ["hydro_echo_FPV1Ma.inp"],
+    }
+    assert len(files["FPV2Ma"]["hydro"]) == 2
+    assert list(files["FPV3Ma"]) == ["sdg"]
+
+    files = find_scenario_files(str(output_dir), v7_filter="v7")
+    assert [p.name for p in files["FPV2Ma"]["hydro"]] == ["FPV2Ma_hydro_V7.dss"]
+    # the filter applies to the dss files only
+    assert "echo" in files["FPV2Ma"]
+    assert "FPV1Ma" in files and "sdg" not in files["FPV1Ma"]
+
+
+def test_read_scenario_dir_reports_each_failure(output_dir):
+    result = read_scenario_dir(str(output_dir), max_workers=2)
+    assert sorted(result.data) == ["FPV1Ma"]
+    data = result.data["FPV1Ma"]
+    assert data["sdg"]["node"].tolist() == ["FPV1Ma_SDG.dss"]
+    assert data["echo"]["GATE_NAME"].tolist() == ["grantline"]
+    assert "more than one hydro file" in result.errors["FPV2Ma"]
+    assert result.errors["FPV3Ma"] == "missing hydro file"
+    assert "can not open file" in result.errors["FPV4Ma"]
+    assert "no GATE_WEIR_DEVICE table" in result.errors["FPV5Ma"]
+
+    result = read_scenario_dir(str(output_dir), v7_filter="V7", max_workers=1)
+    assert sorted(result.data) == ["FPV2Ma"]
+
+
+def test_scenario_dir_writes_the_scenarios_that_can_be_written(
+    output_dir, tmp_path, monkeypatch
+):
+    import sdgtools
+
+    write_csv = sdgtools.write_csv
+
+    def failing_write(df, path, compress=None):
+        if "FPV2Ma" in path:
+            raise OSError("disk full")
+        return write_csv(df, path, compress)
+
+    monkeypatch.setattr(sdgtools, "write_csv", failing_write)
+    (output_dir / "output" / "FPV2Ma_hydro_V6.dss").unlink()
+    result = CliRunner().invoke(
+        cli, ["scenario-dir", str(output_dir), str(tmp_path / "csv"), "-w", "1"]
+    )
+    assert result.exit_code == 1
+    assert "failed scenario FPV2Ma: writing" in result.output
+    assert "disk full" in result.output
+    assert "failed scenario FPV5Ma" in result.output
+    written = sorted(p.name for p in (tmp_path / "csv").iterdir())
+    assert written == ["FPV1Ma_echo.csv", "FPV1Ma_hydro.csv", "FPV1Ma_sdg.csv"]
+    assert pd.read_csv(tmp_path / "csv" / "FPV1Ma_sdg.csv")["value"].tolist() == [1.0]
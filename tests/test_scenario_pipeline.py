@@ -0,0 +1,327 @@
+import importlib
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from sdgtools.post_process.data_config import gatef
+from sdgtools.readers.dss import PARAM_TO_UNIT, make_dss_regex_from_parts
+from sdgtools.validation import ValidationError
+
+# the sdgtools.scenario attribute is the `scenario` command
+scenario = importlib.import_module("sdgtools.scenario")
+
+NODES = {
+    "sdg_stage": ("stage", gatef["gate_status"]),
+    "sdg_flow": ("device-flow", gatef["flow_op"]),
+    "sdg_gate_ops": ("elev", [f"{g}_GATEOP" for g in gatef["ID"]]),
+    "wl_compliance": ("stage", gatef["station"]),
+}
+
+# parts regex -> frame name, as run_scenario builds them
+FRAME_OF_REGEX = {
+    make_dss_regex_from_parts(B=b_parts, C=c_part): name
+    for name, (_, b_parts, c_part) in scenario.SCENARIO_FRAMES.items()
+}
+
+
+def series(name, node, periods=96, start="2016-01-01"):
+    """
+    One long format series of a scenario frame as `iter_dss` yields it.
+    """
+    param, _ = NODES[name]
+    values = {
+        "stage": np.linspace(1, 4, periods),
+        "device-flow": np.linspace(0, 300, periods),
+        "elev": np.tile([0.0, 10.0], periods // 2),
+    }[param]
+    return DataFrame(
+        {
+            "datetime": pd.date_range(start, periods=periods, freq="15min"),
+            "node": node.lower(),
+            "param": param,
+            "value": values,
+            "unit": PARAM_TO_UNIT.get(param),
+        }
+    )
+
+
+def scenario_series(name):
+    _, nodes = NODES[name]
+    return [series(name, node) for node in nodes]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return (7,)
+
+    def copy_expert(self, query, buffer):
+        rows = pd.read_csv(buffer, header=None)
+        if len(self.conn.copied) == self.conn.fail_on:
+            raise RuntimeError("COPY failed")
+        self.conn.copied.append(rows)
+
+
+class FakeConnection:
+    """
+    Stand in for a psycopg2 connection that records the copied frames.
+    """
+
+    fail_on = None
+
+    def __init__(self):
+        self.copied = []
+        self.committed = self.rolled_back = self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.committed = True
+        else:
+            self.rolled_back = True
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    made = FakeConnection()
+    monkeypatch.setattr(scenario.psycopg2, "connect", lambda creds: made)
+    monkeypatch.setattr(scenario, "read_echo_settings", lambda path: {})
+    return made
+
+
+@pytest.fixture
+def dss(monkeypatch):
+    """
+    Serve the scenario series from memory instead of dss files, the readers are forked
+    so they see the patched module. Maps path -> frame name -> list of series, a
+    callable entry is called instead.
+    """
+    files = {
+        "sdg.dss": {
+            name: scenario_series(name)
+            for name in ["sdg_stage", "sdg_flow", "sdg_gate_ops"]
+        },
+        "hydro.dss": {"wl_compliance": scenario_series("wl_compliance")},
+    }
+
+    def fake_iter_dss(path, parts_regex, chunk_years=None):
+        frames = files[path][FRAME_OF_REGEX[parts_regex]]
+        if callable(frames):
+            yield from frames()
+        else:
+            yield from frames
+
+    monkeypatch.setattr(scenario, "iter_dss", fake_iter_dss)
+    return files
+
+
+def run(**kwargs):
+    """
+    run_scenario in a thread, so a pipeline that hangs fails the test instead.
+    """
+    result = {}
+
+    def target():
+        try:
+            result["loaded"] = scenario.run_scenario(
+                "s1", "sdg.dss", "hydro.dss", "echo.inp", "creds", **kwargs
+            )
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), "pipeline did not finish"
+    if "error" in result:
+        raise result["error"]
+    return result["loaded"]
+
+
+def test_load_scenario(conn, dss):
+    loaded = run()
+
+    assert loaded["wl_compliance"] == 3 * 96
+    assert loaded["sdg_stage"] == 3 * 96
+    assert loaded["sdg_flow"] == 3 * 96
+    assert loaded["sdg_gate_ops"] == 3 * 96
+    assert loaded["velocity"] == 3 * 96
+    assert "velocity-streak" in loaded
+    assert sum(len(df) for df in conn.copied) == sum(loaded.values())
+    assert conn.committed and not conn.rolled_back
+    assert conn.closed
+
+
+def test_load_overlaps_read(conn, dss, tmp_path):
+    # the hydro reader only goes on once the first series was loaded
+    flag = tmp_path / "loaded"
+
+    def hydro():
+        yield series("wl_compliance", "MHO")
+        deadline = time.monotonic() + 30
+        while not flag.exists():
+            if time.monotonic() > deadline:
+                raise TimeoutError("first series was not loaded while reading")
+            time.sleep(0.01)
+        yield series("wl_compliance", "DGL")
+
+    dss["hydro.dss"]["wl_compliance"] = hydro
+
+    def on_load(name, rows):
+        if name == "wl_compliance":
+            flag.touch()
+
+    loaded = run(on_load=on_load)
+
+    assert loaded["wl_compliance"] == 2 * 96
+    assert conn.committed
+
+
+def test_chunks_are_loaded_as_read(conn, dss):
+    # a series read in two chunks is loaded as two COPYs, velocity uses both
+    for name in ["sdg_stage", "sdg_flow"]:
+        whole = scenario_series(name)
+        dss["sdg.dss"][name] = [part for df in whole for part in (df[:48], df[48:])]
+    calls = []
+
+    loaded = run(on_load=lambda name, rows: calls.append((name, rows)))
+
+    assert calls.count(("sdg_flow", 48)) == 6
+    assert loaded["sdg_flow"] == 3 * 96
+    assert loaded["velocity"] == 3 * 96
+
+
+def test_read_error(conn, dss):
+    def broken():
+        yield scenario_series("sdg_stage")[0]
+        raise OSError("bad dss file")
+
+    dss["sdg.dss"]["sdg_stage"] = broken
+
+    with pytest.raises(scenario.ScenarioPipelineError, match="bad dss file"):
+        run()
+    assert conn.rolled_back and not conn.committed
+    assert conn.closed
+
+
+def test_validation_error(conn, dss):
+    bad = scenario_series("wl_compliance")
+    bad[0].loc[3, "value"] = np.inf
+    dss["hydro.dss"]["wl_compliance"] = bad
+
+    with pytest.raises(scenario.ScenarioPipelineError) as e:
+        run()
+    assert isinstance(e.value.__cause__, ValidationError)
+    assert conn.rolled_back and conn.closed
+
+
+def test_quarantine(conn, dss, tmp_path):
+    bad = scenario_series("wl_compliance")
+    bad[0].loc[3, "value"] = np.inf
+    dss["hydro.dss"]["wl_compliance"] = bad
+
+    loaded = run(quarantine_path=str(tmp_path / "bad.csv"))
+
+    assert loaded["wl_compliance"] == 3 * 96 - 1
+    assert len(pd.read_csv(tmp_path / "bad.csv")) == 1
+    assert conn.committed
+
+
+def test_copy_error(conn, dss):
+    conn.fail_on = 1
+
+    with pytest.raises(scenario.ScenarioPipelineError, match="COPY failed"):
+        run()
+    assert conn.rolled_back and conn.closed
+
+
+def test_process_error(conn, dss, monkeypatch):
+    def broken(*args):
+        raise KeyError("GLC")
+
+    monkeypatch.setattr(scenario, "calc_scenario_velocity", broken)
+
+    with pytest.raises(scenario.ScenarioPipelineError) as e:
+        run()
+    assert isinstance(e.value.__cause__, KeyError)
+    assert conn.rolled_back and conn.closed
+
+
+def test_load_stage_waits_for_every_producer():
+    load_q = queue.Queue()
+    loaded, errors = {}, []
+    load_q.put(("a", series("wl_compliance", "MHO")))
+    load_q.put(scenario._DONE)
+    load_q.put(("a", series("wl_compliance", "DGL")))
+    load_q.put(scenario._DONE)
+
+    class Cursor:
+        def copy_expert(self, query, buffer):
+            pass
+
+    scenario._load_stage(Cursor(), 1, load_q, 2, loaded, errors, None)
+
+    assert loaded == {"a": 2 * 96}
+    assert errors == []
+    assert load_q.empty()
+
+
+def test_load_stage_drains_after_error():
+    # after a failed COPY the producers must still be able to put all their frames
+    load_q = queue.Queue(maxsize=1)
+    loaded, errors = {}, []
+
+    class Cursor:
+        def copy_expert(self, query, buffer):
+            raise RuntimeError("COPY failed")
+
+    loader = threading.Thread(
+        target=scenario._load_stage,
+        args=(Cursor(), 1, load_q, 1, loaded, errors, None),
+    )
+    loader.start()
+    for node in ["MHO", "DGL", "OLD"]:
+        load_q.put(("a", series("wl_compliance", node)), timeout=10)
+    load_q.put(scenario._DONE, timeout=10)
+    loader.join(timeout=10)
+
+    assert not loader.is_alive()
+    assert loaded == {}
+    assert [str(e) for e in errors] == ["COPY failed"]
+
+
+def test_process_stage_without_frames():
+    # nothing to process still ends the loader's input
+    process_q, load_q = queue.Queue(), queue.Queue()
+    process_q.put(scenario._DONE)
+
+    scenario._process_stage(process_q, load_q, {}, [])
+
+    assert load_q.get_nowait() is scenario._DONE
+    assert load_q.empty()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+from click.testing import CliRunner
+
+from sdgtools import cli
+from sdgtools.db.stores import SeriesStore
+from sdgtools.post_process import METRICS
+from sdgtools.server import QueryService, ResultCache
+
+
+class MemoryStore(SeriesStore):
+    def __init__(self, data):
+        self.data = data
+        self.queries = 0
+
+    def scenarios(self):
+        return sorted(self.data["scenario"].unique())
+
+    def query(self, scenario, node=None, param=None, start=None, end=None):
+        self.queries += 1
+        df = self.data[self.data["scenario"] == scenario]
+        if node is not None:
+            df = df[df["node"] == node]
+        return df.drop(columns="scenario").reset_index(drop=True)
+
+
+def store():
+    return MemoryStore(
+        pd.DataFrame(
+            {
+                "scenario": "FPV1Ma",
+                "datetime": pd.date_range("2016-01-01", periods=96, freq="15min"),
+                "node": "glc_gate_up",
+                "param": "stage",
+                "value": np.linspace(1, 2, 96),
+                "unit": "FEET",
+            }
+        )
+    )
+
+
+def test_result_cache_evicts_least_recently_used():
+    frame = pd.DataFrame({"value": np.zeros(1000)})
+    size = int(frame.memory_usage(deep=True).sum())
+    cache = ResultCache(max_bytes=2 * size)
+    cache.put("a", frame)
+    cache.put("b", frame)
+    cache.get("a")
+    cache.put("c", frame)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.size <= cache.max_bytes
+
+
+def test_series_are_served_from_cache():
+    s = store()
+    service = QueryService(s, cache_bytes=16 * 1024**2)
+
+    async def requests():
+        first = await service.respond("/series?scenario=FPV1Ma&node=glc_gate_up")
+        window = await service.respond(
+            "/series?scenario=FPV1Ma&node=glc_gate_up&start=2016-01-01 12:00"
+        )
+        missing = await service.respond("/series?scenario=FPV1Ma")
+        return first, window, missing
+
+    first, window, missing = asyncio.run(requests())
+    assert first[0] == 200 and len(json.loads(first[1])) == 96
+    assert window[0] == 200 and len(json.loads(window[1])) == 48
+    assert missing[0] == 400
+    assert s.queries == 1
+
+
+def test_serve_command_is_registered():
+    result = CliRunner().invoke(cli, ["serve", "--help"])
+    assert result.exit_code == 0
+    assert "--cache-mb" in result.output
+
+
+def gate_store(case=str.upper):
+    """
+    Flow, stage and gate operation of GLC with the node names in `case`.
+    """
+    t = pd.date_range("2016-01-01", periods=4 * 96, freq="15min")
+    frames = [
+        pd.DataFrame(
+            {
+                "scenario": "FPV1Ma",
+                "datetime": t,
+                "node": case(node),
+                "param": param,
+                "value": values,
+                "unit": "",
+            }
+        )
+        for node, param, values in [
+            ("GLC_FLOW_FISH", "FLOW", np.full(len(t), 100.0)),
+            ("GLC_GATE_UP", "STAGE", np.full(len(t), 4.0)),
+            ("GLC_GATEOP", "ELEV", np.where(np.arange(len(t)) % 96 < 24, 10.0, 0.0)),
+        ]
+    ]
+    return MemoryStore(pd.concat(frames, ignore_index=True))
+
+
+async def http_get(port: int, target: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {target} HTTP/1.1\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_metrics_over_http_for_any_node_case():
+    async def requests(service):
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            names = await http_get(port, "/metrics")
+            daily = await http_get(
+                port, "/metrics/calc_avg_daily_vel?scenario=FPV1Ma&gate=GLC"
+            )
+            missing = await http_get(
+                port, "/metrics/calc_avg_daily_vel?scenario=FPV1Ma&gate=MID"
+            )
+        return names, daily, missing
+
+    results = {}
+    for case in [str.upper, str.lower]:
+        names, daily, missing = asyncio.run(requests(QueryService(gate_store(case))))
+        assert names == (200, list(METRICS))
+        # 100 cfs through (4 - -6) ft * 5 ft is 2 ft/s, under 8 ft/s all day
+        assert daily == (200, [{"Velocity_Category": "Under 8ft/s", "time_unit": 24.0}])
+        assert missing[0] == 404
+        results[case] = daily[1]
+    assert results[str.upper] == results[str.lower]
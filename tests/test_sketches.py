@@ -0,0 +1,61 @@
+import numpy as np
+from pandas import DataFrame
+
+from sdgtools.post_process.sketches import DEFAULT_BIN_WIDTH, HistogramSketch, SketchSet
+
+
+def stage(n=20_000, seed=0):
+    return np.random.default_rng(seed).normal(5, 3, n)
+
+
+def test_quantiles_within_one_bin_of_numpy():
+    values = stage()
+    sketch = HistogramSketch()
+    for chunk in np.array_split(values, 7):
+        sketch.update(chunk)
+    q = np.linspace(0, 1, 101)
+    np.testing.assert_allclose(
+        sketch.quantile(q), np.quantile(values, q), atol=DEFAULT_BIN_WIDTH
+    )
+    assert sketch.quantile(0)[0] == values.min()
+    assert sketch.quantile(1)[0] == values.max()
+    assert np.isclose(sketch.mean, values.mean())
+
+
+def test_exceedance_within_one_bin():
+    values = stage()
+    sketch = HistogramSketch().update(values)
+    levels = np.array([-100, 0, 5, 8.5, 100])
+    lower = [(values >= level + DEFAULT_BIN_WIDTH).mean() for level in levels]
+    upper = [(values >= level - DEFAULT_BIN_WIDTH).mean() for level in levels]
+    out = sketch.exceedance(levels)
+    assert ((lower <= out) & (out <= upper)).all()
+    assert out[0] == 1.0 and out[-1] == 0.0
+
+
+def test_values_outside_the_range_are_counted():
+    values = np.r_[stage(1000), -50.0, 75.0, np.nan]
+    sketch = HistogramSketch().update(values)
+    assert sketch.n == 1002
+    assert sketch.quantile(1)[0] == 75.0
+    assert sketch.counts[0] == 1 and sketch.counts[-1] == 1
+
+
+def test_merged_sets_match_one_pass(tmp_path):
+    values = stage()
+    chunk = DataFrame({"node": np.tile(["rold024", "mho"], len(values) // 2)})
+    chunk["value"] = values
+    whole = SketchSet().update(chunk, "base")
+
+    merged = SketchSet()
+    for part in np.array_split(np.arange(len(chunk)), 3):
+        path = tmp_path / f"part{part[0]}.npz"
+        SketchSet().update(chunk.iloc[part], "base").save(path)
+        merged.merge(SketchSet.load(path))
+
+    for key, sketch in whole.sketches.items():
+        np.testing.assert_array_equal(merged.sketches[key].counts, sketch.counts)
+    np.testing.assert_allclose(
+        merged.quantiles()["value"], whole.quantiles()["value"], rtol=1e-12
+    )
+    assert list(whole.summary()["count"]) == [len(values) // 2] * 2
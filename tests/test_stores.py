@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from sdgtools.db.stores import (
+    DuckDBStore,
+    ParquetStore,
+    SeriesStore,
+    SQLiteStore,
+    open_store,
+)
+
+
+def long_frame(scale=1.0, periods=200):
+    t = pd.date_range("2000-01-01", periods=periods, freq="h", unit="ns")
+    return DataFrame(
+        {
+            "datetime": np.tile(t, 2),
+            "node": np.repeat(["mho", "rold024"], periods),
+            "param": "stage",
+            "value": scale * np.arange(2 * periods, dtype=float),
+            "unit": "FEET",
+        }
+    )
+
+
+def writable_store(kind, tmp_path):
+    if kind == "duckdb-dir":
+        pytest.importorskip("duckdb")
+        return open_store(f"duckdb:///{tmp_path / 'parquet'}")
+    if kind == "duckdb":
+        pytest.importorskip("duckdb")
+    return open_store(
+        str(tmp_path / {"sqlite": "s.sqlite", "duckdb": "s.duckdb"}[kind])
+    )
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "duckdb", "duckdb-dir"])
+def test_append_and_query_round_trip(kind, tmp_path):
+    store = writable_store(kind, tmp_path)
+    assert store.append(long_frame(), "base") == 400
+    assert store.append(long_frame(2.0), "alt") == 400
+    assert sorted(store.scenarios()) == ["alt", "base"]
+
+    out = store.query("alt")
+    expected = long_frame(2.0)
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
+    assert out["datetime"].dtype.kind == "M"
+
+    window = store.query(
+        "base", node="rold024", start="2000-01-02", end="2000-01-02 05:00"
+    )
+    assert len(window) == 6
+    assert (window["node"] == "rold024").all()
+    assert window["datetime"].iloc[0] == pd.Timestamp("2000-01-02")
+
+
+def test_open_store_kinds(tmp_path):
+    assert isinstance(open_store(str(tmp_path / "a.db")), SQLiteStore)
+    assert isinstance(open_store("sqlite:///a"), SQLiteStore)
+    assert isinstance(open_store(str(tmp_path / "a.ddb")), DuckDBStore)
+    assert isinstance(open_store(str(tmp_path / "a.parquet")), ParquetStore)
+    assert isinstance(open_store(str(tmp_path)), ParquetStore)
+    with pytest.raises(ValueError, match="can not tell"):
+        open_store(str(tmp_path / "a.txt"))
+
+
+def test_parquet_store_reads_what_duckdb_wrote(tmp_path):
+    pytest.importorskip("duckdb")
+    DuckDBStore(str(tmp_path / "parquet")).append(long_frame(), "base")
+    store = ParquetStore(str(tmp_path / "parquet"))
+    assert store.scenarios() == ["base"]
+    out = store.query("base", node="mho", end="2000-01-01 09:00")
+    assert len(out) == 10
+    with pytest.raises(NotImplementedError, match="read only"):
+        store.append(long_frame(), "alt")
+
+
+@pytest.mark.parametrize("freq", ["day", "week", "month"])
+def test_duckdb_aggregates_match_pandas_buckets(freq, tmp_path):
+    pytest.importorskip("duckdb")
+    store = DuckDBStore(str(tmp_path / "s.duckdb"))
+    store.append(long_frame(periods=2000), "base")
+    out = store.aggregate(freq, "mean")
+    expected = SeriesStore.aggregate(store, freq, "mean")
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
+
+
+def test_export_compressed_csv(tmp_path):
+    store = SQLiteStore(str(tmp_path / "s.sqlite"))
+    store.append(long_frame(), "base")
+    assert store.export(str(tmp_path / "out.csv.gz"), freq="day", compress="gzip") == 18
+    out = pd.read_csv(tmp_path / "out.csv.gz")
+    assert list(out.columns) == ["scenario", "node", "param", "datetime", "value"]
+    assert len(out) == 18
@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from sdgtools.utils import CategoryDictionary, compact_frame, concat_compact
+
+
+def scenario_frame(nodes, scenario):
+    return DataFrame(
+        {
+            "datetime": pd.date_range("2000-01-01", periods=len(nodes), freq="h"),
+            "node": nodes,
+            "param": "stage",
+            "value": np.linspace(0, 1, len(nodes)),
+            "time_unit": 1 / 3 + np.arange(len(nodes)) * 1e6,
+            "scenario": scenario,
+        }
+    )
+
+
+def read_compact(nodes, scenario):
+    return compact_frame(scenario_frame(nodes, scenario))
+
+
+def test_compact_frame_downcasts_only_values():
+    df = scenario_frame(["a", "b", "a"], "base")
+    out = compact_frame(df)
+    assert out["value"].dtype == np.float32
+    assert out["time_unit"].dtype == np.float64
+    np.testing.assert_array_equal(out["time_unit"], df["time_unit"])
+    assert isinstance(out["node"].dtype, pd.CategoricalDtype)
+    assert list(out["node"].astype(str)) == ["a", "b", "a"]
+
+
+def test_compact_frames_use_their_own_categories_by_default():
+    compact_frame(scenario_frame(["a"], "base"))
+    out = compact_frame(scenario_frame(["b"], "alt"))
+    assert list(out["node"].cat.categories) == ["b"]
+
+    categories = CategoryDictionary()
+    compact_frame(scenario_frame(["a"], "base"), categories)
+    out = compact_frame(scenario_frame(["b"], "alt"), categories)
+    assert list(out["node"].cat.categories) == ["a", "b"]
+
+
+def test_concat_compact_frames_from_reader_processes():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        frames = list(
+            pool.map(
+                read_compact, [["a", "b"], ["c", "a"]], ["base", "alt"], chunksize=1
+            )
+        )
+    out = concat_compact(frames, CategoryDictionary())
+    assert list(out["node"].astype(str)) == ["a", "b", "c", "a"]
+    assert list(out["scenario"].astype(str)) == ["base", "base", "alt", "alt"]
+    assert list(out["node"].cat.categories) == ["a", "b", "c"]
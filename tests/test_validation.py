@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from sdgtools.validation import ValidationError, validate_frames, validate_long
+
+
+def long_frame(node, param, unit, periods=8, start="2016-01-01"):
+    return pd.DataFrame(
+        {
+            "datetime": pd.date_range(start, periods=periods, freq="15min"),
+            "node": node,
+            "param": param,
+            "value": np.arange(periods, dtype=float),
+            "unit": unit,
+        }
+    )
+
+
+def test_gate_ops_only_frame_is_valid():
+    # gate operations are read with param elev and no unit
+    gate_ops = pd.concat(
+        [long_frame(node, "elev", np.nan) for node in ["mid_gateop", "glc_gateop"]],
+        ignore_index=True,
+    )
+    report = validate_long(gate_ops)
+    assert report.ok
+    assert len(report.issues) == 0
+
+
+def test_mixed_frame_flags_only_real_unit_errors():
+    data = pd.concat(
+        [
+            long_frame("mid_gateop", "elev", np.nan),
+            long_frame("mid_flow_gate", "device-flow", "CFS"),
+            long_frame("mho", "stage", np.nan),
+            long_frame("dgl", "stage", "CFS"),
+        ],
+        ignore_index=True,
+    )
+    report = validate_long(data)
+    bad = data[report.bad]
+    assert set(bad["node"]) == {"mho", "dgl"}
+    checks = report.issues.set_index("node")["check"]
+    assert checks["mho"] == "unit_missing"
+    assert checks["dgl"] == "unit_mismatch"
+
+
+def test_masks():
+    data = long_frame("mho", "stage", "FEET", periods=10)
+    data.loc[2, "value"] = np.inf
+    data.loc[3, "value"] = np.nan
+    data = data.drop(index=7)
+    data = pd.concat([data, data.loc[[4]]], ignore_index=True)
+    report = validate_long(data)
+
+    checks = dict(zip(report.issues["check"], report.issues["rows"]))
+    assert checks == {
+        "non_finite_value": 1,
+        "duplicate": 1,
+        "missing_value": 1,
+        "gap": 1,
+    }
+    assert report.n_bad == 2
+    good, quarantined = report.split(data)
+    assert len(good) + len(quarantined) == len(data)
+    assert sorted(quarantined["check"]) == ["duplicate", "non_finite_value"]
+
+
+def test_stage_below_gate_bottom():
+    data = long_frame("glc_gate_up", "stage", "FEET")
+    data["value"] = -100.0
+    report = validate_long(data)
+    assert report.issues["check"].tolist() == ["stage_below_bottom"]
+    assert report.n_bad == len(data)
+
+
+def test_validate_frames_quarantine():
+    frames = {
+        "ok": long_frame("mho", "stage", "FEET"),
+        "bad": long_frame("dgl", "stage", "CFS"),
+    }
+    try:
+        validate_frames(frames)
+    except ValidationError as e:
+        assert not e.report.ok
+    else:
+        raise AssertionError("expected a ValidationError")
+
+    clean, quarantined, reports = validate_frames(frames, quarantine=True)
+    assert len(clean["ok"]) == len(frames["ok"])
+    assert len(clean["bad"]) == 0
+    assert (quarantined[0]["frame"] == "bad").all()
@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from pandas import DataFrame
+
+from sdgtools import cli, dss_reader
+from sdgtools.readers import dss as readers_dss
+from sdgtools.readers.dss import read_dss
+from sdgtools.utils import WIDE_COLUMN_LEVELS, make_wide_frame
+
+
+def dss_series(pathname, values, start="2016-01-01", period=False):
+    """
+    One series as pyhecdss returns it, a frame with one column named by the pathname.
+    """
+    index = pd.date_range(start, periods=len(values), freq="15min")
+    if period:
+        index = index.to_period("15min")
+    return SimpleNamespace(
+        data=DataFrame({pathname: np.asarray(values, dtype=float)}, index=index),
+        units="FEET" if "/STAGE/" in pathname else "CFS",
+    )
+
+
+SERIES = [
+    dss_series("/FPV1MA/GLC_GATE_UP/STAGE//15MIN/SDG/", [1.0, 2, 3, 4]),
+    dss_series(
+        "/FPV1MA/GLC_FLOW_FISH/DEVICE-FLOW//15MIN/SDG/",
+        [10.0, 20, 30],
+        start="2016-01-01 00:30",
+        period=True,
+    ),
+]
+
+
+@pytest.fixture
+def matching(monkeypatch):
+    def fake_matching_ts(file, parts_regex, catalog=None):
+        return iter(SERIES)
+
+    monkeypatch.setattr(readers_dss, "get_matching_ts", fake_matching_ts)
+    monkeypatch.setattr(dss_reader, "catalog_matching_ts", fake_matching_ts)
+
+
+def test_make_wide_frame_aligns_on_union():
+    out = make_wide_frame([s.data for s in SERIES], ["FEET", "CFS"])
+
+    assert out.index.name == "datetime"
+    pd.testing.assert_index_equal(
+        out.index,
+        pd.date_range("2016-01-01", periods=5, freq="15min", name="datetime"),
+        check_exact=False,
+    )
+    assert list(out.columns.names) == WIDE_COLUMN_LEVELS
+    assert list(out.columns) == [
+        ("/FPV1MA/GLC_GATE_UP/STAGE//15MIN/SDG/", "glc_gate_up", "stage", "FEET"),
+        (
+            "/FPV1MA/GLC_FLOW_FISH/DEVICE-FLOW//15MIN/SDG/",
+            "glc_flow_fish",
+            "device-flow",
+            "CFS",
+        ),
+    ]
+    np.testing.assert_array_equal(
+        out.to_numpy(), [[1, np.nan], [2, np.nan], [3, 10], [4, 20], [np.nan, 30]]
+    )
+
+
+def test_make_wide_frame_options():
+    out = make_wide_frame(
+        [SERIES[0].data], ["FEET"], lower=False, float_dtype="float32"
+    )
+
+    assert out.columns.get_level_values("node").tolist() == ["GLC_GATE_UP"]
+    assert out.columns.get_level_values("param").tolist() == ["STAGE"]
+    assert (out.dtypes == "float32").all()
+
+
+def test_read_dss_wide(matching):
+    wide = read_dss("sdg.dss", wide=True)
+
+    assert wide.columns.get_level_values("node").tolist() == [
+        "glc_gate_up",
+        "glc_flow_fish",
+    ]
+    # units as in the long frame
+    assert wide.columns.get_level_values("unit").tolist() == ["FEET", "CFS"]
+    for series, (_, column) in zip(SERIES, wide.items()):
+        values = series.data.iloc[:, 0].copy()
+        if isinstance(values.index, pd.PeriodIndex):
+            values.index = values.index.to_timestamp()
+        np.testing.assert_array_equal(column.dropna(), values)
+        np.testing.assert_array_equal(
+            column.dropna().index.to_numpy("datetime64[ns]"),
+            values.index.to_numpy("datetime64[ns]"),
+        )
+
+    assert (read_dss("sdg.dss", wide=True, compact=True).dtypes == "float32").all()
+
+
+def test_dss_cli_wide_csv(matching, tmp_path):
+    dss_file = tmp_path / "FPV1Ma_SDG.dss"
+    dss_file.touch()
+    output = tmp_path / "wide.csv"
+
+    result = CliRunner().invoke(cli, ["dss", str(dss_file), str(output), "--wide"])
+
+    assert result.exit_code == 0, result.output
+    out = pd.read_csv(output, header=[0, 1, 2, 3], index_col=0)
+    assert out.shape == (5, 2)
+    # the dss command keeps the node and param as they are in the pathname
+    assert out.columns.get_level_values(1).tolist() == [
+        "GLC_GATE_UP",
+        "GLC_FLOW_FISH",
+    ]
+    assert out.columns.get_level_values(3).tolist() == ["FEET", "CFS"]
+    np.testing.assert_array_equal(out.iloc[:, 1].dropna(), [10, 20, 30])
+
+
+def test_dss_cli_wide_to_store(tmp_path):
+    dss_file = tmp_path / "FPV1Ma_SDG.dss"
+    dss_file.touch()
+
+    result = CliRunner().invoke(
+        cli, ["dss", str(dss_file), "--wide", "--to-store", str(tmp_path / "s.db")]
+    )
+
+    assert result.exit_code == 1
+    assert "can not be used with --to-store" in result.output